@@ -0,0 +1,223 @@
+"""
+Compressing many small files with one shared code table.
+
+    python batch.py train samples/ --output json.table
+    python batch.py compress records/ packed/ --table json.table --jobs 8
+    python batch.py decompress packed/ restored/ --table json.table
+
+A file of a few hundred bytes compressed on its own spends much of its
+output on its code table, and much of the time on building it. `train`
+instead counts the bytes of a sample corpus once and saves the code
+lengths for them as a table, identified by the CRC-32 of its contents.
+Every byte value gets a code, so the table can compress any file, not
+only ones like the samples.
+
+`compress` then codes every file under a directory with that table in
+byte mode, each to its own file in a mirrored tree, across a process
+pool. Each process decodes the table once. A compressed file is just
+FILE_HEADER, holding the table's ID and how many bits of padding the
+data ends with, then the data. `decompress` takes the table (or tables)
+the files were made with and reverses it.
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import compress
+from codelengths import code_lengths
+
+TABLE_MAGIC = b"HUFT"
+TABLE_VERSION = 1
+# Magic, format version, table ID; the code length table follows
+TABLE_HEADER = struct.Struct(">4sBI")
+FILE_MAGIC = b"HS"
+# Magic, table ID, bits of padding after the data
+FILE_HEADER = struct.Struct(">2sIB")
+SUFFIX = ".huf"
+# Files handed to a process at a time
+CHUNK_SIZE = 64
+
+# In each process, the loaded tables by ID: (Huffman codes, decode tables)
+_tables = {}
+
+
+def walk_files(root: str):
+    """Paths of the files under `root`, or `root` itself if it is a file,
+    in a repeatable order."""
+    if os.path.isfile(root):
+        yield root
+        return
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            yield os.path.join(directory, name)
+
+
+def train(paths) -> dict:
+    """Code lengths for the bytes of the files under `paths`, with every
+    byte value and END_OF_DATA given at least one occurrence."""
+    counts = dict.fromkeys(map(chr, range(256)), 1)
+    counts[compress.END_OF_DATA] = 1
+    for root in paths:
+        for path in walk_files(root):
+            with open(path, "rb") as fp:
+                for char, count in compress.count_bytes(fp.read()).items():
+                    counts[char] += count
+    return code_lengths(counts, compress.MAX_CODE_LENGTH)
+
+
+def write_table(path: str, lengths) -> int:
+    """Save the code lengths as a table file; returns its ID."""
+    table = compress.encode_code_lengths(lengths)
+    table_id = zlib.crc32(table)
+    with open(path, "wb") as fp:
+        fp.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, table_id))
+        fp.write(table)
+    return table_id
+
+
+def read_table(path: str) -> tuple[int, dict]:
+    """The ID and code lengths of a table file."""
+    with open(path, "rb") as fp:
+        header = fp.read(TABLE_HEADER.size)
+        table = fp.read()
+    if len(header) < TABLE_HEADER.size or header[:len(TABLE_MAGIC)] != TABLE_MAGIC:
+        raise ValueError(f"{path} is not a code table")
+    _, version, table_id = TABLE_HEADER.unpack(header)
+    if version != TABLE_VERSION:
+        raise ValueError(f"Unsupported table version {version}")
+    if zlib.crc32(table) != table_id:
+        raise ValueError(f"{path} is corrupt")
+    return table_id, compress.decode_code_lengths(table)
+
+
+def load_tables(paths) -> None:
+    """Make the tables in `paths` the ones this process codes with."""
+    _tables.clear()
+    for path in paths:
+        table_id, lengths = read_table(path)
+        huffman_codes = compress.canonical_codes(lengths)
+        _tables[table_id] = (huffman_codes, compress.build_decode_tables(huffman_codes))
+
+
+def encode_file(data: bytes, table_id: int) -> bytes:
+    huffman_codes, _ = _tables[table_id]
+    out = bytearray(FILE_HEADER.size)
+    total_bits = compress.encode_blocks(compress.byte_blocks(data), huffman_codes, out.extend)
+    FILE_HEADER.pack_into(out, 0, FILE_MAGIC, table_id, -total_bits % 8)
+    return bytes(out)
+
+
+def decode_file(block: bytes) -> bytes:
+    if len(block) < FILE_HEADER.size or block[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError("Not a file compressed with a shared table")
+    _, table_id, padding = FILE_HEADER.unpack_from(block)
+    if table_id not in _tables:
+        raise ValueError(f"Compressed with table {table_id:08x}, which was not given")
+    _, decode_tables = _tables[table_id]
+    total_bits = (len(block) - FILE_HEADER.size) * 8 - padding
+    text = compress.extract_text(io.BytesIO(block[FILE_HEADER.size:]), decode_tables, total_bits)
+    return compress.to_bytes(text)
+
+
+def _compress_one(paths: tuple[str, str]) -> tuple[int, int]:
+    source, target = paths
+    with open(source, "rb") as fp:
+        data = fp.read()
+    # Compressing loads just the one table
+    (table_id,) = _tables
+    block = encode_file(data, table_id)
+    with open(target, "wb") as fp:
+        fp.write(block)
+    return len(data), len(block)
+
+
+def _decompress_one(paths: tuple[str, str]) -> tuple[int, int]:
+    source, target = paths
+    with open(source, "rb") as fp:
+        block = fp.read()
+    data = decode_file(block)
+    with open(target, "wb") as fp:
+        fp.write(data)
+    return len(block), len(data)
+
+
+def _run(function, pairs, table_paths, jobs: int):
+    """`function` over the (source, target) pairs with the tables loaded,
+    across `jobs` processes; returns the file count and the total sizes
+    before and after."""
+    for target in {os.path.dirname(target) for _, target in pairs}:
+        os.makedirs(target or ".", exist_ok=True)
+    if jobs <= 1:
+        load_tables(table_paths)
+        sizes = list(map(function, pairs))
+    else:
+        with ProcessPoolExecutor(jobs, initializer=load_tables, initargs=(table_paths,)) as pool:
+            sizes = list(pool.map(function, pairs, chunksize=CHUNK_SIZE))
+    return len(sizes), sum(size for size, _ in sizes), sum(size for _, size in sizes)
+
+
+def _mirrored(path: str, source: str, target: str) -> str:
+    """Where `path`, found by walk_files(source), goes under `target`; a
+    `source` that is a file goes straight in `target`."""
+    if path == source:
+        return os.path.join(target, os.path.basename(path))
+    return os.path.join(target, os.path.relpath(path, source))
+
+
+def compress_tree(source: str, target: str, table_path: str, jobs: int = 1):
+    """Compress each file under `source` to the same place under `target`,
+    with SUFFIX added."""
+    pairs = [(path, _mirrored(path, source, target) + SUFFIX) for path in walk_files(source)]
+    return _run(_compress_one, pairs, [table_path], jobs)
+
+
+def decompress_tree(source: str, target: str, table_paths, jobs: int = 1):
+    """Decompress each SUFFIX file under `source` to the same place under
+    `target`, without it."""
+    pairs = [(path, _mirrored(path, source, target)[:-len(SUFFIX)])
+             for path in walk_files(source) if path.endswith(SUFFIX)]
+    return _run(_decompress_one, pairs, table_paths, jobs)
+
+
+def parse_commandline_arguments():
+    parser = argparse.ArgumentParser(description="Compress many small files with a shared code table")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_command = commands.add_parser("train", help="build a table from sample files")
+    train_command.add_argument("samples", nargs="+", help="files or directories to count")
+    train_command.add_argument("--output", required=True, help="table file to write")
+    for name in ("compress", "decompress"):
+        command = commands.add_parser(name)
+        command.add_argument("input_dir")
+        command.add_argument("output_dir")
+        command.add_argument("--jobs", type=int, default=os.cpu_count(), help="processes to use")
+    commands.choices["compress"].add_argument("--table", required=True, help="table file to compress with")
+    commands.choices["decompress"].add_argument(
+        "--table", required=True, action="append", help="table file the input was compressed with; may be repeated")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_commandline_arguments()
+    try:
+        if args.command == "train":
+            table_id = write_table(args.output, train(args.samples))
+            print(f"Wrote table {table_id:08x} to {args.output}")
+            return
+        if args.command == "compress":
+            files, size_in, size_out = compress_tree(args.input_dir, args.output_dir, args.table, args.jobs)
+        else:
+            files, size_in, size_out = decompress_tree(args.input_dir, args.output_dir, args.table, args.jobs)
+    except (OSError, ValueError) as err:
+        # From any file, in this process or a worker
+        print(f"{args.command} failed: {err}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{files} files, {size_in} bytes in, {size_out} bytes out")
+
+
+if __name__ == "__main__":
+    main()
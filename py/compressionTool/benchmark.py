@@ -0,0 +1,272 @@
+"""
+Throughput of compress.py's encoder and table-driven decoder against the
+bit-at-a-time loops they replaced.
+
+    python benchmark.py --size-mb 5
+
+The input is test.txt repeated to the requested size. The old loops are
+slow, and the tree walk is quadratic in the worst case, so they are only
+timed on the first --walk-size-kb of it. The encoder is timed with and
+without NumPy when it is installed.
+
+    python benchmark.py --levels --size-mb 1
+
+compares the codecs instead: Huffman alone, then lz77.py in front of it
+at each level, on made-up log lines, reporting the ratio and the MB/s
+each way.
+
+    python benchmark.py --tables
+
+times building code lengths for many small blocks, with codelengths.py
+and with the PriorityQueue of HuffmanNodes that it replaced.
+"""
+import argparse
+import io
+import random
+import time
+from queue import PriorityQueue
+
+import compress
+import lz77
+
+
+class HuffmanNode:
+    """A node of the tree the previous coder was built on."""
+
+    def __init__(self, char, freq):
+        self.char = char
+        self.freq = freq
+        self.left = None
+        self.right = None
+
+    def __lt__(self, other):
+        return self.freq < other.freq
+
+
+def build_huffman_tree_from_codes(huffman_codes):
+    """The previous decoder's tree, with a path per code: 0 left, 1 right."""
+    root = HuffmanNode(None, 0)  # Create a dummy root
+    for char, code in huffman_codes.items():
+        node = root
+        for bit in code:
+            if bit == "0":
+                if node.left is None:
+                    node.left = HuffmanNode(None, 0)
+                node = node.left
+            else:
+                if node.right is None:
+                    node.right = HuffmanNode(None, 0)
+                node = node.right
+        node.char = char
+    return root
+
+
+def bit_loop_compress(text, huffman_codes):
+    """The previous encoder: one test and shift per bit of each string code."""
+    compressed_text = bytearray()
+    current_byte = 0
+    bits_written = 0
+    total_bits = 0
+    for char in text:
+        for bit in huffman_codes[char]:
+            if bit == "1":
+                current_byte |= (1 << (7 - bits_written))
+            bits_written += 1
+            if bits_written == 8:
+                compressed_text.append(current_byte)
+                current_byte = 0
+                bits_written = 0
+                total_bits += 8
+    if bits_written > 0:
+        compressed_text.append(current_byte)
+        total_bits += bits_written
+    return bytes(compressed_text), total_bits
+
+
+def compress_without_numpy(text, huffman_codes):
+    numpy, compress.np = compress.np, None
+    try:
+        return compress.compress_text(text, huffman_codes)
+    finally:
+        compress.np = numpy
+
+
+def priority_queue_code_lengths(frequencies):
+    """The previous code length builder: a HuffmanNode per symbol, merged
+    through a PriorityQueue, then a walk of the tree for the depths."""
+    priority_queue = PriorityQueue()
+    for char, freq in frequencies.items():
+        priority_queue.put(HuffmanNode(char, freq))
+    while priority_queue.qsize() > 1:
+        left = priority_queue.get()
+        right = priority_queue.get()
+        parent_node = HuffmanNode(None, left.freq + right.freq)
+        parent_node.left = left
+        parent_node.right = right
+        priority_queue.put(parent_node)
+    lengths = {}
+    stack = [(priority_queue.get(), 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node.char is not None:
+            lengths[node.char] = max(depth, 1)
+        else:
+            stack.append((node.left, depth + 1))
+            stack.append((node.right, depth + 1))
+    return lengths
+
+
+def tree_walk_extract(fp, root, total_bits):
+    """The previous decoder: one tree step per bit, one string append per
+    character."""
+    current_node = root
+    decompressed_text = ""
+    bits_read = 0
+    while bits_read < total_bits:
+        byte = fp.read(1)
+        if not byte:
+            break
+        for i in range(8):
+            if byte[0] & (1 << (7 - i)):
+                current_node = current_node.right
+            else:
+                current_node = current_node.left
+            if current_node.char:
+                decompressed_text += current_node.char
+                current_node = root
+            bits_read += 1
+            if bits_read >= total_bits:
+                break
+    return decompressed_text
+
+
+def make_text(size: int) -> str:
+    with open("test.txt") as fp:
+        sample = fp.read()
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def make_log(size: int, seed: int = 0) -> str:
+    """Log lines of the usual sort: timestamps, a few services and levels,
+    templated messages with varying ids, addresses and durations."""
+    rng = random.Random(seed)
+    services = ["api", "auth", "billing", "scheduler", "worker"]
+    levels = ["INFO"] * 8 + ["DEBUG"] * 4 + ["WARN", "ERROR"]
+    messages = [
+        "request {id} completed in {ms}ms status={status}",
+        "user {user} logged in from {ip}",
+        "retrying job {id} after {ms}ms (attempt {attempt})",
+        "cache miss for key user:{user}:profile",
+        "connection to {ip}:5432 closed after {ms}ms",
+    ]
+    lines = []
+    length = 0
+    timestamp = 1_700_000_000.0
+    while length < size:
+        timestamp += rng.expovariate(50)
+        message = rng.choice(messages).format(
+            id=rng.randrange(16 ** 8), ms=rng.randrange(2000), status=rng.choice((200, 200, 200, 404, 500)),
+            user=rng.randrange(5000), ip=f"10.0.{rng.randrange(256)}.{rng.randrange(256)}", attempt=rng.randrange(1, 5))
+        seconds = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp))
+        line = f"{seconds}.{int(timestamp % 1 * 1000):03d}Z {rng.choice(levels):<5} [{rng.choice(services)}] {message}\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)[:size]
+
+
+def measure(decode, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = decode()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--walk-size-kb", type=float, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--levels", action="store_true", help="compare the codecs and lz77 levels on log lines")
+    parser.add_argument("--tables", action="store_true", help="time building code lengths for small blocks")
+    args = parser.parse_args()
+    if args.levels:
+        compare_levels(int(args.size_mb * 1024 * 1024), args.repeat)
+        return
+    if args.tables:
+        compare_table_builds(args.repeat)
+        return
+
+    text = make_text(int(args.size_mb * 1024 * 1024))
+    codes = compress.canonical_codes(compress.huffman_code_lengths(text))
+    data, total_bits = compress.compress_text(text, codes)
+    walk_text = text[:int(args.walk_size_kb * 1024)]
+    walk_data, walk_bits = compress.compress_text(walk_text, codes)
+    root = build_huffman_tree_from_codes(codes)
+
+    # Name, input, expected output, and the run to time
+    runs = [
+        ("bit loop", walk_text, (walk_data, walk_bits), lambda: bit_loop_compress(walk_text, codes)),
+        ("translate", text, (data, total_bits), lambda: compress_without_numpy(text, codes)),
+    ]
+    if compress.np is not None:
+        runs.append(("numpy", text, (data, total_bits), lambda: compress.compress_text(text, codes)))
+    runs += [
+        ("tree walk", walk_text, walk_text, lambda: tree_walk_extract(io.BytesIO(walk_data), root, walk_bits)),
+        ("table", text, text, lambda: compress.extract_text(io.BytesIO(data), compress.build_decode_tables(codes), total_bits)),
+    ]
+
+    print(f"{'':<12} {'MB':>6} {'seconds':>8} {'MB/s':>8}")
+    for name, sample, expected, run in runs:
+        seconds, result = measure(run, args.repeat)
+        if result != expected:
+            raise SystemExit(f"{name} got the wrong result")
+        megabytes = len(sample) / (1024 * 1024)
+        print(f"{name:<12} {megabytes:>6.2f} {seconds:>8.3f} {megabytes / seconds:>8.2f}")
+
+
+def compare_levels(size: int, repeat: int):
+    data = make_log(size).encode("utf-8")
+    megabytes = len(data) / (1024 * 1024)
+
+    def huffman_encode():
+        out = io.BytesIO()
+        compress.write_stream(out, data)
+        return out.getvalue()
+
+    def huffman_decode(block):
+        return compress.read_stream(io.BytesIO(block))
+
+    codecs = [("huffman", huffman_encode, huffman_decode)]
+    for level in sorted(lz77.LEVELS):
+        codecs.append((f"lz77 -{level}", lambda level=level: lz77.encode(data, level), lz77.decode))
+
+    print(f"{'codec':<10} {'ratio':>6} {'MB/s in':>8} {'MB/s out':>8}")
+    for name, encode, decode in codecs:
+        encode_seconds, block = measure(encode, repeat)
+        decode_seconds, result = measure(lambda: decode(block), repeat)
+        if result != data:
+            raise SystemExit(f"{name} got the wrong result")
+        print(f"{name:<10} {len(data) / len(block):>6.2f} "
+              f"{megabytes / encode_seconds:>8.2f} {megabytes / decode_seconds:>8.2f}")
+
+
+def compare_table_builds(repeat: int, blocks: int = 1000, block_size: int = 4096):
+    """Code lengths for the byte counts of `blocks` blocks of log lines."""
+    data = make_log(blocks * block_size).encode("utf-8")
+    counts = [compress.count_bytes(data[start:start + block_size]) for start in range(0, len(data), block_size)]
+    print(f"{'builder':<16} {'blocks/s':>10} {'us/block':>9}")
+    for name, build in (
+        ("PriorityQueue", lambda: [priority_queue_code_lengths(block) for block in counts]),
+        ("codelengths", lambda: [compress.huffman_code_lengths(block) for block in counts]),
+    ):
+        seconds, lengths = measure(build, repeat)
+        cost = sum(sum(block[char] * length for char, length in block_lengths.items())
+                   for block, block_lengths in zip(counts, lengths))
+        print(f"{name:<16} {len(counts) / seconds:>10.0f} {seconds / len(counts) * 1e6:>9.1f}   {cost} bits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Huffman code lengths from symbol counts, without building a tree.
+
+    code_lengths({"a": 45, "b": 13, "c": 12, "d": 16, "e": 9, "f": 5})
+    # {'f': 4, 'e': 4, 'c': 3, 'b': 3, 'd': 3, 'a': 1}
+
+The counts are sorted once. After that, Huffman's merging runs in linear
+time: leaves are taken in order from the front of the sorted counts, and
+the merged weights come out in order too, so the two lightest are always
+at the front of one list or the other (the two-queue method). Moffat and
+Katajainen's version of it works in a single list of the counts, which
+ends up holding the code lengths, so nothing is allocated per node.
+
+If a code would be longer than `max_length`, the lengths come from
+package-merge instead. It gives the best lengths that are no longer than
+the limit.
+"""
+
+
+def code_lengths(frequencies, max_length: int = None) -> dict:
+    """The length of each symbol's code, given a mapping of each symbol to
+    its count; no code is longer than `max_length` if one is given. A lone
+    symbol still gets a one bit code."""
+    symbols = sorted(frequencies, key=frequencies.__getitem__)
+    if len(symbols) <= 1:
+        return dict.fromkeys(symbols, 1)
+    if max_length is not None and 1 << max_length < len(symbols):
+        raise ValueError(f"{len(symbols)} symbols need codes longer than {max_length} bits")
+    weights = [frequencies[symbol] for symbol in symbols]
+    lengths = minimum_redundancy(weights)
+    if max_length is not None and lengths[0] > max_length:
+        lengths = package_merge(weights, max_length)
+    return dict(zip(symbols, lengths))
+
+
+def minimum_redundancy(weights: list) -> list:
+    """Huffman code lengths for `weights`, which are sorted from lightest
+    and at least two; in the same order, so from longest.
+
+    The list is used three times over: first each merged weight is stored
+    in the first free slot, and the weight it was merged into is replaced
+    by a pointer to it; then the pointers are turned into depths of the
+    merged weights; then the depths of the leaves are counted off from them.
+    """
+    size = len(weights)
+    lengths = list(weights)
+    # Merge, with `root` the next merged weight and `leaf` the next leaf
+    lengths[0] += lengths[1]
+    root = 0
+    leaf = 2
+    for merged in range(1, size - 1):
+        for second in (False, True):
+            if leaf >= size or (root < merged and lengths[root] < lengths[leaf]):
+                weight = lengths[root]
+                lengths[root] = merged
+                root += 1
+            else:
+                weight = lengths[leaf]
+                leaf += 1
+            lengths[merged] = lengths[merged] + weight if second else weight
+
+    # The last merge is the root, at depth 0; each other is one deeper than
+    # the one it was merged into
+    lengths[size - 2] = 0
+    for merged in range(size - 3, -1, -1):
+        lengths[merged] = lengths[lengths[merged]] + 1
+
+    # At each depth, the nodes not taken by merged weights are leaves,
+    # given to the heaviest leaves left
+    available = 1
+    depth = 0
+    root = size - 2
+    position = size - 1
+    while available > 0:
+        used = 0
+        while root >= 0 and lengths[root] == depth:
+            used += 1
+            root -= 1
+        while available > used:
+            lengths[position] = depth
+            position -= 1
+            available -= 1
+        available = 2 * used
+        depth += 1
+    return lengths
+
+
+def package_merge(weights: list, max_length: int) -> list:
+    """The best code lengths for `weights`, sorted from lightest, with
+    none longer than `max_length`.
+
+    Starting from the longest length, each level's list is the leaves
+    merged in order with packages, the sums of adjacent pairs of the
+    level below. The lightest 2n - 2 items of the top list make the code:
+    each leaf's length is the number of levels it is picked at. The picks
+    are always the lightest leaves at a level, and any packages picked are
+    the first ones, made from the first items of the level below, so only
+    the number of packages among each level's items needs keeping.
+    """
+    size = len(weights)
+    # For each level from the deepest, how many of the first k items are
+    # packages, for each k
+    package_counts = []
+    items = list(weights)
+    for _ in range(max_length - 1):
+        packages = [items[i] + items[i + 1] for i in range(0, len(items) - 1, 2)]
+        merged = []
+        counts = [0]
+        leaf = package = 0
+        while leaf < size or package < len(packages):
+            if package >= len(packages) or (leaf < size and weights[leaf] <= packages[package]):
+                merged.append(weights[leaf])
+                leaf += 1
+            else:
+                merged.append(packages[package])
+                package += 1
+            counts.append(package)
+        package_counts.append(counts)
+        items = merged
+
+    lengths = [0] * size
+    picked = 2 * size - 2
+    for counts in reversed(package_counts):
+        packages = counts[picked]
+        for leaf in range(picked - packages):
+            lengths[leaf] += 1
+        picked = 2 * packages
+    for leaf in range(picked):
+        lengths[leaf] += 1
+    return lengths
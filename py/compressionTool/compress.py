@@ -1,70 +1,70 @@
 import argparse
-import json
-import sys
-from collections import Counter
-from queue import PriorityQueue
-import unittest
-
-# Define a custom delimiter
-DELIMITER = "|"
-
-
-class HuffmanNode:
-    def __init__(self, char, freq):
-        self.char = char
-        self.freq = freq
-        self.left = None
-        self.right = None
-
-    def __lt__(self, other):
-        return self.freq < other.freq
-
-
-class TestCompression(unittest.TestCase):
-
-    def test_compression_and_decompression(self):
-        # original_text = "This is a test. Compression and decompression test."
-        input_file = "test.txt"
-        output_file = "test_output.bin"
-        # with open(input_file, "w") as f:
-        #     f.write(original_text)
-
-        # Compress the test file
-        sys.argv = ["", input_file, output_file]
-        main()
-
-        original_text = read_data_from_file(input_file)
-
-        # Decompress the compressed file
-        decompressed_text = decompress(output_file)
-
-        # Compare the original text with the decompressed text
-        self.assertEqual(original_text, decompressed_text)
+import io
+import mmap
+import os
+import struct
+import zlib
+from collections import Counter, defaultdict
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from codelengths import code_lengths
+
+MAGIC = b"HUFF"
+FORMAT_VERSION = 2
+# Magic, format version, flags, number of bits of compressed data, CRC-32
+# of the compressed data, size of the code length table that follows
+HEADER = struct.Struct(">4sBBQII")
+# Flag for data compressed as bytes rather than text
+BYTES = 1
+# In byte mode, bytes are the characters with the same numbers, and this
+# one comes after the last
+END_OF_DATA = chr(256)
+# Longest code allowed, unless the alphabet needs longer ones
+MAX_CODE_LENGTH = 20
+# Bits looked up at a time when decoding
+TABLE_BITS = 12
+# Compressed data is read this much at a time; a multiple of 8 bytes
+BLOCK_SIZE = 1024 * 1024
+# Characters encoded at a time
+ENCODE_BLOCK = 256 * 1024
+# Buffer for writing compressed files
+WRITE_BUFFER = 1024 * 1024
+# Shorter text is quicker to encode without NumPy, which takes a while to set up
+NUMPY_MIN_BLOCK = 16 * 1024
 
 
 def main():
     args = parse_commandline_arguments()
+    if args.decompress:
+        decompress_file(args.input_file, args.output_file)
+        return
+    if args.bytes:
+        compress_file(args.input_file, args.output_file)
+        return
     data = read_data_from_file(args.input_file)
-    if data:
-        root = build_huffman_tree(data)
-        huffman_codes = generate_huffman_codes(root)
-        compressed_text, total_bits = compress_text(data, huffman_codes)
-        generate_compressed_file(
-            filename=args.output_file,
-            header=huffman_codes,
-            data=compressed_text,
-            total_bits=total_bits
-        )
-
-    # Decompression
-    # decompressed = decompress(args.output_file)
-    # print(f"Decompressed String: {decompressed}")
+    lengths = huffman_code_lengths(data)
+    huffman_codes = canonical_codes(lengths)
+    compressed_text, total_bits = compress_text(data, huffman_codes)
+    generate_compressed_file(
+        filename=args.output_file,
+        header=lengths,
+        data=compressed_text,
+        total_bits=total_bits
+    )
 
 
 def parse_commandline_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("input_file", help="Name/path of the file to compress")
     parser.add_argument("output_file", help="Name/path of the output file")
+    parser.add_argument("--bytes", action="store_true", help="Compress the file as bytes, which works for binary files too")
+    parser.add_argument("-d", "--decompress", action="store_true",
+                        help="Decompress input_file instead, as text or bytes as it was compressed")
     args = parser.parse_args()
     return args
 
@@ -75,155 +75,432 @@ def read_data_from_file(input_file):
     return data
 
 
-def build_huffman_tree(text):
-    char_frequency = Counter(text)
-    priority_queue = PriorityQueue()
-
-    for char, freq in char_frequency.items():
-        node = HuffmanNode(char, freq)
-        priority_queue.put(node)
-
-    while priority_queue.qsize() > 1:
-        left = priority_queue.get()
-        right = priority_queue.get()
-
-        parent_node = HuffmanNode(None, left.freq + right.freq)
-        parent_node.left = left
-        parent_node.right = right
-
-        priority_queue.put(parent_node)
-
-    return priority_queue.get()
-
-
-def generate_huffman_codes(root, current_code="", huffman_codes=None):
-    if huffman_codes is None:
-        huffman_codes = {}
-
-    if root is None:
-        return huffman_codes
-
-    if root.char:
-        huffman_codes[root.char] = current_code
-    generate_huffman_codes(root.left, current_code + "0", huffman_codes)
-    generate_huffman_codes(root.right, current_code + "1", huffman_codes)
-
+def huffman_code_lengths(text):
+    """The length of each character's code, at most MAX_CODE_LENGTH.
+    `text` may also be a mapping of each character to its count."""
+    counts = text if isinstance(text, dict) else Counter(text)
+    return code_lengths(counts, max(MAX_CODE_LENGTH, (len(counts) - 1).bit_length()))
+
+
+def canonical_codes(lengths):
+    """The canonical code for each character: in order of length, then of
+    character, each code is the previous one plus one, shifted left as
+    the length grows."""
+    huffman_codes = {}
+    code = 0
+    previous = 0
+    for char in sorted(lengths, key=lambda char: (lengths[char], char)):
+        length = lengths[char]
+        code <<= length - previous
+        huffman_codes[char] = format(code, f"0{length}b")
+        code += 1
+        previous = length
     return huffman_codes
 
 
 def compress_text(text, huffman_codes):
+    """Encode `text` with `huffman_codes`, a "0101" string code per
+    character; returns the packed bytes and the number of bits used."""
+    blocks = (text[start:start + ENCODE_BLOCK] for start in range(0, len(text), ENCODE_BLOCK))
     compressed_text = bytearray()
-    current_byte = 0
-    bits_written = 0
-    total_bits = 0
+    total_bits = encode_blocks(blocks, huffman_codes, compressed_text.extend)
+    return bytes(compressed_text), total_bits
 
-    for char in text:
-        code = huffman_codes[char]
-        for bit in code:
-            if bit == "1":
-                current_byte |= (1 << (7 - bits_written))
-            bits_written += 1
 
-            if bits_written == 8:
-                compressed_text.append(current_byte)
-                current_byte = 0
-                bits_written = 0
-                total_bits += 8
+def encode_blocks(blocks, huffman_codes, write):
+    """Encode each string in `blocks` in turn as one stream of bits, giving
+    the packed bytes to `write` as they are done; returns the number of
+    bits. The last byte is padded with zeros.
+
+    Blocks are encoded whole, with NumPy if it is installed and the first
+    block is at least NUMPY_MIN_BLOCK long. Otherwise str.translate turns
+    a block into its string of code bits and int(bits, 2) packs them, so
+    neither loops in Python per character or per bit.
+    """
+    blocks = iter(blocks)
+    first = next(blocks, "")
+    blocks = chain([first], blocks)
+    if np is not None and huffman_codes and len(first) >= NUMPY_MIN_BLOCK:
+        return _encode_blocks_numpy(blocks, huffman_codes, write)
+    table = str.maketrans(huffman_codes)
+    total_bits = 0
+    # Bits after the last whole byte of the previous block
+    carry = ""
+    for block in blocks:
+        bits = carry + block.translate(table)
+        if bits.strip("01"):
+            # translate() leaves characters without a code as they are
+            raise KeyError(next(char for char in block if char not in huffman_codes))
+        whole = len(bits) - len(bits) % 8
+        if whole:
+            write(int(bits[:whole], 2).to_bytes(whole // 8, "big"))
+        carry = bits[whole:]
+        total_bits += whole
 
     # Handle the case when there are remaining bits
-    if bits_written > 0:
-        compressed_text.append(current_byte)
-        total_bits += bits_written
+    if carry:
+        write(bytes([int(carry.ljust(8, "0"), 2)]))
+        total_bits += len(carry)
+
+    return total_bits
 
-    return bytes(compressed_text), total_bits
+
+def _encode_blocks_numpy(blocks, huffman_codes, write):
+    """encode_blocks() a block at a time: each character is looked up as a
+    (code, length) pair, a running sum of the lengths places each code in
+    the stream, and the codes are shifted into place and summed into
+    64-bit words. A code that crosses into the next word is split in two."""
+    top = max(map(ord, huffman_codes))
+    code_of = np.zeros(top + 1, np.uint64)
+    length_of = np.zeros(top + 1, np.uint64)
+    for char, code in huffman_codes.items():
+        code_of[ord(char)] = int(code, 2)
+        length_of[ord(char)] = len(code)
+    total_bits = 0
+    # The word being filled when a block ends, and how many bits it holds
+    carry = 0
+    carry_bits = 0
+    for block in blocks:
+        if not block:
+            continue
+        chars = np.frombuffer(block.encode("utf-32-le"), np.uint32)
+        if chars.max() > top or not length_of[chars].all():
+            raise KeyError(next(char for char in block if char not in huffman_codes))
+        codes = code_of[chars]
+        lengths = length_of[chars]
+        ends = np.cumsum(lengths) + np.uint64(carry_bits)
+        starts = ends - lengths
+        words = (starts >> np.uint64(6)).astype(np.intp)
+        # Bits left in the word after each code; negative if it spills over
+        room = 64 - (starts & np.uint64(63)).astype(np.int64) - lengths.astype(np.int64)
+        spills = room < 0
+        head = np.where(
+            spills,
+            codes >> np.clip(-room, 0, 63).astype(np.uint64),
+            codes << np.clip(room, 0, 63).astype(np.uint64),
+        )
+        tail = np.where(spills, codes << (64 + np.minimum(room, -1)).astype(np.uint64), np.uint64(0))
+        # The codes in a word do not overlap, so adding them is or-ing them
+        firsts = np.flatnonzero(np.diff(words)) + 1
+        firsts = np.concatenate(([0], firsts))
+        block_bits = int(ends[-1])
+        packed = np.zeros(block_bits // 64 + 2, np.uint64)
+        packed[0] = carry
+        packed[words[firsts]] |= np.add.reduceat(head, firsts)
+        packed[words[firsts] + 1] |= np.add.reduceat(tail, firsts)
+        whole_words = block_bits // 64
+        write(packed[:whole_words].astype(">u8").tobytes())
+        carry = int(packed[whole_words])
+        carry_bits = block_bits % 64
+        total_bits += whole_words * 64
+    if carry_bits:
+        write(carry.to_bytes(8, "big")[:(carry_bits + 7) // 8])
+    return total_bits + carry_bits
+
+
+def count_bytes(data):
+    """How often each byte occurs in `data`, keyed by its character, with
+    END_OF_DATA once. The data is counted a block at a time, by NumPy if
+    it is installed and otherwise by Counter."""
+    counts = [0] * 256
+    for start in range(0, len(data), BLOCK_SIZE):
+        block = data[start:start + BLOCK_SIZE]
+        if np is not None:
+            counts = np.bincount(np.frombuffer(block, np.uint8), minlength=256) + counts
+        else:
+            for byte, count in Counter(block).items():
+                counts[byte] += count
+    counts = list(map(int, counts))
+    frequencies = {chr(byte): count for byte, count in enumerate(counts) if count}
+    frequencies[END_OF_DATA] = 1
+    return frequencies
+
+
+def byte_blocks(data):
+    """`data` as text for compress_text(): ENCODE_BLOCK bytes at a time as
+    the characters with the same numbers, then END_OF_DATA."""
+    blocks = (bytes(data[start:start + ENCODE_BLOCK]).decode("latin-1") for start in range(0, len(data), ENCODE_BLOCK))
+    return chain(blocks, [END_OF_DATA])
+
+
+def compress_file(input_file, output_file):
+    """Compress any file as bytes. The input is mapped into memory rather
+    than read, and encoded a block at a time into a buffered file, so
+    neither the input nor the output is held whole; the header is filled
+    in at the end."""
+    with open(input_file, "rb") as source:
+        size = os.fstat(source.fileno()).st_size
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) if size else memoryview(b"") as data:
+            lengths = huffman_code_lengths(count_bytes(data))
+            huffman_codes = canonical_codes(lengths)
+            with open(output_file, "wb", buffering=WRITE_BUFFER) as target:
+                write_header(target, lengths, 0, 0, BYTES)
+                checksum = 0
+
+                def write(piece):
+                    nonlocal checksum
+                    checksum = zlib.crc32(piece, checksum)
+                    target.write(piece)
+
+                total_bits = encode_blocks(byte_blocks(data), huffman_codes, write)
+                target.seek(0)
+                write_header(target, lengths, total_bits, checksum, BYTES)
 
 
 def generate_compressed_file(filename, header, data, total_bits: int):
+    """Write the compressed data after a header holding `header`, the code
+    length of each character."""
     with open(filename, "wb") as fp:
-        header = json.dumps(header)
-        fp.write(header.encode() + DELIMITER.encode() + total_bits.to_bytes(8, "big") + DELIMITER.encode())
+        write_header(fp, header, total_bits, zlib.crc32(data))
         fp.write(data)
 
 
-def decompress(file):
-    with open(file, "rb") as fp:
-        huffman_codes = get_huffman_codes_from_header(fp)
-        root = build_huffman_tree_from_codes(huffman_codes)
-        total_bits = get_total_bits(fp)
-        text = extract_text(fp, root, total_bits)
-    return text
-
-
-def get_huffman_codes_from_header(fp):
-    header = b""
-    while True:
-        byte = fp.read(1)
-        if byte == DELIMITER.encode():
-            break
-        header += byte
-
-    # Deserialize the Huffman codes from the header
-    huffman_codes = json.loads(header.decode())
-    print(huffman_codes)
-    return huffman_codes
+def write_stream(fp, data):
+    """Compress text or bytes `data` into `fp` as header, code length
+    table and data, with codes of its own."""
+    if isinstance(data, str):
+        lengths = huffman_code_lengths(data)
+        compressed, total_bits = compress_text(data, canonical_codes(lengths))
+        flags = 0
+    else:
+        lengths = huffman_code_lengths(count_bytes(data))
+        compressed = bytearray()
+        total_bits = encode_blocks(byte_blocks(data), canonical_codes(lengths), compressed.extend)
+        flags = BYTES
+    write_header(fp, lengths, total_bits, zlib.crc32(compressed), flags)
+    fp.write(compressed)
+
+
+def write_header(fp, lengths, total_bits: int, checksum: int, flags: int = 0):
+    table = encode_code_lengths(lengths)
+    fp.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, total_bits, checksum, len(table)))
+    fp.write(table)
+
+
+def encode_code_lengths(lengths) -> bytes:
+    """The code length table is the longest length, the number of codes of
+    each length from 1 up, as varints, then the characters in canonical
+    order as UTF-8. That is all canonical codes need: about one byte per
+    character used."""
+    symbols = sorted(lengths, key=lambda char: (lengths[char], char))
+    max_length = max(lengths.values(), default=0)
+    counts = Counter(lengths.values())
+    table = bytearray([max_length])
+    for length in range(1, max_length + 1):
+        table += _varint(counts[length])
+    table += "".join(symbols).encode("utf-8")
+    return bytes(table)
+
+
+def _varint(value: int) -> bytes:
+    """`value` in 7-bit groups, low first, the top bit set on all but the last."""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
 
 
-def build_huffman_tree_from_codes(huffman_codes):
-    root = HuffmanNode(None, 0)  # Create a dummy root
+def decompress(file):
+    """The text of a compressed file, or its bytes if it was compressed as bytes."""
+    with open(file, "rb") as fp:
+        lengths, total_bits, checksum, flags = read_header(fp)
+        tables = build_decode_tables(canonical_codes(lengths))
+        text = extract_text(fp, tables, total_bits, checksum)
+    return to_bytes(text) if flags & BYTES else text
+
+
+def decompress_file(input_file, output_file):
+    """Write out what a compressed file holds: the bytes as they were, or
+    the text."""
+    data = decompress(input_file)
+    if isinstance(data, bytes):
+        with open(output_file, "wb") as fp:
+            fp.write(data)
+    else:
+        with open(output_file, "w") as fp:
+            fp.write(data)
+
+
+def to_bytes(text):
+    """The bytes of text decoded in byte mode, which ends with END_OF_DATA."""
+    if not text.endswith(END_OF_DATA):
+        raise ValueError("Compressed data is corrupt")
+    return text[:-1].encode("latin-1")
+
+
+def read_stream(fp):
+    """The text or bytes of one stream written by write_stream(), reading
+    `fp` no further than its end."""
+    lengths, total_bits, checksum, flags = read_header(fp)
+    data = fp.read((total_bits + 7) // 8)
+    tables = build_decode_tables(canonical_codes(lengths))
+    text = extract_text(io.BytesIO(data), tables, total_bits, checksum)
+    return to_bytes(text) if flags & BYTES else text
+
+
+def read_header(fp):
+    """The code lengths, number of data bits, checksum and flags from the
+    header, read with two reads."""
+    fixed = fp.read(HEADER.size)
+    if len(fixed) < HEADER.size or fixed[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a compressed file")
+    _, version, flags, total_bits, checksum, table_size = HEADER.unpack(fixed)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version}")
+    table = fp.read(table_size)
+    if len(table) < table_size or table_size == 0:
+        raise ValueError("Compressed file is truncated")
+    return decode_code_lengths(table), total_bits, checksum, flags
+
+
+def decode_code_lengths(table: bytes):
+    """The code lengths from a table made by encode_code_lengths()."""
+    position = 1
+    counts = []
+    for _ in range(table[0]):
+        count = shift = 0
+        while True:
+            byte = table[position]
+            position += 1
+            count |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        counts.append(count)
+    symbols = table[position:].decode("utf-8")
+    lengths = {}
+    start = 0
+    for length, count in enumerate(counts, 1):
+        lengths.update(dict.fromkeys(symbols[start:start + count], length))
+        start += count
+    return lengths
+
+
+def build_decode_tables(huffman_codes):
+    """
+    Tables for decoding TABLE_BITS bits at a time, indexed by the next
+    TABLE_BITS bits of input.
+
+    `single` gives the (char, code length) of the code the bits start with.
+    For a code longer than TABLE_BITS it gives (subtable, -n) instead, and
+    the n bits after those index the subtable, of (char, code length) too.
+    `multi` gives (text, bits) for all the whole codes that fit in the
+    bits, so that text typically comes out a few characters per lookup;
+    bits is 0 when the first code is too long to fit.
+    """
+    size = 1 << TABLE_BITS
+    single = [("", 0)] * size
+    long_codes = defaultdict(list)
     for char, code in huffman_codes.items():
-        node = root
-        for bit in code:
-            if bit == "0":
-                if node.left is None:
-                    node.left = HuffmanNode(None, 0)
-                node = node.left
-            else:
-                if node.right is None:
-                    node.right = HuffmanNode(None, 0)
-                node = node.right
-        node.char = char
-    return root
-
-
-def get_total_bits(fp):
-    header = fp.read(8)
-    total_bits = int.from_bytes(header, 'big')
-    fp.read(1)  # Delimiter
-    # total_bits = int.from_bytes(header, 'big')
-    print(total_bits)
-    return total_bits
-
-
-def extract_text(fp, root, total_bits):
-    # TODO: last character is not being handled
-    if not root:
-        return ""
-
-    current_node = root
-    decompressed_text = ""
-    bits_read = 0
-
-    while True:
-        byte = fp.read(1)
-        if not byte:
-            break
-
-        for bit in byte[0].to_bytes(1, "big"):
-            for i in range(8):
-                if (bit & (1 << (7 - i))) > 0:
-                    current_node = current_node.right
-                else:
-                    current_node = current_node.left
-
-                if current_node.char:
-                    decompressed_text += current_node.char
-                    current_node = root
-                bits_read += 1
-                if bits_read >= total_bits:
-                    break
-
-    return decompressed_text
+        length = len(code)
+        value = int(code, 2) if code else 0
+        if length <= TABLE_BITS:
+            shift = TABLE_BITS - length
+            single[value << shift:(value + 1) << shift] = [(char, length)] * (1 << shift)
+        else:
+            long_codes[value >> (length - TABLE_BITS)].append((char, value, length))
+
+    for prefix, codes in long_codes.items():
+        sub_bits = max(length for _, _, length in codes) - TABLE_BITS
+        subtable = [("", 0)] * (1 << sub_bits)
+        for char, value, length in codes:
+            rest = length - TABLE_BITS
+            shift = sub_bits - rest
+            value &= (1 << rest) - 1
+            subtable[value << shift:(value + 1) << shift] = [(char, length)] * (1 << shift)
+        single[prefix] = (subtable, -sub_bits)
+
+    mask = size - 1
+    multi = []
+    for index in range(size):
+        chars = []
+        used = 0
+        while True:
+            # The bits not used yet, moved to the top and padded with zeros
+            char, length = single[(index << used) & mask]
+            if length <= 0 or used + length > TABLE_BITS:
+                break
+            chars.append(char)
+            used += length
+        multi.append(("".join(chars), used))
+    max_length = max(map(len, huffman_codes.values()), default=0)
+    return single, multi, max_length
+
+
+def extract_text(fp, tables, total_bits, checksum=None):
+    """Decode `total_bits` bits from the rest of `fp`, checking the data
+    against its CRC-32 if `checksum` is given.
+
+    The data is read in blocks and unpacked into 64-bit words, which are
+    shifted into an integer bit buffer; each lookup in `multi` then takes
+    up to TABLE_BITS bits off the top of the buffer.
+    """
+    single, multi, max_length = tables
+    mask = (1 << TABLE_BITS) - 1
+    # Bits the buffer must hold for any code to be looked up whole
+    window = max(TABLE_BITS, max_length)
+    # Zero bytes after the data, so lookups near the end can look past it
+    padding = bytes(8 * (window // 64 + 1))
+    buffer = 0
+    count = 0
+    # Bits put in the buffer so far
+    appended = 0
+    blocks = []
+    pending = b""
+    crc = 0
+    while padding:
+        block = fp.read(BLOCK_SIZE)
+        crc = zlib.crc32(block, crc)
+        if not block:
+            # Also completes the last word
+            block = padding + bytes(-len(pending) % 8)
+            padding = b""
+        block = pending + block
+        pending = block[len(block) - len(block) % 8:]
+        block = block[:len(block) - len(pending)]
+        if not block:
+            continue
+        pieces = []
+        append = pieces.append
+        for word in struct.unpack(f">{len(block) // 8}Q", block):
+            buffer = (buffer & ((1 << count) - 1)) << 64 | word
+            count += 64
+            appended += 64
+            # Below this, the next TABLE_BITS bits could run past the end of the data
+            floor = max(window, TABLE_BITS + appended - total_bits)
+            while count >= floor:
+                text, length = multi[buffer >> (count - TABLE_BITS) & mask]
+                if length:
+                    append(text)
+                    count -= length
+                    continue
+                # A code longer than TABLE_BITS
+                subtable, sub_bits = single[buffer >> (count - TABLE_BITS) & mask]
+                char, length = subtable[buffer >> (count - TABLE_BITS + sub_bits) & ((1 << -sub_bits) - 1)]
+                append(char)
+                count -= length
+        blocks.append("".join(pieces))
+
+    if checksum is not None and crc != checksum:
+        raise ValueError("Compressed data is corrupt")
+
+    # The last few codes, one at a time, up to the exact end of the data
+    remaining = total_bits - appended + count
+    pieces = []
+    while remaining > 0:
+        char, length = single[buffer >> (count - TABLE_BITS) & mask]
+        if length < 0:
+            char, length = char[buffer >> (count - TABLE_BITS + length) & ((1 << -length) - 1)]
+        if length == 0 or length > remaining:
+            raise ValueError("Compressed data is corrupt")
+        pieces.append(char)
+        count -= length
+        remaining -= length
+    blocks.append("".join(pieces))
+    return "".join(blocks)
 
 
 if __name__ == '__main__':
-    unittest.main()
+    main()
@@ -1,9 +1,9 @@
 import abc
 import collections
-import functools
-import heapq
 from functools import total_ordering
 
+from codelengths import code_lengths
+
 
 class HuffmanBaseNode(abc.ABC):
     def is_leaf(self) -> bool:
@@ -63,39 +63,23 @@ class HuffmanInternalNode(HuffmanBaseNode):
         return self.weight < other.weight
 
 
-@total_ordering
-class HuffmanTree:
-
-    def __init__(self, weight: int, element: str = None):
-        self.__root: HuffmanLeafNode = HuffmanLeafNode(element, weight)
-
-    @functools.singledispatchmethod
-    def __init__(self, weight: int, left: HuffmanBaseNode = None, right: HuffmanBaseNode = None):
-        self.__root: HuffmanInternalNode = HuffmanInternalNode(left, right, weight)
-
-    @property
-    def root(self) -> HuffmanBaseNode:
-        return self.__root
-
-    @property
-    def weight(self) -> int:
-        return self.__root.weight
-
-    def __eq__(self, other: HuffmanBaseNode):
-        return self.weight == other.weight
-
-    def __lt__(self, other: HuffmanBaseNode):
-        return self.weight < other.weight
-
-
-def build_tree(pq):
-    temp3 = None
-    while len(pq) > 1:
-        temp1 = heapq.heappop(pq)
-        temp2 = heapq.heappop(pq)
-        temp3 = HuffmanTree(temp1.weight + temp2.weight, temp1, temp2)
-        heapq.heappush(pq, temp3)
-    return temp3
+def build_tree(character_counts) -> HuffmanBaseNode:
+    """The tree for the Huffman code of the counts, put together from the
+    code lengths: going up from the deepest level, each level is its
+    leaves, then the nodes made by pairing off the level below."""
+    lengths = code_lengths(character_counts)
+    leaves = collections.defaultdict(list)
+    for element in sorted(lengths, key=lambda element: (lengths[element], element)):
+        leaves[lengths[element]].append(HuffmanLeafNode(element, character_counts[element]))
+    if len(lengths) < 2:
+        return leaves[1][0] if lengths else None
+    nodes = []
+    for depth in range(max(lengths.values()), -1, -1):
+        nodes = leaves[depth] + [
+            HuffmanInternalNode(left, right, left.weight + right.weight)
+            for left, right in zip(nodes[0::2], nodes[1::2])
+        ]
+    return nodes[0]
 
 
 def traverse(root: HuffmanBaseNode, prefix="", indent=""):
@@ -109,17 +93,11 @@ def traverse(root: HuffmanBaseNode, prefix="", indent=""):
         traverse(root.left, prefix + "0", indent + "  ")
         traverse(root.right, prefix + "1", indent + "  ")
 
-    if isinstance(root, HuffmanTree):
-        traverse(root.root, prefix, indent)
-
 
 def main():
     text = "aaabbcccccddeffffghhh"
     character_counts = collections.Counter(text)
-    pq = []
-    for character, count in character_counts.items():
-        heapq.heappush(pq, HuffmanLeafNode(element=character, weight=count))
-    root = build_tree(pq)
+    root = build_tree(character_counts)
     traverse(root)
 
 
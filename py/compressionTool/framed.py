@@ -0,0 +1,237 @@
+"""
+A framed format for compress.py: the input is cut into fixed-size blocks,
+each compressed on its own, so that blocks can be compressed and
+decompressed in parallel, memory stays bounded however big the input is,
+and any one block can be decompressed without the others.
+
+    python framed.py compress big.log big.huf --jobs 4
+    python framed.py compress big.log big.huf --codec lz77 --level 9
+    cat big.log | python framed.py compress > big.huf
+    python framed.py decompress big.huf big.log
+    python framed.py extract big.huf --block 7
+
+Layout, all integers big-endian:
+
+    FRAME_HEADER    magic, format version, codec, block size
+    block ...       each its size then one block of input compressed
+                    with the codec: a compress.py stream of the bytes
+                    for "huffman", an lz77.py block for "lz77"
+    0               a size of zero to end the blocks
+    INDEX_ENTRY ... offset and size of each block in the file, and the
+                    size of its input
+    TRAILER         offset of the zero, number of blocks
+
+Blocks say how long they are, so a stream can be decompressed front to
+back without seeking; the index at the end is for random access. Both
+codecs work on bytes, so any file can be compressed.
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import compress
+import lz77
+
+FRAME_MAGIC = b"HUFS"
+FRAME_VERSION = 1
+# Magic, format version, codec, block size
+FRAME_HEADER = struct.Struct(">4sBBI")
+# Codecs by their number in the frame header
+CODECS = ["huffman", "lz77"]
+BLOCK_LENGTH = struct.Struct(">I")
+# Offset of the block in the file, its size there, size of its input
+INDEX_ENTRY = struct.Struct(">QII")
+# Offset of the index, number of blocks
+TRAILER = struct.Struct(">QI")
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+def encode_block(raw: bytes, codec: str = "huffman", level: int = lz77.DEFAULT_LEVEL) -> bytes:
+    """One block of input, compressed with `codec`."""
+    if codec == "lz77":
+        return lz77.encode(raw, level)
+    out = io.BytesIO()
+    compress.write_stream(out, raw)
+    return out.getvalue()
+
+
+def decode_block(block: bytes, codec: str = "huffman") -> bytes:
+    """The input of one block."""
+    if codec == "lz77":
+        return lz77.decode(block)
+    return compress.read_stream(io.BytesIO(block))
+
+
+def ordered_map(function, items, jobs: int):
+    """map(function, items) across `jobs` processes, in order. Only a few
+    items per process are in flight at a time, so a long input is not
+    read ahead of the results."""
+    if jobs <= 1:
+        yield from map(function, items)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_blocks(fp, block_size: int):
+    """The input in blocks of `block_size` bytes, but for the last."""
+    while True:
+        block = fp.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+def compress_stream(source, target, block_size: int = DEFAULT_BLOCK_SIZE, jobs: int = 1,
+                    codec: str = "huffman", level: int = lz77.DEFAULT_LEVEL) -> int:
+    """Compress binary file `source` into binary file `target`; returns the
+    number of blocks. `target` need not be seekable."""
+    target.write(FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, CODECS.index(codec), block_size))
+    offset = FRAME_HEADER.size
+    index = []
+    raw_sizes = deque()
+
+    def blocks():
+        for raw in read_blocks(source, block_size):
+            raw_sizes.append(len(raw))
+            yield raw
+
+    for block in ordered_map(partial(encode_block, codec=codec, level=level), blocks(), jobs):
+        target.write(BLOCK_LENGTH.pack(len(block)))
+        target.write(block)
+        index.append(INDEX_ENTRY.pack(offset, len(block), raw_sizes.popleft()))
+        offset += BLOCK_LENGTH.size + len(block)
+    target.write(BLOCK_LENGTH.pack(0))
+    target.write(b"".join(index))
+    target.write(TRAILER.pack(offset, len(index)))
+    return len(index)
+
+
+def read_frame_header(fp) -> tuple[str, int]:
+    """Check the frame header; returns the codec and block size."""
+    header = fp.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size or header[:len(FRAME_MAGIC)] != FRAME_MAGIC:
+        raise ValueError("Not a framed compressed file")
+    _, version, codec, block_size = FRAME_HEADER.unpack(header)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    if codec >= len(CODECS):
+        raise ValueError(f"Unknown codec {codec}")
+    return CODECS[codec], block_size
+
+
+def split_blocks(fp):
+    """The compressed blocks of a framed file, read front to back from
+    after the frame header up to the index."""
+    while True:
+        length = fp.read(BLOCK_LENGTH.size)
+        if len(length) < BLOCK_LENGTH.size:
+            raise ValueError("Compressed file is truncated")
+        (size,) = BLOCK_LENGTH.unpack(length)
+        if size == 0:
+            return
+        block = fp.read(size)
+        if len(block) < size:
+            raise ValueError("Compressed file is truncated")
+        yield block
+
+
+def decompress_stream(source, target, jobs: int = 1) -> None:
+    """Decompress framed binary file `source` into binary file `target`;
+    neither need be seekable."""
+    codec, _ = read_frame_header(source)
+    for raw in ordered_map(partial(decode_block, codec=codec), split_blocks(source), jobs):
+        target.write(raw)
+
+
+def read_index(fp) -> tuple[str, list[tuple[int, int, int]]]:
+    """The codec, and (offset, size, input size) of each block from the
+    trailer of a seekable framed file."""
+    fp.seek(0)
+    codec, _ = read_frame_header(fp)
+    fp.seek(-TRAILER.size, os.SEEK_END)
+    index_offset, count = TRAILER.unpack(fp.read(TRAILER.size))
+    fp.seek(index_offset)
+    if fp.read(BLOCK_LENGTH.size) != BLOCK_LENGTH.pack(0):
+        raise ValueError("Block index is missing or corrupt")
+    return codec, list(INDEX_ENTRY.iter_unpack(fp.read(INDEX_ENTRY.size * count)))
+
+
+def read_block(fp, number: int) -> bytes:
+    """Decompress just block `number` of a seekable framed file."""
+    codec, index = read_index(fp)
+    if not 0 <= number < len(index):
+        raise IndexError(f"Block {number} out of range; the file has {len(index)}")
+    offset, size, _ = index[number]
+    fp.seek(offset + BLOCK_LENGTH.size)
+    return decode_block(fp.read(size), codec)
+
+
+def _open(path, mode):
+    """`path`, or standard input or output for "-" or no path."""
+    if path in (None, "-"):
+        stream = sys.stdin if "r" in mode else sys.stdout
+        return open(stream.fileno(), mode, closefd=False)
+    return open(path, mode)
+
+
+def block_size_argument(value: str) -> int:
+    """A --block-size: a positive number of bytes that fits FRAME_HEADER."""
+    try:
+        size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid block size: {value!r}")
+    if not 0 < size < 1 << 32:
+        raise argparse.ArgumentTypeError(f"block size must be from 1 to {(1 << 32) - 1} bytes, not {size}")
+    return size
+
+
+def parse_commandline_arguments():
+    parser = argparse.ArgumentParser(description="Compress files in independently decodable blocks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("compress", "decompress"):
+        command = commands.add_parser(name)
+        command.add_argument("input_file", nargs="?", help="file to read; standard input if - or not given")
+        command.add_argument("output_file", nargs="?", help="file to write; standard output if - or not given")
+        command.add_argument("--jobs", type=int, default=os.cpu_count(), help="processes to use")
+    compress_command = commands.choices["compress"]
+    compress_command.add_argument("--block-size", type=block_size_argument, default=DEFAULT_BLOCK_SIZE, help="bytes of input per block")
+    compress_command.add_argument("--codec", choices=CODECS, default="huffman")
+    compress_command.add_argument(
+        "--level", type=int, choices=sorted(lz77.LEVELS), default=lz77.DEFAULT_LEVEL,
+        help="for lz77, how hard to look for matches")
+    extract = commands.add_parser("extract", help="decompress one block")
+    extract.add_argument("input_file")
+    extract.add_argument("output_file", nargs="?")
+    extract.add_argument("--block", type=int, required=True, help="number of the block, from 0")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_commandline_arguments()
+    with _open(args.input_file, "rb") as source, _open(args.output_file, "wb") as target:
+        try:
+            if args.command == "compress":
+                compress_stream(source, target, args.block_size, args.jobs, args.codec, args.level)
+            elif args.command == "decompress":
+                decompress_stream(source, target, args.jobs)
+            else:
+                target.write(read_block(source, args.block))
+        except (ValueError, IndexError) as err:
+            print(f"{args.command} failed: {err}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+An LZ77 front end for compress.py's Huffman coding, laid out like DEFLATE.
+
+    block = encode(data, level=6)
+    data == decode(block)
+
+A match finder replaces repeated strings of bytes with (length, distance)
+references to an earlier copy within WINDOW_SIZE bytes. Candidates come
+from hash chains: `head` maps each three bytes seen to the last position
+they started at, and `previous` links each position to the one before it
+with the same three bytes. The level sets how far down a chain to look,
+how long a match is good enough to stop looking, and whether to check if
+the next position has a longer match before taking one (lazy matching).
+
+As in DEFLATE, literals and match lengths share one alphabet (bytes 0-255,
+then length codes from 257), distances have another, and each length or
+distance code is followed by extra bits that pick the exact value. Here
+the symbols are kept as characters so compress.py can code each alphabet
+as text, and the extra bits are kept in a stream of their own:
+
+    LZ_HEADER       magic, format version, size and CRC-32 of the data
+    stream          literal and length symbols, as a compress.py stream
+    stream          distance symbols, as a compress.py stream
+    EXTRA_HEADER    number of extra bits, then the bits
+"""
+import io
+import re
+import struct
+import zlib
+from array import array
+
+import compress
+
+LZ_MAGIC = b"HLZ7"
+LZ_VERSION = 1
+# Magic, format version, size of the data, CRC-32 of the data
+LZ_HEADER = struct.Struct(">4sBII")
+EXTRA_HEADER = struct.Struct(">Q")
+
+WINDOW_SIZE = 32 * 1024
+MIN_MATCH = 3
+MAX_MATCH = 258
+# For each level: longest hash chain followed, match length that ends the
+# search, whether to look for a longer match one byte on
+LEVELS = {
+    1: (4, 8, False),
+    2: (8, 16, False),
+    3: (32, 32, False),
+    4: (16, 16, True),
+    5: (32, 32, True),
+    6: (128, 128, True),
+    7: (256, 128, True),
+    8: (1024, MAX_MATCH, True),
+    9: (4096, MAX_MATCH, True),
+}
+DEFAULT_LEVEL = 6
+# Levels below this do not add the positions inside a match to the chains
+INSERT_ALL_LEVEL = 4
+FIRST_LENGTH_SYMBOL = 257
+# A run of literals, or one length symbol
+TOKEN = re.compile("([\x00-\xff]+)|(.)", re.DOTALL)
+
+
+def _length_code(length: int) -> tuple[int, int]:
+    """DEFLATE's length code for `length` and its number of extra bits."""
+    value = length - MIN_MATCH
+    if value < 8:
+        return value, 0
+    if length == MAX_MATCH:
+        return 28, 0
+    extra = value.bit_length() - 3
+    return 4 * extra + (value >> extra & 3) + 4, extra
+
+
+def _distance_code(distance: int) -> tuple[int, int]:
+    """DEFLATE's distance code for `distance` and its number of extra bits."""
+    value = distance - 1
+    if value < 4:
+        return value, 0
+    extra = value.bit_length() - 2
+    return 2 * extra + (value >> extra & 1) + 2, extra
+
+
+def _code_tables(values, code_of, first_symbol: int):
+    """For each value, its symbol and extra bits as a "0101" string; and for
+    each code, the first value it stands for and its number of extra bits."""
+    symbols = {}
+    bases = {}
+    for value in values:
+        code, extra = code_of(value)
+        bases.setdefault(code, (value, extra))
+        offset = value - bases[code][0]
+        symbols[value] = (chr(first_symbol + code), format(offset, f"0{extra}b") if extra else "")
+    return symbols, [bases[code] for code in range(len(bases))]
+
+
+LENGTH_SYMBOLS, LENGTH_BASES = _code_tables(range(MIN_MATCH, MAX_MATCH + 1), _length_code, FIRST_LENGTH_SYMBOL)
+DISTANCE_SYMBOLS, DISTANCE_BASES = _code_tables(range(1, WINDOW_SIZE + 1), _distance_code, 0)
+
+
+def tokenize(data: bytes, level: int = DEFAULT_LEVEL) -> tuple[str, str, str]:
+    """The LZ77 parse of `data`: its literal and length symbols, its
+    distance symbols, and the extra bits of both as a "0101" string."""
+    max_chain, nice_length, lazy = LEVELS[level]
+    size = len(data)
+    head = {}
+    previous = array("l", [-1]) * size
+    # Positions below this are in the chains
+    inserted = 0
+
+    def find(position):
+        """The longest match for the bytes at `position`, as (length,
+        distance), or (0, 0); adds the positions up to it to the chains."""
+        nonlocal inserted
+        while inserted <= position:
+            key = data[inserted:inserted + MIN_MATCH]
+            previous[inserted] = head.get(key, -1)
+            head[key] = inserted
+            inserted += 1
+        best = MIN_MATCH - 1
+        best_distance = 0
+        limit = min(MAX_MATCH, size - position)
+        floor = max(position - WINDOW_SIZE, 0)
+        candidate = previous[position]
+        chain = max_chain
+        while candidate >= floor and chain:
+            # Candidates share the first three bytes; a longer match must
+            # also match at the end of the best one so far
+            if data[candidate + best] == data[position + best]:
+                length = MIN_MATCH
+                while length + 16 <= limit and (
+                        data[candidate + length:candidate + length + 16] == data[position + length:position + length + 16]):
+                    length += 16
+                while length < limit and data[candidate + length] == data[position + length]:
+                    length += 1
+                if length > best:
+                    best = length
+                    best_distance = position - candidate
+                    if length >= nice_length or length == limit:
+                        break
+            candidate = previous[candidate]
+            chain -= 1
+        return (best, best_distance) if best_distance else (0, 0)
+
+    litlens = []
+    distances = []
+    extras = []
+    position = 0
+    # Start of the literals not yet added to `litlens`
+    literals = 0
+    last = size - MIN_MATCH
+    while position <= last:
+        length, distance = find(position)
+        if length and lazy and length < nice_length and position < last:
+            next_length, next_distance = find(position + 1)
+            if next_length > length:
+                position += 1
+                length, distance = next_length, next_distance
+        if not length:
+            position += 1
+            continue
+        litlens.append(data[literals:position].decode("latin-1"))
+        symbol, extra = LENGTH_SYMBOLS[length]
+        litlens.append(symbol)
+        extras.append(extra)
+        symbol, extra = DISTANCE_SYMBOLS[distance]
+        distances.append(symbol)
+        extras.append(extra)
+        position += length
+        literals = position
+        if level < INSERT_ALL_LEVEL:
+            inserted = max(inserted, position)
+    litlens.append(data[literals:].decode("latin-1"))
+    return "".join(litlens), "".join(distances), "".join(extras)
+
+
+def encode(data: bytes, level: int = DEFAULT_LEVEL) -> bytes:
+    litlens, distances, extras = tokenize(data, level)
+    out = io.BytesIO()
+    out.write(LZ_HEADER.pack(LZ_MAGIC, LZ_VERSION, len(data), zlib.crc32(data)))
+    compress.write_stream(out, litlens)
+    compress.write_stream(out, distances)
+    out.write(EXTRA_HEADER.pack(len(extras)))
+    if extras:
+        extras += "0" * (-len(extras) % 8)
+        out.write(int(extras, 2).to_bytes(len(extras) // 8, "big"))
+    return out.getvalue()
+
+
+def decode(block: bytes) -> bytes:
+    fp = io.BytesIO(block)
+    header = fp.read(LZ_HEADER.size)
+    if len(header) < LZ_HEADER.size or header[:len(LZ_MAGIC)] != LZ_MAGIC:
+        raise ValueError("Not an LZ77 compressed block")
+    _, version, size, checksum = LZ_HEADER.unpack(header)
+    if version != LZ_VERSION:
+        raise ValueError(f"Unsupported LZ77 format version {version}")
+    litlens = compress.read_stream(fp)
+    distances = iter(compress.read_stream(fp))
+    (extra_count,) = EXTRA_HEADER.unpack(fp.read(EXTRA_HEADER.size))
+    extra_bytes = fp.read((extra_count + 7) // 8)
+    extras = format(int.from_bytes(extra_bytes, "big"), f"0{len(extra_bytes) * 8}b") if extra_bytes else ""
+    # Next unread extra bit
+    bit = 0
+
+    out = bytearray()
+    try:
+        for match in TOKEN.finditer(litlens):
+            if match[1]:
+                out += match[1].encode("latin-1")
+                continue
+            length, extra = LENGTH_BASES[ord(match[2]) - FIRST_LENGTH_SYMBOL]
+            if extra:
+                length += int(extras[bit:bit + extra], 2)
+                bit += extra
+            distance, extra = DISTANCE_BASES[ord(next(distances))]
+            if extra:
+                distance += int(extras[bit:bit + extra], 2)
+                bit += extra
+            start = len(out) - distance
+            if start < 0:
+                raise ValueError("Compressed data is corrupt")
+            if distance >= length:
+                out += out[start:start + length]
+            else:
+                # The copy overlaps what it writes: repeat the last `distance` bytes
+                out += (out[start:] * (length // distance + 1))[:length]
+    except (IndexError, StopIteration):
+        raise ValueError("Compressed data is corrupt") from None
+    if len(out) != size or zlib.crc32(out) != checksum:
+        raise ValueError("Compressed data is corrupt")
+    return bytes(out)
@@ -0,0 +1,302 @@
+"""
+A benchmark suite for the compression tools, with results as JSON.
+
+    python suite.py --json results.json
+    python suite.py --sizes-mb 1 8 --codecs huffman lz77:1 --block-sizes 65536 1048576
+    python suite.py --compare results.json
+    python suite.py --profile cprofile
+
+Each corpus is generated at each size, then compressed and decompressed
+through framed.py with each codec and block size, in this process. For
+each run it reports the ratio, MB/s each way, taking the best of
+--repeat, and the peak memory each way as traced by tracemalloc in a
+separate run, since tracing slows everything down. The corpora:
+
+    text    made-up words, drawn with Zipf-like frequencies
+    logs    log lines, as made by benchmark.py
+    random  uniformly random bytes, which do not compress
+    binary  fixed-size records of counters, timestamps and floats
+
+Codecs are "huffman" or "lz77:<level>". --compare reads an earlier
+--json file and fails if any run got slower or compressed worse by more
+than --tolerance.
+
+--profile puts compress.py's hot loops, encode_blocks (which
+compress_text is a wrapper for) and extract_text, under cProfile or
+tracemalloc for the whole suite, and reports what they spent at the end.
+Timings are then not comparable to unprofiled ones.
+"""
+import argparse
+import cProfile
+import io
+import json
+import platform
+import pstats
+import random
+import struct
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+import compress
+import framed
+from benchmark import make_log, measure
+
+CORPORA = ["text", "logs", "random", "binary"]
+DEFAULT_CODECS = ["huffman", "lz77:1", "lz77:6"]
+DEFAULT_BLOCK_SIZES = [64 * 1024, framed.DEFAULT_BLOCK_SIZE]
+HOT_LOOPS = ["encode_blocks", "extract_text"]
+MEGABYTE = 1024 * 1024
+VOCABULARY_SIZE = 5000
+LETTERS = "etaoinshrdlcumwfgypbvkjxqz"
+# Per thousand letters of English text
+LETTER_WEIGHTS = [127, 91, 82, 75, 70, 67, 63, 61, 60, 43, 40, 28, 28, 24, 24, 22, 20, 20, 19, 15, 10, 8, 2, 2, 1, 1]
+
+# Peaks of the running peak_memory calls from before their nested calls reset it
+_peaks = []
+
+
+def make_words(size: int, seed: int = 0) -> bytes:
+    """Lines of made-up words, with letters as common as in English and
+    the n-th commonest word 1/n as common as the commonest, as in natural
+    text."""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choices(LETTERS, LETTER_WEIGHTS, k=rng.randrange(1, 11)))
+                  for _ in range(VOCABULARY_SIZE)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    words = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choices(vocabulary, weights, k=rng.randrange(4, 16))) + "\n"
+        words.append(line)
+        length += len(line)
+    return "".join(words).encode("utf-8")[:size]
+
+
+def make_binary(size: int, seed: int = 0) -> bytes:
+    """Records of a timestamp that mostly ticks up by a little, two
+    counters and a float reading, packed little-endian."""
+    rng = random.Random(seed)
+    record = struct.Struct("<QIHf")
+    records = []
+    timestamp = 1_700_000_000_000
+    for index in range(size // record.size + 1):
+        timestamp += rng.choice((1, 1, 2, 5, 1000))
+        records.append(record.pack(timestamp, index, rng.randrange(8), rng.gauss(20, 3)))
+    return b"".join(records)[:size]
+
+
+def make_corpus(name: str, size: int, seed: int = 0) -> bytes:
+    if name == "text":
+        return make_words(size, seed)
+    if name == "logs":
+        return make_log(size, seed).encode("utf-8")
+    if name == "random":
+        return random.Random(seed).randbytes(size)
+    if name == "binary":
+        return make_binary(size, seed)
+    raise ValueError(f"Unknown corpus {name!r}")
+
+
+def parse_codec(spec: str) -> tuple[str, int]:
+    """"huffman" or "lz77:<level>" as (codec, level)."""
+    codec, _, level = spec.partition(":")
+    if codec not in framed.CODECS:
+        raise argparse.ArgumentTypeError(f"unknown codec {codec!r}")
+    if not level:
+        return codec, framed.lz77.DEFAULT_LEVEL
+    if level not in map(str, framed.lz77.LEVELS):
+        raise argparse.ArgumentTypeError(
+            f"unknown level {level!r}, choose from {', '.join(map(str, sorted(framed.lz77.LEVELS)))}")
+    return codec, int(level)
+
+
+def _keep_peak(peak: int) -> None:
+    """Count `peak` in the enclosing peak_memory call, if any."""
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], peak)
+
+
+def peak_memory(run) -> int:
+    """The most memory traced at once while `run` runs, in bytes. Calls
+    may nest: each keeps its caller's peak from before its reset."""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    _keep_peak(tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    _peaks.append(0)
+    try:
+        run()
+    finally:
+        peak = max(tracemalloc.get_traced_memory()[1], _peaks.pop())
+        if not tracing:
+            tracemalloc.stop()
+    _keep_peak(peak)
+    return peak - base
+
+
+def run_one(data: bytes, codec: str, level: int, block_size: int, repeat: int) -> dict:
+    def compress_data():
+        out = io.BytesIO()
+        framed.compress_stream(io.BytesIO(data), out, block_size, 1, codec, level)
+        return out.getvalue()
+
+    def decompress_data():
+        out = io.BytesIO()
+        framed.decompress_stream(io.BytesIO(packed), out)
+        return out.getvalue()
+
+    compress_seconds, packed = measure(compress_data, repeat)
+    decompress_seconds, result = measure(decompress_data, repeat)
+    if result != data:
+        raise SystemExit(f"{codec} got the wrong result")
+    megabytes = len(data) / MEGABYTE
+    return {
+        "ratio": round(len(data) / len(packed), 4),
+        "compressed_bytes": len(packed),
+        "compress_mb_s": round(megabytes / compress_seconds, 3),
+        "decompress_mb_s": round(megabytes / decompress_seconds, 3),
+        "compress_peak_mb": round(peak_memory(compress_data) / MEGABYTE, 3),
+        "decompress_peak_mb": round(peak_memory(decompress_data) / MEGABYTE, 3),
+    }
+
+
+def run_suite(corpora, sizes, codecs, block_sizes, repeat: int, report=None) -> list[dict]:
+    """One result for each corpus, size, codec and block size; each is
+    passed to `report` as it comes."""
+    results = []
+    for corpus in corpora:
+        for size in sizes:
+            data = make_corpus(corpus, size)
+            for codec, level in codecs:
+                for block_size in block_sizes:
+                    result = {
+                        "corpus": corpus,
+                        "size": size,
+                        "codec": codec if codec == "huffman" else f"{codec}:{level}",
+                        "block_size": block_size,
+                    }
+                    result.update(run_one(data, codec, level, block_size, repeat))
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+    return results
+
+
+@contextmanager
+def profile_hot_loops(kind: str, stats: dict):
+    """Run the suite with compress.py's HOT_LOOPS wrapped in cProfile or
+    tracemalloc; what they spent is put into `stats` at the end."""
+    originals = {name: getattr(compress, name) for name in HOT_LOOPS}
+    profiler = cProfile.Profile()
+    peaks = dict.fromkeys(HOT_LOOPS, 0)
+
+    def wrap(name, function):
+        def wrapper(*args, **kwargs):
+            if kind == "cprofile":
+                return profiler.runcall(function, *args, **kwargs)
+            result = None
+
+            def run():
+                nonlocal result
+                result = function(*args, **kwargs)
+
+            peaks[name] = max(peaks[name], peak_memory(run))
+            return result
+        return wrapper
+
+    for name, function in originals.items():
+        setattr(compress, name, wrap(name, function))
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(compress, name, function)
+    if kind == "cprofile":
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        stats["cprofile"] = out.getvalue()
+    else:
+        stats["peak_mb"] = {name: round(peak / MEGABYTE, 3) for name, peak in peaks.items()}
+
+
+def regressions(results, baseline, tolerance: float) -> list[str]:
+    """What got worse than in `baseline` by more than `tolerance`, as a
+    fraction, for the runs both have."""
+    key = lambda result: (result["corpus"], result["size"], result["codec"], result["block_size"])
+    earlier = {key(result): result for result in baseline}
+    found = []
+    for result in results:
+        before = earlier.get(key(result))
+        if before is None:
+            continue
+        for measure_name in ("ratio", "compress_mb_s", "decompress_mb_s"):
+            if result[measure_name] < before[measure_name] * (1 - tolerance):
+                found.append(f"{' '.join(map(str, key(result)))}: {measure_name} "
+                             f"{before[measure_name]} -> {result[measure_name]}")
+    return found
+
+
+def print_result(result: dict) -> None:
+    print(f"{result['corpus']:<7} {result['size'] / MEGABYTE:>6.2f} {result['codec']:<8} "
+          f"{result['block_size'] // 1024:>6}K {result['ratio']:>6.2f} "
+          f"{result['compress_mb_s']:>8.2f} {result['decompress_mb_s']:>8.2f} "
+          f"{result['compress_peak_mb']:>7.1f}M {result['decompress_peak_mb']:>7.1f}M", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the codecs on generated corpora")
+    parser.add_argument("--corpora", nargs="+", choices=CORPORA, default=CORPORA)
+    parser.add_argument("--sizes-mb", nargs="+", type=float, default=[1])
+    parser.add_argument("--codecs", nargs="+", type=parse_codec, default=list(map(parse_codec, DEFAULT_CODECS)),
+                        help='"huffman" or "lz77:<level>"')
+    parser.add_argument("--block-sizes", nargs="+", type=int, default=DEFAULT_BLOCK_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="file to write the results to, - for standard output")
+    parser.add_argument("--compare", help="results of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="fraction worse that counts as a regression")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="profile the hot loops")
+    args = parser.parse_args()
+
+    sizes = [int(size * MEGABYTE) for size in args.sizes_mb]
+    print(f"{'corpus':<7} {'MB':>6} {'codec':<8} {'block':>7} {'ratio':>6} "
+          f"{'in MB/s':>8} {'out MB/s':>8} {'in peak':>8} {'out peak':>8}", file=sys.stderr)
+    profile = {}
+    if args.profile:
+        with profile_hot_loops(args.profile, profile):
+            results = run_suite(args.corpora, sizes, args.codecs, args.block_sizes, args.repeat, print_result)
+    else:
+        results = run_suite(args.corpora, sizes, args.codecs, args.block_sizes, args.repeat, print_result)
+    if "cprofile" in profile:
+        print(profile["cprofile"], file=sys.stderr)
+    elif profile:
+        print(f"Peak memory of the hot loops, MB: {profile['peak_mb']}", file=sys.stderr)
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "numpy": compress.np.__version__ if compress.np is not None else None,
+            "results": results,
+        }
+        if "peak_mb" in profile:
+            report["hot_loop_peak_mb"] = profile["peak_mb"]
+        text = json.dumps(report, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w") as fp:
+                fp.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as fp:
+            found = regressions(results, json.load(fp)["results"], args.tolerance)
+        for line in found:
+            print(f"Regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest import mock
+
+import batch
+
+
+def write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(data)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        rng = random.Random(6)
+        self.files = {}
+        for i in range(40):
+            name = os.path.join(f"group{i % 3}", f"record{i}.json")
+            self.files[name] = b'{"id": %d, "name": "%s"}' % (i, b"x" * rng.randint(0, 50))
+            write(os.path.join(self.root, "records", name), self.files[name])
+        # Bytes the samples never contain still get a code
+        self.files["empty"] = b""
+        self.files["binary"] = bytes(range(256))
+        for name in ("empty", "binary"):
+            write(os.path.join(self.root, "records", name), self.files[name])
+        self.table = os.path.join(self.root, "json.table")
+        self.table_id = batch.write_table(self.table, batch.train([os.path.join(self.root, "records", "group0")]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_table_round_trip(self):
+        lengths = batch.train([self.path("records")])
+        self.assertEqual(len(lengths), 257)
+        table_id = batch.write_table(self.path("other.table"), lengths)
+        self.assertEqual(batch.read_table(self.path("other.table")), (table_id, lengths))
+
+    def test_round_trip(self):
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                packed, restored = self.path(f"packed{jobs}"), self.path(f"restored{jobs}")
+                files, size_in, _ = batch.compress_tree(self.path("records"), packed, self.table, jobs)
+                self.assertEqual(files, len(self.files))
+                self.assertEqual(size_in, sum(map(len, self.files.values())))
+                self.assertEqual(read(os.path.join(packed, "group1", "record1.json" + batch.SUFFIX))[:2],
+                                 batch.FILE_MAGIC)
+                batch.decompress_tree(packed, restored, [self.table], jobs)
+                for name, data in self.files.items():
+                    self.assertEqual(read(os.path.join(restored, name)), data)
+
+    def test_single_file(self):
+        record = self.path("records", "group2", "record2.json")
+        batch.compress_tree(record, self.path("packed"), self.table)
+        self.assertEqual(os.listdir(self.path("packed")), ["record2.json" + batch.SUFFIX])
+        batch.decompress_tree(self.path("packed", "record2.json" + batch.SUFFIX), self.path("restored"), [self.table])
+        self.assertEqual(read(self.path("restored", "record2.json")), self.files[os.path.join("group2", "record2.json")])
+
+    def test_failure_exit_status(self):
+        # A directory already where an output file should go
+        os.makedirs(self.path("packed", "binary" + batch.SUFFIX))
+        argv = ["batch.py", "compress", self.path("records"), self.path("packed"), "--table", self.table, "--jobs", "2"]
+        with mock.patch("sys.argv", argv), redirect_stderr(StringIO()) as stderr:
+            with self.assertRaises(SystemExit) as raised:
+                batch.main()
+        self.assertEqual(raised.exception.code, 1)
+        self.assertIn("compress failed:", stderr.getvalue())
+
+    def test_wrong_table(self):
+        batch.compress_tree(self.path("records"), self.path("packed"), self.table)
+        other = self.path("other.table")
+        batch.write_table(other, batch.train([self.path("records", "binary")]))
+        with self.assertRaises(ValueError):
+            batch.decompress_tree(self.path("packed"), self.path("restored"), [other])
+        # Any one of the given tables may match
+        batch.decompress_tree(self.path("packed"), self.path("restored"), [other, self.table])
+        self.assertEqual(read(self.path("restored", "binary")), self.files["binary"])
+
+    def test_bad_tables(self):
+        table = bytearray(read(self.table))
+        table[-1] ^= 0xFF
+        write(self.path("corrupt.table"), bytes(table))
+        write(self.path("not.table"), b"nothing")
+        for name in ("corrupt.table", "not.table"):
+            with self.subTest(name=name):
+                with self.assertRaises(ValueError):
+                    batch.read_table(self.path(name))
+
+    def test_not_compressed(self):
+        write(self.path("packed", "plain" + batch.SUFFIX), b"plain text")
+        with self.assertRaises(ValueError):
+            batch.decompress_tree(self.path("packed"), self.path("restored"), [self.table])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import heapq
+import random
+import unittest
+
+from codelengths import code_lengths, minimum_redundancy, package_merge
+from compressUsingInterfaces import HuffmanInternalNode, build_tree
+
+
+def heap_cost(weights):
+    """The cost of an optimal code, from Huffman's algorithm with a heap."""
+    heap = list(weights)
+    heapq.heapify(heap)
+    cost = 0
+    while len(heap) > 1:
+        merged = heapq.heappop(heap) + heapq.heappop(heap)
+        cost += merged
+        heapq.heappush(heap, merged)
+    return cost
+
+
+def cost(weights, lengths):
+    return sum(weight * length for weight, length in zip(weights, lengths))
+
+
+def kraft_sum(lengths):
+    return sum(2 ** -length for length in lengths)
+
+
+class TestCodeLengths(unittest.TestCase):
+    def test_example(self):
+        self.assertEqual(code_lengths({"a": 45, "b": 13, "c": 12, "d": 16, "e": 9, "f": 5}),
+                         {"f": 4, "e": 4, "c": 3, "b": 3, "d": 3, "a": 1})
+
+    def test_small_alphabets(self):
+        self.assertEqual(code_lengths({}), {})
+        self.assertEqual(code_lengths({"a": 7}), {"a": 1})
+        self.assertEqual(code_lengths({"a": 1, "b": 100}), {"a": 1, "b": 1})
+
+    def test_optimal_against_a_heap(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            weights = sorted(rng.randint(1, rng.choice((3, 100, 10 ** 6))) for _ in range(rng.randint(2, 300)))
+            lengths = minimum_redundancy(weights)
+            self.assertEqual(cost(weights, lengths), heap_cost(weights))
+            self.assertEqual(kraft_sum(lengths), 1)
+
+    def test_length_limit(self):
+        fibonacci = [1, 1]
+        while len(fibonacci) < 40:
+            fibonacci.append(fibonacci[-1] + fibonacci[-2])
+        self.assertEqual(max(minimum_redundancy(fibonacci)), 39)
+        for limit in (6, 12, 20):
+            lengths = package_merge(fibonacci, limit)
+            self.assertEqual(max(lengths), limit)
+            self.assertLessEqual(kraft_sum(lengths), 1)
+            # No worse than a flat code of the same length
+            self.assertLessEqual(cost(fibonacci, lengths), limit * sum(fibonacci))
+        limited = code_lengths(dict(enumerate(fibonacci)), 12)
+        self.assertEqual(max(limited.values()), 12)
+
+    def test_package_merge_is_optimal_when_unconstrained(self):
+        rng = random.Random(2)
+        for _ in range(50):
+            weights = sorted(rng.randint(1, 1000) for _ in range(rng.randint(2, 60)))
+            self.assertEqual(cost(weights, package_merge(weights, 60)), heap_cost(weights))
+
+    def test_too_many_symbols_for_the_limit(self):
+        with self.assertRaises(ValueError):
+            code_lengths(dict.fromkeys(range(9), 1), 3)
+
+    def test_tree_from_lengths(self):
+        counts = {char: count for char, count in zip("abcdefgh", (3, 2, 5, 2, 1, 4, 1, 3))}
+        depths = {}
+        stack = [(build_tree(counts), 0)]
+        while stack:
+            node, depth = stack.pop()
+            if isinstance(node, HuffmanInternalNode):
+                self.assertEqual(node.weight, node.left.weight + node.right.weight)
+                stack += [(node.left, depth + 1), (node.right, depth + 1)]
+            else:
+                depths[node.element] = depth
+        self.assertEqual(depths, code_lengths(counts))
+        self.assertEqual(build_tree({"a": 1}).element, "a")
+        self.assertIsNone(build_tree({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
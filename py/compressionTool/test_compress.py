@@ -0,0 +1,266 @@
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import compress
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def run_main(self, *args):
+        with mock.patch.object(sys, "argv", ["compress.py", *args]):
+            compress.main()
+
+    def test_compression_and_decompression(self):
+        input_file = os.path.join(HERE, "test.txt")
+        output_file = self.path("test_output.bin")
+
+        # Compress the test file
+        self.run_main(input_file, output_file)
+
+        original_text = compress.read_data_from_file(input_file)
+
+        # Decompress the compressed file
+        decompressed_text = compress.decompress(output_file)
+
+        # Compare the original text with the decompressed text
+        self.assertEqual(original_text, decompressed_text)
+
+    def test_bytes_from_the_command_line(self):
+        data = bytes(range(256)) * 50 + os.urandom(3000) + b"\x00" * 5000
+        with open(self.path("data.bin"), "wb") as fp:
+            fp.write(data)
+        self.run_main(self.path("data.bin"), self.path("data.huf"), "--bytes")
+        self.assertEqual(compress.decompress(self.path("data.huf")), data)
+        self.run_main(self.path("data.huf"), self.path("restored.bin"), "--decompress")
+        with open(self.path("restored.bin"), "rb") as fp:
+            self.assertEqual(fp.read(), data)
+
+    def test_text_from_the_command_line(self):
+        text = "ünïcode text\n" * 100 + "€"
+        with open(self.path("text.txt"), "w") as fp:
+            fp.write(text)
+        self.run_main(self.path("text.txt"), self.path("text.huf"))
+        self.run_main(self.path("text.huf"), self.path("restored.txt"), "-d")
+        self.assertEqual(compress.read_data_from_file(self.path("restored.txt")), text)
+
+    def test_empty_file_as_bytes(self):
+        open(self.path("empty"), "wb").close()
+        self.run_main(self.path("empty"), self.path("empty.huf"), "--bytes")
+        self.assertEqual(compress.decompress(self.path("empty.huf")), b"")
+
+    def test_count_bytes(self):
+        data = bytes(range(256)) + b"abc" * 1000
+        expected = {chr(byte): 1 for byte in range(256)}
+        for char in "abc":
+            expected[char] += 1000
+        expected[compress.END_OF_DATA] = 1
+        with mock.patch.object(compress, "BLOCK_SIZE", 1000):
+            self.assertEqual(compress.count_bytes(data), expected)
+            with mock.patch.object(compress, "np", None):
+                self.assertEqual(compress.count_bytes(memoryview(data)), expected)
+        self.assertEqual(compress.count_bytes(b""), {compress.END_OF_DATA: 1})
+
+    def test_file_in_many_blocks(self):
+        data = os.urandom(5000) + b"repeated " * 3000
+        with open(self.path("data.bin"), "wb") as fp:
+            fp.write(data)
+        with mock.patch.object(compress, "ENCODE_BLOCK", 1000), mock.patch.object(compress, "BLOCK_SIZE", 4096):
+            compress.compress_file(self.path("data.bin"), self.path("data.huf"))
+            self.assertEqual(compress.decompress(self.path("data.huf")), data)
+        self.assertLess(os.path.getsize(self.path("data.huf")), len(data))
+
+    def test_streams(self):
+        # Counts like the Fibonacci numbers give the longest codes there can be
+        fibonacci = [1, 1]
+        while len(fibonacci) < 30:
+            fibonacci.append(fibonacci[-1] + fibonacci[-2])
+        long_codes = "".join(chr(65 + i) * count for i, count in enumerate(fibonacci))
+        samples = ["", "a", "ab" * 40000, long_codes, b"", b"\xff", bytes(range(256)) * 300]
+        out = io.BytesIO()
+        for sample in samples:
+            compress.write_stream(out, sample)
+        out.seek(0)
+        for sample in samples:
+            self.assertEqual(compress.read_stream(out), sample)
+        self.assertEqual(out.read(), b"")
+
+    def test_code_lengths_are_limited(self):
+        fibonacci = [1, 1]
+        while len(fibonacci) < 30:
+            fibonacci.append(fibonacci[-1] + fibonacci[-2])
+        lengths = compress.huffman_code_lengths({chr(65 + i): count for i, count in enumerate(fibonacci)})
+        self.assertEqual(max(lengths.values()), compress.MAX_CODE_LENGTH)
+        self.assertEqual(sum(2 ** -length for length in lengths.values()), 1)
+
+    def test_corrupt_data(self):
+        out = io.BytesIO()
+        compress.write_stream(out, "some text to compress " * 100)
+        data = bytearray(out.getvalue())
+        data[-10] ^= 0xFF
+        with self.assertRaises(ValueError):
+            compress.read_stream(io.BytesIO(bytes(data)))
+        with self.assertRaises(ValueError):
+            compress.read_stream(io.BytesIO(b"nope" + bytes(40)))
+
+
+def long_code_lengths(symbols: int = 60):
+    """Code lengths for `symbols` characters, from 1 up to MAX_CODE_LENGTH,
+    so that many codes are longer than TABLE_BITS."""
+    counts = {chr(0x41 + i): 1 << max(0, symbols - i - 20) for i in range(symbols)}
+    return compress.huffman_code_lengths(counts)
+
+
+class TestDecodeTables(unittest.TestCase):
+
+    def walk(self, huffman_codes, bits):
+        """Decode a "0101" string the slow way, a bit at a time."""
+        chars = {code: char for char, code in huffman_codes.items()}
+        text = []
+        code = ""
+        for bit in bits:
+            code += bit
+            if code in chars:
+                text.append(chars[code])
+                code = ""
+        return "".join(text)
+
+    def test_matches_bit_at_a_time_decoding(self):
+        rng = random.Random(9)
+        for lengths in (long_code_lengths(), compress.huffman_code_lengths("abracadabra"), {"x": 1, "y": 1}):
+            huffman_codes = compress.canonical_codes(lengths)
+            tables = compress.build_decode_tables(huffman_codes)
+            for size in (0, 1, 7, 1000, 50000):
+                with self.subTest(symbols=len(lengths), size=size):
+                    text = "".join(rng.choices(list(huffman_codes), k=size))
+                    data, total_bits = compress.compress_text(text, huffman_codes)
+                    bits = format(int.from_bytes(data, "big"), f"0{len(data) * 8}b")[:total_bits] if data else ""
+                    self.assertEqual(self.walk(huffman_codes, bits), text)
+                    self.assertEqual(compress.extract_text(io.BytesIO(data), tables, total_bits), text)
+
+    def test_table_entries(self):
+        huffman_codes = compress.canonical_codes(long_code_lengths())
+        self.assertGreater(max(map(len, huffman_codes.values())), compress.TABLE_BITS)
+        single, multi, max_length = compress.build_decode_tables(huffman_codes)
+        self.assertEqual(max_length, max(map(len, huffman_codes.values())))
+        for index in range(0, 1 << compress.TABLE_BITS, 37):
+            bits = format(index, f"0{compress.TABLE_BITS}b")
+            # The longest run of whole codes the bits start with
+            text = self.walk(huffman_codes, bits)
+            used = sum(len(huffman_codes[char]) for char in text)
+            self.assertEqual(multi[index], (text, used))
+            entry, length = single[index]
+            if length > 0:
+                self.assertEqual(huffman_codes[entry], bits[:length])
+            else:
+                # A prefix of codes too long for the table, resolved by its subtable
+                self.assertEqual(text, "")
+                self.assertEqual(len(entry), 1 << -length)
+
+    def test_checksum(self):
+        huffman_codes = compress.canonical_codes(compress.huffman_code_lengths("checksum"))
+        data, total_bits = compress.compress_text("checksum" * 100, huffman_codes)
+        tables = compress.build_decode_tables(huffman_codes)
+        with self.assertRaises(ValueError):
+            compress.extract_text(io.BytesIO(data), tables, total_bits, checksum=0)
+
+
+class TestCanonicalCodes(unittest.TestCase):
+
+    def test_codes(self):
+        lengths = {"a": 2, "b": 1, "c": 3, "d": 3}
+        self.assertEqual(compress.canonical_codes(lengths), {"b": "0", "a": "10", "c": "110", "d": "111"})
+        huffman_codes = compress.canonical_codes(long_code_lengths())
+        codes = sorted(huffman_codes.values())
+        for code, following in zip(codes, codes[1:]):
+            self.assertFalse(following.startswith(code))
+        # Same length codes are consecutive in character order
+        for char, following in zip(huffman_codes, list(huffman_codes)[1:]):
+            if len(huffman_codes[char]) == len(huffman_codes[following]):
+                self.assertEqual(int(huffman_codes[following], 2), int(huffman_codes[char], 2) + 1)
+
+    def test_code_length_table(self):
+        samples = [
+            {"a": 1},
+            compress.huffman_code_lengths("mississippi river"),
+            long_code_lengths(),
+            # More than 127 codes of one length need a second varint byte
+            compress.huffman_code_lengths({chr(0x4E00 + i): 1 for i in range(300)}),
+            compress.huffman_code_lengths("ascii, é, 😀 and " + compress.END_OF_DATA),
+        ]
+        for lengths in samples:
+            with self.subTest(symbols=len(lengths)):
+                table = compress.encode_code_lengths(lengths)
+                self.assertEqual(compress.decode_code_lengths(table), lengths)
+        # About a byte per character for ASCII text
+        lengths = compress.huffman_code_lengths(compress.read_data_from_file(os.path.join(HERE, "test.txt")))
+        self.assertLess(len(compress.encode_code_lengths(lengths)), len(lengths) + 25)
+
+    def test_header(self):
+        out = io.BytesIO()
+        lengths = compress.huffman_code_lengths("header")
+        compress.write_header(out, lengths, 1234, 99, compress.BYTES)
+        out.write(b"data")
+        out.seek(0)
+        self.assertEqual(compress.read_header(out), (lengths, 1234, 99, compress.BYTES))
+        self.assertEqual(out.read(), b"data")
+        data = out.getvalue()
+        for damaged in (data[:10], data[:compress.HEADER.size + 2], data[:4] + b"\x09" + data[5:]):
+            with self.assertRaises(ValueError):
+                compress.read_header(io.BytesIO(damaged))
+
+
+@unittest.skipIf(compress.np is None, "NumPy is not installed")
+class TestEncoders(unittest.TestCase):
+
+    def encode(self, blocks, huffman_codes):
+        out = bytearray()
+        total_bits = compress.encode_blocks(blocks, huffman_codes, out.extend)
+        return bytes(out), total_bits
+
+    def test_numpy_matches_translate(self):
+        rng = random.Random(10)
+        for lengths in (long_code_lengths(), compress.huffman_code_lengths("ab"), {"z": 1}):
+            huffman_codes = compress.canonical_codes(lengths)
+            chars = list(huffman_codes)
+            sizes = [compress.NUMPY_MIN_BLOCK, 1, 0, 3, 64, 20000, 7]
+            blocks = ["".join(rng.choices(chars, k=size)) for size in sizes]
+            with self.subTest(symbols=len(lengths)):
+                encoded = self.encode(blocks, huffman_codes)
+                with mock.patch.object(compress, "np", None):
+                    self.assertEqual(self.encode(blocks, huffman_codes), encoded)
+                tables = compress.build_decode_tables(huffman_codes)
+                self.assertEqual(compress.extract_text(io.BytesIO(encoded[0]), tables, encoded[1]), "".join(blocks))
+
+    def test_small_first_block_uses_translate(self):
+        huffman_codes = compress.canonical_codes(compress.huffman_code_lengths("abc"))
+        with mock.patch.object(compress, "_encode_blocks_numpy") as numpy_encoder:
+            self.encode(["abc", "a" * compress.NUMPY_MIN_BLOCK], huffman_codes)
+        numpy_encoder.assert_not_called()
+
+    def test_characters_without_a_code(self):
+        huffman_codes = compress.canonical_codes(compress.huffman_code_lengths("ab"))
+        block = "ab" * compress.NUMPY_MIN_BLOCK + "c"
+        with self.assertRaises(KeyError):
+            self.encode([block], huffman_codes)
+        with mock.patch.object(compress, "np", None):
+            with self.assertRaises(KeyError):
+                self.encode([block], huffman_codes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import framed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def sample(size: int) -> bytes:
+    rng = random.Random(5)
+    words = [rng.randbytes(rng.randint(2, 10)) for _ in range(200)]
+    data = b" ".join(rng.choice(words) for _ in range(size // 6))
+    return data[:size]
+
+
+class TestFramed(unittest.TestCase):
+    def compress(self, data: bytes, **options) -> bytes:
+        out = io.BytesIO()
+        framed.compress_stream(io.BytesIO(data), out, **options)
+        return out.getvalue()
+
+    def decompress(self, packed: bytes, jobs: int = 1) -> bytes:
+        out = io.BytesIO()
+        framed.decompress_stream(io.BytesIO(packed), out, jobs)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        data = sample(100000)
+        for codec in framed.CODECS:
+            for block_size in (1000, 30000, 1 << 20):
+                with self.subTest(codec=codec, block_size=block_size):
+                    packed = self.compress(data, block_size=block_size, codec=codec, level=1)
+                    self.assertEqual(self.decompress(packed), data)
+        # Blocks end between characters, not part way through one
+        data = "é€😀 text ".encode() * 5000
+        self.assertEqual(self.decompress(self.compress(data, block_size=1000)), data)
+        self.assertEqual(self.decompress(self.compress(b"")), b"")
+
+    def test_parallel_matches_serial(self):
+        data = sample(60000)
+        packed = self.compress(data, block_size=8000, jobs=1)
+        self.assertEqual(self.compress(data, block_size=8000, jobs=2), packed)
+        self.assertEqual(self.decompress(packed, jobs=2), data)
+
+    def test_random_access(self):
+        data = sample(50000)
+        fp = io.BytesIO(self.compress(data, block_size=7000, codec="lz77", level=1))
+        codec, index = framed.read_index(fp)
+        self.assertEqual(codec, "lz77")
+        self.assertEqual([raw_size for _, _, raw_size in index], [7000] * 7 + [1000])
+        self.assertEqual(framed.read_block(fp, 3), data[21000:28000])
+        self.assertEqual(framed.read_block(fp, 7), data[49000:])
+        with self.assertRaises(IndexError):
+            framed.read_block(fp, 8)
+
+    def test_bad_input(self):
+        packed = self.compress(sample(20000), block_size=5000)
+        with self.assertRaises(ValueError):
+            self.decompress(b"nope" + packed[4:])
+        with self.assertRaises(ValueError):
+            self.decompress(packed[:len(packed) // 2])
+
+    def test_command_line(self):
+        data = sample(40000)
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "data")
+            with open(source, "wb") as fp:
+                fp.write(data)
+            script = os.path.join(HERE, "framed.py")
+            subprocess.run([sys.executable, script, "compress", source, source + ".huf", "--block-size", "9000",
+                            "--jobs", "2", "--codec", "lz77", "--level", "2"], check=True, cwd=HERE)
+            restored = subprocess.run([sys.executable, script, "decompress", source + ".huf"],
+                                      check=True, cwd=HERE, stdout=subprocess.PIPE).stdout
+            self.assertEqual(restored, data)
+            block = subprocess.run([sys.executable, script, "extract", source + ".huf", "--block", "1"],
+                                   check=True, cwd=HERE, stdout=subprocess.PIPE).stdout
+            self.assertEqual(block, data[9000:18000])
+            for size in ("0", "-5", str(1 << 32), "big"):
+                with self.subTest(block_size=size):
+                    result = subprocess.run([sys.executable, script, "compress", source, source + ".bad",
+                                             "--block-size", size], cwd=HERE, stderr=subprocess.PIPE)
+                    self.assertEqual(result.returncode, 2)
+                    self.assertIn(b"--block-size", result.stderr)
+                    self.assertFalse(os.path.exists(source + ".bad"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+import lz77
+
+
+def samples():
+    rng = random.Random(3)
+    yield b""
+    yield b"a"
+    yield b"ab"
+    yield b"abc" * 1000
+    # A run longer than MAX_MATCH, copied from one byte back
+    yield b"x" + b"y" * 2000
+    yield bytes(range(256)) * 20
+    yield rng.randbytes(5000)
+    words = [rng.randbytes(rng.randint(3, 12)) for _ in range(40)]
+    yield b" ".join(rng.choice(words) for _ in range(5000))
+    # Repeats further apart than the window
+    block = rng.randbytes(lz77.WINDOW_SIZE + 100)
+    yield block + block
+
+
+class TestLZ77(unittest.TestCase):
+    def test_round_trip_at_every_level(self):
+        for level in lz77.LEVELS:
+            for data in samples():
+                with self.subTest(level=level, size=len(data)):
+                    self.assertEqual(lz77.decode(lz77.encode(data, level)), data)
+
+    def test_repeats_compress(self):
+        data = b"the same line of text over and over\n" * 500
+        for level in (1, 6, 9):
+            self.assertLess(len(lz77.encode(data, level)), len(data) // 20)
+
+    def test_higher_levels_find_more(self):
+        rng = random.Random(4)
+        words = [rng.randbytes(rng.randint(3, 8)) for _ in range(300)]
+        data = b" ".join(rng.choice(words) for _ in range(20000))
+        self.assertLessEqual(len(lz77.encode(data, 9)), len(lz77.encode(data, 1)))
+
+    def test_length_and_distance_codes(self):
+        # Every length and distance comes back from its symbol and extra bits
+        for value, (symbol, extra) in lz77.LENGTH_SYMBOLS.items():
+            base, extra_bits = lz77.LENGTH_BASES[ord(symbol) - lz77.FIRST_LENGTH_SYMBOL]
+            self.assertEqual(len(extra), extra_bits)
+            self.assertEqual(base + (int(extra, 2) if extra else 0), value)
+        for value, (symbol, extra) in lz77.DISTANCE_SYMBOLS.items():
+            base, extra_bits = lz77.DISTANCE_BASES[ord(symbol)]
+            self.assertEqual(base + (int(extra, 2) if extra else 0), value)
+        self.assertEqual(len(lz77.LENGTH_BASES), 29)
+        self.assertEqual(len(lz77.DISTANCE_BASES), 30)
+
+    def test_corrupt_blocks(self):
+        block = bytearray(lz77.encode(b"some data that repeats, some data that repeats", 6))
+        with self.assertRaises(ValueError):
+            lz77.decode(b"nope" + bytes(block[4:]))
+        block[-1] ^= 0xFF
+        with self.assertRaises(ValueError):
+            lz77.decode(bytes(block))
+
+
+if __name__ == "__main__":
+    unittest.main()
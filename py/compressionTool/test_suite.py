@@ -0,0 +1,86 @@
+import argparse
+import unittest
+
+import compress
+import suite
+
+
+class TestSuite(unittest.TestCase):
+    def test_corpora(self):
+        for name in suite.CORPORA:
+            with self.subTest(corpus=name):
+                data = suite.make_corpus(name, 5000)
+                self.assertEqual(len(data), 5000)
+                self.assertEqual(suite.make_corpus(name, 5000), data)
+                self.assertNotEqual(suite.make_corpus(name, 5000, seed=1), data)
+        with self.assertRaises(ValueError):
+            suite.make_corpus("images", 10)
+
+    def test_parse_codec(self):
+        self.assertEqual(suite.parse_codec("huffman")[0], "huffman")
+        self.assertEqual(suite.parse_codec("lz77:9"), ("lz77", 9))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            suite.parse_codec("zstd")
+        for spec in ("lz77:0", "lz77:99", "lz77:x"):
+            with self.subTest(spec=spec):
+                with self.assertRaises(argparse.ArgumentTypeError):
+                    suite.parse_codec(spec)
+
+    def test_run_suite(self):
+        reported = []
+        results = suite.run_suite(["text", "random"], [6000], [("huffman", 0), ("lz77", 1)], [4096], 1,
+                                  reported.append)
+        self.assertEqual(results, reported)
+        self.assertEqual([(result["corpus"], result["codec"]) for result in results],
+                         [("text", "huffman"), ("text", "lz77:1"), ("random", "huffman"), ("random", "lz77:1")])
+        text_ratio, random_ratio = results[0]["ratio"], results[2]["ratio"]
+        self.assertGreater(text_ratio, 1.3)
+        self.assertLess(random_ratio, 1)
+        self.assertTrue(all(result["compress_peak_mb"] > 0 for result in results))
+
+    def test_regressions(self):
+        baseline = [{"corpus": "text", "size": 1, "codec": "huffman", "block_size": 2,
+                     "ratio": 2.0, "compress_mb_s": 10.0, "decompress_mb_s": 10.0}]
+        results = [dict(baseline[0], compress_mb_s=9.5, decompress_mb_s=5.0)]
+        found = suite.regressions(results, baseline, 0.1)
+        self.assertEqual(len(found), 1)
+        self.assertIn("decompress_mb_s 10.0 -> 5.0", found[0])
+        self.assertEqual(suite.regressions(results, [], 0.1), [])
+
+    def test_peak_memory_nests(self):
+        inner_peaks = []
+
+        def inner():
+            block = bytearray(2 * suite.MEGABYTE)
+            del block
+
+        def middle():
+            block = bytearray(4 * suite.MEGABYTE)
+            del block
+            inner_peaks.append(suite.peak_memory(inner))
+
+        def outer():
+            suite.peak_memory(middle)
+
+        outer_peak = suite.peak_memory(outer)
+        self.assertGreaterEqual(inner_peaks[0], 2 * suite.MEGABYTE)
+        self.assertLess(inner_peaks[0], 3 * suite.MEGABYTE)
+        # The peak survives the resets of the calls nested two deep
+        self.assertGreaterEqual(outer_peak, 4 * suite.MEGABYTE)
+
+    def test_profile_hot_loops(self):
+        originals = [getattr(compress, name) for name in suite.HOT_LOOPS]
+        for kind in ("cprofile", "tracemalloc"):
+            with self.subTest(kind=kind):
+                stats = {}
+                with suite.profile_hot_loops(kind, stats):
+                    suite.run_suite(["text"], [6000], [("huffman", 0)], [4096], 1)
+                self.assertEqual([getattr(compress, name) for name in suite.HOT_LOOPS], originals)
+                if kind == "cprofile":
+                    self.assertIn("encode_blocks", stats["cprofile"])
+                else:
+                    self.assertGreater(stats["peak_mb"]["extract_text"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+Throughput of jsonParser against the stdlib json module.
+
+    python benchmark.py --size-mb 100
+    python benchmark.py --sparse
+
+A document of roughly the requested size is generated from records mixing
+strings (some with escapes and non-ASCII), integers, floats, literals and
+nested containers, then parsed by both. Results are checked to be equal.
+
+--sparse instead measures the latency of reading four fields out of a
+document with thousands, by full parsing and with lazy.py's on-demand view.
+--serialize times writing the parsed document back out with serializer.py.
+--memory compares the peak memory allocated while parsing into native
+values and into tape.py's tape.
+--schema times decoding into dataclasses: parsing and then converting the
+result, against schema.py's decoder compiled from the dataclasses.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import jsonParser
+import serializer
+from lazy import lazy_loads
+from schema import compile_schema
+from tape import Tape
+
+
+@dataclass
+class Address:
+    city: str
+    zip: str
+
+
+@dataclass
+class Record:
+    id: int
+    name: str
+    score: float
+    active: bool
+    tags: list[str]
+    address: Address
+
+
+@dataclass
+class Records:
+    records: list[Record]
+
+
+def to_records(value: dict) -> Records:
+    """The second walk of parse-then-convert."""
+    return Records([
+        Record(record["id"], record["name"], record["score"], record["active"], record["tags"],
+               Address(record["address"]["city"], record["address"]["zip"]))
+        for record in value["records"]
+    ])
+
+
+def make_record(rng: random.Random, index: int) -> dict:
+    return {
+        "id": index,
+        "name": f"user{index}",
+        "email": f"user{index}@example.com",
+        "score": rng.random() * 1000,
+        "balance": rng.randint(-10 ** 6, 10 ** 6),
+        "active": rng.random() < 0.5,
+        "manager": None,
+        "tags": [rng.choice(["red", "green", "blue", "café", "東京"]) for _ in range(rng.randint(0, 5))],
+        "address": {"street": f"{index} Main St", "city": "Springfield", "zip": f"{rng.randint(0, 99999):05d}"},
+        "bio": 'Says "hi"\n\tand leaves' if index % 10 == 0 else "Nothing to see here",
+    }
+
+
+def make_document(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        part = json.dumps(make_record(rng, index))
+        parts.append(part)
+        total += len(part) + 2
+        index += 1
+    return '{"records": [' + ", ".join(parts) + "]}"
+
+
+def make_wide_document(fields: int, seed: int = 0) -> str:
+    """One object with `fields` members, every tenth an object or array."""
+    rng = random.Random(seed)
+    document = {}
+    for index in range(fields):
+        if index % 20 == 0:
+            document[f"field{index}"] = make_record(rng, index)
+        elif index % 20 == 10:
+            document[f"field{index}"] = [rng.randint(0, 1000) for _ in range(10)]
+        elif index % 2:
+            document[f"field{index}"] = f"value {index}"
+        else:
+            document[f"field{index}"] = rng.random()
+    return json.dumps(document)
+
+
+def extract(document) -> tuple:
+    return (
+        document["field7"],
+        document["field1500"]["address"]["city"],
+        document["field2010"][3],
+        document["field2999"],
+    )
+
+
+def benchmark_sparse(fields: int, repeat: int) -> None:
+    document = make_wide_document(fields)
+    print(f"Document: {fields} fields, {len(document) / 1024:.0f} KB; reading 4 of them")
+    print(f"{'parser':<12} {'us/doc':>10} {'speedup':>8}")
+    baseline = None
+    expected = extract(json.loads(document))
+    for name, parse in (("json", json.loads), ("jsonParser", jsonParser.loads), ("lazy", lazy_loads)):
+        seconds, result = measure(lambda text: extract(parse(text)), document, repeat)
+        if result != expected:
+            raise SystemExit(f"{name} read {result}, expected {expected}")
+        baseline = baseline or seconds
+        print(f"{name:<12} {seconds * 1e6:>10.0f} {baseline / seconds:>7.1f}x")
+
+
+def measure(parse, document: str, repeat: int) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        result = None
+        started = time.perf_counter()
+        result = parse(document)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def measure_memory(parse, document: str) -> int:
+    """Peak bytes allocated by `parse`, not counting the document itself."""
+    tracemalloc.start()
+    try:
+        result = parse(document)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sparse", action="store_true", help="time reading a few fields of a wide document")
+    parser.add_argument("--fields", type=int, default=3000)
+    parser.add_argument("--serialize", action="store_true", help="time serializing instead of parsing")
+    parser.add_argument("--memory", action="store_true", help="measure peak memory instead of time")
+    parser.add_argument("--schema", action="store_true", help="time decoding into dataclasses")
+    args = parser.parse_args()
+    if args.sparse:
+        benchmark_sparse(args.fields, max(args.repeat, 20))
+        return
+
+    document = make_document(int(args.size_mb * 1024 * 1024))
+    megabytes = len(document.encode()) / (1024 * 1024)
+    print(f"Document: {megabytes:.1f} MB")
+
+    if args.memory:
+        print(f"{'parser':<12} {'peak MB':>8} {'x input':>8}")
+        for name, parse in (("jsonParser", jsonParser.loads), ("tape", Tape)):
+            peak = measure_memory(parse, document)
+            print(f"{name:<12} {peak / (1024 * 1024):>8.1f} {peak / len(document.encode()):>8.2f}")
+        return
+
+    if args.schema:
+        expected = to_records(json.loads(document))
+        print(f"{'decoder':<12} {'seconds':>8} {'MB/s':>8}")
+        for name, decode in (("json", lambda text: to_records(json.loads(text))),
+                             ("jsonParser", lambda text: to_records(jsonParser.loads(text))),
+                             ("schema", compile_schema(Records))):
+            seconds, result = measure(decode, document, args.repeat)
+            if result != expected:
+                raise SystemExit(f"{name} decoded differently")
+            print(f"{name:<12} {seconds:>8.3f} {megabytes / seconds:>8.1f}")
+        return
+
+    if args.serialize:
+        value = json.loads(document)
+        expected = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        print(f"{'serializer':<12} {'seconds':>8} {'MB/s':>8}")
+        for name, dumps in (("json", lambda v: json.dumps(v, ensure_ascii=False, separators=(",", ":"))),
+                            ("serializer", serializer.dumps)):
+            seconds, result = measure(dumps, value, args.repeat)
+            if result != expected:
+                raise SystemExit(f"{name} output differs")
+            print(f"{name:<12} {seconds:>8.3f} {megabytes / seconds:>8.1f}")
+        return
+
+    results = {}
+    print(f"{'parser':<12} {'seconds':>8} {'MB/s':>8}")
+    for name, parse in (("json", json.loads), ("jsonParser", jsonParser.loads)):
+        seconds, results[name] = measure(parse, document, args.repeat)
+        print(f"{name:<12} {seconds:>8.3f} {megabytes / seconds:>8.1f}")
+    if results["json"] != results["jsonParser"]:
+        raise SystemExit("Results differ")
+
+
+if __name__ == "__main__":
+    main()
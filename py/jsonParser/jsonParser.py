@@ -1,4 +1,7 @@
-from enum import Enum, auto
+import argparse
+import re
+import sys
+from enum import Enum
 from typing import Union
 
 Number = Union[int, float]
@@ -6,6 +9,8 @@ JSONDataTypes = Union[Number, str, dict, list]
 
 
 class JSONObjectNode:
+    __slots__ = ("pairs",)
+
     def __init__(self, pairs=None):
         self.pairs = pairs or {}
 
@@ -17,6 +22,8 @@ class JSONObjectNode:
 
 
 class JSONArrayNode:
+    __slots__ = ("items",)
+
     def __init__(self, items=None):
         self.items = items or []
 
@@ -28,14 +35,18 @@ class JSONArrayNode:
 
 
 class JSONStringNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
     def __repr__(self):
-        return f'"{self.value}"'
+        return quote(self.value)
 
 
 class JSONNumberNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -44,6 +55,8 @@ class JSONNumberNode:
 
 
 class JSONBooleanNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -52,6 +65,8 @@ class JSONBooleanNode:
 
 
 class JSONNullNode:
+    __slots__ = ()
+
     def __repr__(self):
         return "null"
 
@@ -78,8 +93,8 @@ class TokenType(Enum):
     COLON = ":"
     HYPHEN = "-"
     DOUBLE_QUOTES = '"'
-    STRING_LITERAL = auto()
-    NUMBER = auto()
+    STRING_LITERAL = "string"
+    NUMBER = "number"
     TRUE = "true"
     FALSE = "false"
     NULL = "null"
@@ -87,6 +102,8 @@ class TokenType(Enum):
 
 
 class JSONToken:
+    __slots__ = ("token_type", "value")
+
     def __init__(self, token_type, value=None):
         self.token_type = token_type
         self.value = value
@@ -95,110 +112,286 @@ class JSONToken:
         return f"JSONToken({self.token_type}, {self.value})"
 
 
+class JSONParseError(ValueError):
+    def __init__(self, message, document, position, start=(0, 1, 0)):
+        # A streaming parser only holds a window of the input; `start` is the
+        # window's (offset, line, offset of that line) in the whole input
+        offset, line, line_start = start
+        newline = document.rfind("\n", 0, position)
+        self.position = offset + position
+        self.line = line + document.count("\n", 0, position)
+        self.column = self.position - (offset + newline + 1 if newline != -1 else line_start) + 1
+        super().__init__(f"{message}: line {self.line} column {self.column} (char {self.position})")
+
+
+# The whole scanner is a handful of compiled regexes: each token is one
+# match call, and the regex engine walks over the characters, not Python.
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# String contents up to the closing quote: no raw control characters, and
+# only the escapes RFC 8259 allows
+STRING_BODY = r'[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*'
+NUMBER = r"-?(?:0|[1-9][0-9]*)((?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)"
+
+_TOKEN = re.compile(
+    rf'[ \t\n\r]*(?:"({STRING_BODY})"|({NUMBER})|([{{}}\[\],:])|(true|false|null))'
+)
+# The parser matches a separator, a property name and the value after it in
+# a single call. Every pattern below has the property name as group 1 (empty
+# when there is none), so the value alternatives have the same numbers in
+# all of them:
+#   2 string, 3 number (4 its fraction and exponent), 5 empty object,
+#   6 empty array, 7 opening bracket, 8 literal, 9 closing bracket.
+# Empty containers are matched whole, so only non-empty ones are pushed.
+VALUE = (
+    rf'[ \t\n\r]*(?:"({STRING_BODY})"|({NUMBER})|(\{{[ \t\n\r]*\}})|(\[[ \t\n\r]*\])|([{{\[])|(true|false|null))'
+)
+_VALUE = re.compile(rf"(){VALUE}")
+_FIRST_MEMBER = re.compile(rf'[ \t\n\r]*"({STRING_BODY})"[ \t\n\r]*:{VALUE}')
+_NEXT_MEMBER = re.compile(rf'[ \t\n\r]*(?:,[ \t\n\r]*"({STRING_BODY})"[ \t\n\r]*:{VALUE}|(\}}))')
+_NEXT_ITEM = re.compile(rf"[ \t\n\r]*(?:,(){VALUE}|(\]))")
+_STRING = re.compile(rf'"{STRING_BODY}"')
+_COLON = re.compile(r"[ \t\n\r]*:")
+_SEPARATOR = re.compile(r"[ \t\n\r]*([,\]}])")
+
+_ESCAPE = re.compile(r"\\(?:u(d[89ab][0-9a-f]{2})\\u(d[c-f][0-9a-f]{2})|u([0-9a-f]{4})|(.))", re.IGNORECASE)
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+LITERALS = {"true": True, "false": False, "null": None}
+
+# For writing: how each character that cannot appear raw in a string is
+# escaped, and patterns finding those characters (plus non-ASCII ones)
+ENCODE_ESCAPES = {chr(code): f"\\u{code:04x}" for code in range(0x20)}
+ENCODE_ESCAPES.update({'"': '\\"', "\\": "\\\\", "\b": "\\b", "\f": "\\f", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+_NEEDS_ESCAPE = re.compile(r'[\x00-\x1f"\\]')
+_NEEDS_ESCAPE_ASCII = re.compile(r'[^\x20\x21\x23-\x5b\x5d-\x7e]')
+
+
+def _replace_escape(match) -> str:
+    high, low, code, char = match.groups()
+    if char is not None:
+        return _ESCAPES[char]
+    if code is not None:
+        return chr(int(code, 16))
+    # A UTF-16 surrogate pair for a character outside the BMP
+    return chr(0x10000 + ((int(high, 16) - 0xD800) << 10) + int(low, 16) - 0xDC00)
+
+
+def unescape(body: str) -> str:
+    """Decode the escapes in a string body that matched STRING_BODY."""
+    return _ESCAPE.sub(_replace_escape, body)
+
+
+def _escape_char(match) -> str:
+    return ENCODE_ESCAPES[match[0]]
+
+
+def _escape_non_ascii(match) -> str:
+    char = match[0]
+    escaped = ENCODE_ESCAPES.get(char)
+    if escaped is not None:
+        return escaped
+    code = ord(char)
+    if code < 0x10000:
+        return f"\\u{code:04x}"
+    code -= 0x10000
+    return f"\\u{0xD800 | code >> 10:04x}\\u{0xDC00 | code & 0x3FF:04x}"
+
+
+def quote(value: str, ensure_ascii: bool = False) -> str:
+    """The JSON string literal for `value`. With `ensure_ascii`, characters
+    outside ASCII are written as \\u escapes too."""
+    if ensure_ascii:
+        return '"' + _NEEDS_ESCAPE_ASCII.sub(_escape_non_ascii, value) + '"'
+    if _NEEDS_ESCAPE.search(value) is None:
+        return '"' + value + '"'
+    return '"' + _NEEDS_ESCAPE.sub(_escape_char, value) + '"'
+
+
+def parse_error(document: str, position: int, expected: str, start=(0, 1, 0)) -> JSONParseError:
+    position = WHITESPACE.match(document, position).end()
+    if position >= len(document):
+        return JSONParseError(f"Unexpected end of input, expecting {expected}", document, position, start)
+    if document[position] == '"' and expected in ("value", "property name"):
+        return JSONParseError("Invalid string, unescaped control character or bad escape", document, position, start)
+    return JSONParseError(f"Expecting {expected}, found {document[position]!r}", document, position, start)
+
+
+def explain_failure(document: str, position: int, pattern) -> JSONParseError:
+    """Find which part of a failed parser pattern did not match. This walks
+    the steps the fused pattern takes in one go, so it only runs on errors."""
+    if pattern is _NEXT_MEMBER or pattern is _NEXT_ITEM:
+        closing = "}" if pattern is _NEXT_MEMBER else "]"
+        separator = _SEPARATOR.match(document, position)
+        if separator is None or separator[1] not in ("," + closing):
+            return parse_error(document, position, f"',' or '{closing}'")
+        position = separator.end()
+        if pattern is _NEXT_ITEM:
+            return parse_error(document, position, "value")
+    elif pattern is _VALUE:
+        return parse_error(document, position, "value")
+    # A property name, a colon and a value
+    position = WHITESPACE.match(document, position).end()
+    string = _STRING.match(document, position)
+    if string is None:
+        return parse_error(document, position, "property name")
+    colon = _COLON.match(document, string.end())
+    if colon is None:
+        return parse_error(document, string.end(), "':'")
+    return parse_error(document, colon.end(), "value")
+
+
 class Lexer:
 
     def __init__(self, json_string):
         self.json_string = json_string
         self.position = 0
-        self.current_character: Union[str, None] = self.json_string[0]
         self.length = len(json_string)
 
-    def advance(self) -> None:
-        self.position += 1
-        if self.position <= self.length:
-            self.current_character = self.json_string[self.position]
-        else:
-            self.current_character = None
-
-    def skip_whitespace(self):
-        while self.current_character and self.current_character.isspace():
-            self.advance()
-
-    def get_number(self) -> Number:
-        start_position = self.position
-        while self.current_character and (self.current_character.isdigit() or self.current_character == '.'):
-            self.advance()
-        number_str = self.json_string[start_position:self.position]
-        return float(number_str) if '.' in number_str else int(number_str)
-
-    def get_string(self):
-        start_position = self.position + 1  # Skip the opening double quote
-        self.current_character = self.json_string[start_position]
-        while self.current_character != '"':
-            self.advance()
-        return self.json_string[start_position:self.position]
-
-    def get_next_token(self):
-
-        while self.current_character is not None:
-
-            if self.current_character.isspace():
-                self.skip_whitespace()
-                continue
-
-            elif self.current_character == TokenType.OBJECT_START.value:
-                self.advance()
-                return JSONToken(TokenType.OBJECT_START)
-
-            elif self.current_character == TokenType.OBJECT_END.value:
-                self.advance()
-                return JSONToken(TokenType.OBJECT_END)
-
-            elif self.current_character == TokenType.ARRAY_START.value:
-                self.advance()
-                return JSONToken(TokenType.ARRAY_START)
-
-            elif self.current_character == TokenType.ARRAY_END.value:
-                self.advance()
-                return JSONToken(TokenType.ARRAY_END)
-
-            elif self.current_character == TokenType.COMMA.value:
-                self.advance()
-                return JSONToken(TokenType.COMMA)
-
-            elif self.current_character == TokenType.COLON.value:
-                self.advance()
-                return JSONToken(TokenType.COLON)
-
-            elif self.current_character == TokenType.DOUBLE_QUOTES.value:
-                return JSONToken(TokenType.STRING_LITERAL, self.get_string())
-
-            elif self.current_character.isdigit() or self.current_character == TokenType.HYPHEN.value:
-                return JSONToken(TokenType.NUMBER, self.get_number())
-
-            elif self.current_character.isalpha():
-                keyword = ""
-                while self.current_character.isalpha():
-                    keyword += self.current_character
-                    self.advance()
-                if keyword == TokenType.TRUE.value:
-                    return JSONToken(TokenType.TRUE)
-                elif keyword == TokenType.FALSE.value:
-                    return JSONToken(TokenType.FALSE)
-                elif keyword == TokenType.NULL.value:
-                    return JSONToken(TokenType.NULL)
-                else:
-                    raise ValueError(f"Invalid keyword: {keyword}")
-
-            raise ValueError(f"Invalid character: {self.current_character}")
-
-        return JSONToken(TokenType.EOF)
+    def get_next_token(self) -> JSONToken:
+        match = _TOKEN.match(self.json_string, self.position)
+        if match is None:
+            end = WHITESPACE.match(self.json_string, self.position).end()
+            if end == self.length:
+                self.position = end
+                return JSONToken(TokenType.EOF)
+            raise parse_error(self.json_string, self.position, "a token")
+        self.position = match.end()
+        kind = match.lastindex
+        if kind == 1:
+            value = match[1]
+            return JSONToken(TokenType.STRING_LITERAL, unescape(value) if "\\" in value else value)
+        if kind == 2:
+            return JSONToken(TokenType.NUMBER, float(match[2]) if match[3] else int(match[2]))
+        return JSONToken(TokenType(match[kind]))
+
+    def __iter__(self):
+        while True:
+            token = self.get_next_token()
+            yield token
+            if token.token_type == TokenType.EOF:
+                return
 
 
 class Parser:
+    """
+    Builds native dicts, lists, strs, ints, floats, bools and None straight
+    from the regex matches, without going through tokens. Open containers
+    are kept on an explicit stack, so nesting depth is not limited by the
+    recursion limit.
+    """
+
     def __init__(self, lexer):
         self.lexer = lexer
-        self.current_token = self.lexer.get_next_token()
-
-
 
+    def parse(self) -> JSONDataTypes:
+        """Parse the whole document, which must hold exactly one value."""
+        value = self.parse_value()
+        document = self.lexer.json_string
+        end = WHITESPACE.match(document, self.lexer.position).end()
+        if end != len(document):
+            raise JSONParseError("Extra data", document, end)
+        self.lexer.position = end
+        return value
+
+    def parse_value(self) -> JSONDataTypes:
+        """Parse one value from the lexer's position and leave the lexer
+        just after it."""
+        document = self.lexer.json_string
+        match_first_member = _FIRST_MEMBER.match
+        match_next_member = _NEXT_MEMBER.match
+        match_next_item = _NEXT_ITEM.match
+        # Repeated keys share one str object, as in the stdlib decoder
+        remember = {}.setdefault
+        # Enclosing containers, each with the key the open one will be stored under
+        stack = []
+        container = None
+        is_object = False
+        match_next = _VALUE.match
+        position = self.lexer.position
+        while True:
+            match = match_next(document, position)
+            if match is None:
+                raise explain_failure(document, position, match_next.__self__)
+            position = match.end()
+            kind = match.lastindex
+            if kind == 2:
+                value = match[2]
+                if "\\" in value:
+                    value = unescape(value)
+            elif kind == 3:
+                value = float(match[3]) if match[4] else int(match[3])
+            elif kind == 8:
+                value = LITERALS[match[8]]
+            elif kind == 7:
+                key = match[1]
+                if is_object:
+                    if "\\" in key:
+                        key = unescape(key)
+                    key = remember(key, key)
+                stack.append((container, is_object, key))
+                if match[7] == "{":
+                    container = {}
+                    is_object = True
+                    match_next = match_first_member
+                else:
+                    container = []
+                    is_object = False
+                    match_next = _VALUE.match
+                continue
+            elif kind == 5:
+                value = {}
+            elif kind == 6:
+                value = []
+            else:
+                # The open container is complete; store it in its parent
+                value = container
+                container, is_object, key = stack.pop()
+                if container is None:
+                    self.lexer.position = position
+                    return value
+                if is_object:
+                    container[key] = value
+                    match_next = match_next_member
+                else:
+                    container.append(value)
+                    match_next = match_next_item
+                continue
 
-# Example usage:
-json_string = '{"name": "John", "age": 30, "city": "New York", "is_student": false, "grades": [90, 85, 88]}'
-lexer = Lexer(json_string)
-
-while True:
-    token = lexer.get_next_token()
-    print(token)
-    if token.token_type == TokenType.OBJECT_END:
-        break
+            if is_object:
+                key = match[1]
+                if "\\" in key:
+                    key = unescape(key)
+                container[remember(key, key)] = value
+                match_next = match_next_member
+            elif container is not None:
+                container.append(value)
+                match_next = match_next_item
+            else:
+                self.lexer.position = position
+                return value
+
+
+def loads(json_string) -> JSONDataTypes:
+    if isinstance(json_string, (bytes, bytearray)):
+        json_string = json_string.decode("utf-8")
+    return Parser(Lexer(json_string)).parse()
+
+
+def load(file) -> JSONDataTypes:
+    return loads(file.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a file holds valid JSON")
+    parser.add_argument("input_file")
+    args = parser.parse_args()
+    with open(args.input_file, encoding="utf-8") as f:
+        try:
+            load(f)
+        except JSONParseError as err:
+            print(f"Invalid JSON: {err}")
+            sys.exit(1)
+    print("Valid JSON")
+
+
+if __name__ == "__main__":
+    main()
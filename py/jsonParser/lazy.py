@@ -0,0 +1,294 @@
+"""
+On-demand access to JSON documents, after simdjson's On Demand API.
+
+    doc = lazy_loads(text)
+    doc["a"]["b"][3]
+
+`lazy_loads()` makes one pass over the text that records where every object
+and array opens and closes, then returns a view of the top level value.
+Indexing a view decodes only the value asked for: objects and arrays come
+back as further views and everything else as native values. Skipping an
+unwanted object or array is a lookup in the index, so the cost of an access
+depends on what is read, not on the size of the document.
+
+Only brackets are indexed, and the index is built with str.split, str.count,
+accumulate and sorted rather than a Python loop per bracket. A bracket is
+outside any string when an even number of unescaped quotes comes before it.
+Property names are looked up with str.find, and the nesting depth at a hit
+tells whether it is at the object's own level. Parts of the document that
+are never looked at are not validated, apart from the brackets being
+balanced.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, compress, count, repeat
+from operator import add, and_, ne, not_, sub
+
+from jsonParser import NUMBER, STRING_BODY, WHITESPACE, JSONParseError, Lexer, Parser, parse_error, unescape
+
+# Everything up to the next bracket outside a string, then the bracket; for
+# text where counting quotes is not enough
+BRACKET = re.compile(r'(?:[^"{}\[\]]++|"(?:[^"\\]++|\\.)*+")*+([{}\[\]])', re.DOTALL)
+SCALAR = re.compile(rf'"{STRING_BODY}"|{NUMBER}|true|false|null')
+# An object member up to its value, and the comma before a later member or item
+FIRST_MEMBER = re.compile(rf'[ \t\n\r]*"({STRING_BODY})"[ \t\n\r]*:[ \t\n\r]*')
+NEXT_MEMBER = re.compile(rf'[ \t\n\r]*,[ \t\n\r]*"({STRING_BODY})"[ \t\n\r]*:[ \t\n\r]*')
+NEXT_ITEM = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+COLON = re.compile(r"[ \t\n\r]*:[ \t\n\r]*")
+# Property names that appear in the text exactly as written
+PLAIN_KEY = re.compile(r'[^"\\\x00-\x1f]*')
+
+DEPTH_CHANGE = {"{": 1, "[": 1, "}": -1, "]": -1}.__getitem__
+# Added to the depth after a bracket to get the depth inside its container
+INSIDE = {"{": 0, "[": 0, "}": 1, "]": 1}.__getitem__
+CLOSING = {"{": "}", "[": "]"}.__getitem__
+
+
+def _occurrences(text: str, char: str):
+    """Offsets of `char` in the text: the k-th follows the first k + 1
+    pieces of text.split(char) and the k occurrences before it."""
+    pieces = text.split(char)
+    return map(add, accumulate(map(len, pieces[:-1])), count())
+
+
+def bracket_positions(text: str) -> list[int]:
+    """Offsets of the brackets outside strings, in order."""
+    if "\\\\" in text:
+        # An escaped backslash may come before a closing quote, so \" does
+        # not always mean an escaped quote
+        return [match.end() - 1 for match in BRACKET.finditer(text)]
+    positions = sorted(chain.from_iterable(_occurrences(text, bracket) for bracket in "{}[]"))
+    if not positions or '"' not in text:
+        return positions
+    starts = [0]
+    starts += positions[:-1]
+    quotes = map(text.count, repeat('"'), starts, positions)
+    if "\\" in text:
+        quotes = map(sub, quotes, map(text.count, repeat('\\"'), starts, positions))
+    outside = map(not_, map(and_, accumulate(quotes), repeat(1)))
+    return list(compress(positions, outside))
+
+
+class LazyDocument:
+    """The text and its structural index: the offset of every bracket
+    outside a string, the nesting depth after it, and the closing offset of
+    each opening bracket."""
+
+    def __init__(self, text: str):
+        self.text = text
+        positions = bracket_positions(text)
+        brackets = list(map(text.__getitem__, positions))
+        depths = list(accumulate(map(DEPTH_CHANGE, brackets)))
+        if depths and min(depths) < 0:
+            position = positions[depths.index(min(depths))]
+            raise JSONParseError(f"Unmatched {text[position]!r}", text, position)
+        if depths and depths[-1] != 0:
+            raise JSONParseError("Unclosed bracket", text, positions[0])
+        # Containers at the same depth never overlap, so sorted by the depth
+        # inside them, brackets come as open, close, open, close...
+        inside = list(map(add, depths, map(INSIDE, brackets)))
+        order = sorted(range(len(positions)), key=inside.__getitem__)
+        opens = list(map(positions.__getitem__, order[0::2]))
+        closes = list(map(positions.__getitem__, order[1::2]))
+        if any(map(ne, map(CLOSING, map(text.__getitem__, opens)), map(text.__getitem__, closes))):
+            position = min(close for open_, close in zip(opens, closes) if CLOSING(text[open_]) != text[close])
+            raise JSONParseError(f"Unmatched {text[position]!r}", text, position)
+        self.positions = array("q", positions)
+        self.depths = array("q", depths)
+        self.closes = dict(zip(opens, closes))
+
+    def depth_at(self, position: int) -> int:
+        """How many containers enclose `position`."""
+        index = bisect_right(self.positions, position) - 1
+        return self.depths[index] if index >= 0 else 0
+
+    def decode(self, position: int):
+        """The value starting at `position`, fully decoded."""
+        lexer = Lexer(self.text)
+        lexer.position = position
+        return Parser(lexer).parse_value()
+
+    def value_at(self, position: int):
+        """The value starting at `position`: a view for a container,
+        otherwise the decoded value."""
+        char = self.text[position:position + 1]
+        if char == "{":
+            return LazyObject(self, position)
+        if char == "[":
+            return LazyArray(self, position)
+        return self.decode(position)
+
+    def value_end(self, position: int) -> int:
+        """The offset just after the value starting at `position`."""
+        close = self.closes.get(position)
+        if close is not None:
+            return close + 1
+        match = SCALAR.match(self.text, position)
+        if match is None:
+            raise parse_error(self.text, position, "value")
+        return match.end()
+
+
+class LazyObject:
+    __slots__ = ("document", "start")
+
+    def __init__(self, document: LazyDocument, start: int):
+        self.document = document
+        self.start = start
+
+    def _find(self, key: str) -> int:
+        """Offset of the value for `key`, or -1. With duplicate names this
+        is the first one, where a full parse keeps the last."""
+        document = self.document
+        text = document.text
+        start = self.start
+        end = document.closes[start]
+        if PLAIN_KEY.fullmatch(key):
+            needle = f'"{key}"'
+            depth = None
+            position = text.find(needle, start, end)
+            while position != -1:
+                # An escaped quote is inside a string; any other quote
+                # followed by the key and a quote opens that string
+                backslashes = 0
+                while text[position - 1 - backslashes] == "\\":
+                    backslashes += 1
+                colon = COLON.match(text, position + len(needle)) if backslashes % 2 == 0 else None
+                if colon is not None:
+                    if depth is None:
+                        depth = document.depth_at(start)
+                    if document.depth_at(position) == depth:
+                        return colon.end()
+                position = text.find(needle, position + 1, end)
+            if text.find("\\", start, end) == -1:
+                return -1
+        # The key may be written with escapes; compare decoded names
+        for name, position in self._members():
+            if name == key:
+                return position
+        return -1
+
+    def _members(self):
+        """(name, value offset) of each member, in order."""
+        document = self.document
+        text = document.text
+        member = FIRST_MEMBER
+        position = self.start + 1
+        end = document.closes[self.start]
+        while True:
+            match = member.match(text, position)
+            if match is None:
+                position = WHITESPACE.match(text, position).end()
+                if position != end:
+                    raise parse_error(text, position, "property name or '}'" if member is FIRST_MEMBER else "',' or '}'")
+                return
+            name = match[1]
+            yield unescape(name) if "\\" in name else name, match.end()
+            position = document.value_end(match.end())
+            member = NEXT_MEMBER
+
+    def __getitem__(self, key: str):
+        position = self._find(key)
+        if position == -1:
+            raise KeyError(key)
+        return self.document.value_at(position)
+
+    def get(self, key: str, default=None):
+        position = self._find(key)
+        return default if position == -1 else self.document.value_at(position)
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) != -1
+
+    def __iter__(self):
+        return (name for name, _ in self._members())
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        value_at = self.document.value_at
+        return ((name, value_at(position)) for name, position in self._members())
+
+    def __len__(self):
+        return sum(1 for _ in self._members())
+
+    def to_python(self) -> dict:
+        return self.document.decode(self.start)
+
+    def __repr__(self):
+        return f"LazyObject({len(self)} members)"
+
+
+class LazyArray:
+    __slots__ = ("document", "start", "_positions", "_scanned")
+
+    def __init__(self, document: LazyDocument, start: int):
+        self.document = document
+        self.start = start
+        # Offsets of the items found so far, and whether that is all of them
+        self._positions = []
+        self._scanned = False
+
+    def _scan_to(self, wanted: int) -> None:
+        """Find item offsets until there are `wanted` of them or no more."""
+        document = self.document
+        text = document.text
+        positions = self._positions
+        end = document.closes[self.start]
+        if positions:
+            position = document.value_end(positions[-1])
+        else:
+            position = WHITESPACE.match(text, self.start + 1).end()
+            if position == end:
+                self._scanned = True
+                return
+            positions.append(position)
+            position = document.value_end(position)
+        while len(positions) < wanted:
+            match = NEXT_ITEM.match(text, position)
+            if match is None:
+                if WHITESPACE.match(text, position).end() != end:
+                    raise parse_error(text, position, "',' or ']'")
+                self._scanned = True
+                return
+            positions.append(match.end())
+            position = document.value_end(match.end())
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if index >= len(self._positions) and not self._scanned:
+            self._scan_to(index + 1)
+        if not 0 <= index < len(self._positions):
+            raise IndexError("array index out of range")
+        return self.document.value_at(self._positions[index])
+
+    def __len__(self):
+        if not self._scanned:
+            self._scan_to(float("inf"))
+        return len(self._positions)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.document.value_at(self._positions[index])
+
+    def to_python(self) -> list:
+        return self.document.decode(self.start)
+
+    def __repr__(self):
+        return f"LazyArray({len(self)} items)"
+
+
+def lazy_loads(text: str):
+    """A view of the document's top level value; scalars are returned as is."""
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode("utf-8")
+    document = LazyDocument(text)
+    start = WHITESPACE.match(text).end()
+    end = document.value_end(start)
+    trailing = WHITESPACE.match(text, end).end()
+    if trailing != len(text):
+        raise JSONParseError("Extra data", text, trailing)
+    return document.value_at(start)
@@ -0,0 +1,499 @@
+"""
+Decoding JSON straight into typed records, checked against a schema.
+
+    @dataclass
+    class Address:
+        city: str
+
+    @dataclass
+    class User:
+        id: int
+        name: str
+        address: Address
+        tags: list[str] = field(default_factory=list)
+
+    decode = compile_schema(User)
+    user = decode(text)
+
+A schema is a dataclass, a TypedDict, a type like `list[User]`, or a dict
+holding a subset of JSON Schema: type (one or a list), properties,
+required, additionalProperties, items, enum, minimum, maximum, minLength
+and maxLength. `compile_schema()` turns it into a tree of small decode
+functions, one per schema node, so checking the document and building the
+records happen in the one pass over the text. Members the schema does not
+name are stepped over by matching them, without building their values.
+
+A document that does not fit raises SchemaError, a JSONParseError whose
+message starts with the path of the value, like "$.records[3].id". Paths
+are only put together on the way out of an error, so decoding valid input
+spends nothing on them.
+
+    python schema.py schema.json input.json
+"""
+import argparse
+import dataclasses
+import json
+import sys
+import types
+import typing
+
+from jsonParser import (
+    _FIRST_MEMBER,
+    _NEXT_ITEM,
+    _NEXT_MEMBER,
+    _VALUE,
+    LITERALS,
+    WHITESPACE,
+    JSONParseError,
+    Lexer,
+    Parser,
+    explain_failure,
+    parse_error,
+    unescape,
+)
+
+# JSON Schema type names, by the _VALUE group that matches them
+_KIND_TYPES = {2: "string", 5: "object", 6: "array"}
+_REJECT = object()
+
+
+class SchemaError(JSONParseError):
+    # Whether the value was of the wrong type altogether
+    wrong_type = False
+
+    def __init__(self, path: str, reason: str, document: str, position: int):
+        self.path = path
+        self.reason = reason
+        super().__init__(f"{path or '$'}: {reason}", document, WHITESPACE.match(document, position).end())
+
+    def inside(self, step: str, document: str) -> "SchemaError":
+        """The same error seen from the enclosing value, `step` being the
+        key or index that leads to this one."""
+        err = SchemaError(step + self.path, self.reason, document, self.position)
+        err.wrong_type = self.wrong_type
+        return err
+
+
+def skip_value(text: str, position: int) -> int:
+    """The offset after the value at `position`, which is checked but not
+    built: the same matches the parser makes, with no strs, numbers or
+    containers created from them."""
+    match = _VALUE.match(text, position)
+    if match is None:
+        raise parse_error(text, position, "value")
+    if match.lastindex != 7:
+        return match.end()
+    # True for each open object, False for each open array
+    stack = [match[7] == "{"]
+    match_next = _FIRST_MEMBER if stack[-1] else _VALUE
+    position = match.end()
+    while stack:
+        match = match_next.match(text, position)
+        if match is None:
+            raise explain_failure(text, position, match_next)
+        position = match.end()
+        kind = match.lastindex
+        if kind == 7:
+            stack.append(match[7] == "{")
+            match_next = _FIRST_MEMBER if stack[-1] else _VALUE
+            continue
+        if kind == 9:
+            stack.pop()
+        if stack:
+            match_next = _NEXT_MEMBER if stack[-1] else _NEXT_ITEM
+    return position
+
+
+def _type_error(expected: str, text: str, position: int) -> SchemaError:
+    match = _VALUE.match(text, position)
+    if match is None:
+        return parse_error(text, position, "value")
+    kind = match.lastindex
+    if kind == 3:
+        found = "number" if match[4] else "integer"
+    elif kind == 7:
+        found = "object" if match[7] == "{" else "array"
+    elif kind == 8:
+        found = "null" if match[8] == "null" else "boolean"
+    else:
+        found = _KIND_TYPES[kind]
+    err = SchemaError("", f"expected {expected}, found {found}", text, position)
+    err.wrong_type = True
+    return err
+
+
+def _value_start(match, kind: int) -> int:
+    """Where the value a match ends with starts: group 2 is a string's
+    contents, one past its opening quote."""
+    return match.start(kind) - 1 if kind == 2 else match.start(kind)
+
+
+def _convert(scalar: tuple, match, text: str):
+    """The value a scalar decoder makes of a match of _VALUE, or of a
+    parser pattern that numbers its groups the same way."""
+    kinds, checks, expected = scalar
+    kind = match.lastindex
+    convert = kinds.get(kind)
+    value = convert(match) if convert is not None else _REJECT
+    if value is _REJECT:
+        raise _type_error(expected, text, _value_start(match, kind))
+    for check in checks:
+        message = check(value)
+        if message:
+            raise SchemaError("", message, text, _value_start(match, kind))
+    return value
+
+
+def _scalar(expected: str, kinds: dict, checks=()):
+    """A decoder for scalars. `kinds` maps the _VALUE groups accepted to a
+    function of the match giving the value, or _REJECT. The containers
+    decode members and items with these straight from their own match."""
+    scalar = (kinds, tuple(checks), expected)
+
+    def decode(text: str, position: int):
+        match = _VALUE.match(text, position)
+        if match is None:
+            raise parse_error(text, position, "value")
+        return _convert(scalar, match, text), match.end()
+
+    decode.scalar = scalar
+    return decode
+
+
+def _string(match) -> str:
+    value = match[2]
+    return unescape(value) if "\\" in value else value
+
+
+def _integer(match):
+    return _REJECT if match[4] else int(match[3])
+
+
+def _number(match):
+    return float(match[3]) if match[4] else int(match[3])
+
+
+def _float(match) -> float:
+    return float(match[3])
+
+
+def _literal(allowed: tuple):
+    def convert(match):
+        return LITERALS[match[8]] if match[8] in allowed else _REJECT
+
+    return convert
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _checks(schema: dict) -> list:
+    checks = []
+    if "enum" in schema:
+        allowed = schema["enum"]
+        # By type as well as value, as True == 1 and False == 0
+        checks.append(lambda value: None if any(type(option) is type(value) and option == value for option in allowed)
+                      else f"{value!r} is not one of {allowed!r}")
+    # The others only apply to values of their own type
+    if "minimum" in schema:
+        minimum = schema["minimum"]
+        checks.append(lambda value: f"{value!r} is less than {minimum!r}" if _is_number(value) and value < minimum else None)
+    if "maximum" in schema:
+        maximum = schema["maximum"]
+        checks.append(lambda value: f"{value!r} is more than {maximum!r}" if _is_number(value) and value > maximum else None)
+    if "minLength" in schema:
+        length = schema["minLength"]
+        checks.append(lambda value: f"shorter than {length}" if isinstance(value, str) and len(value) < length else None)
+    if "maxLength" in schema:
+        length = schema["maxLength"]
+        checks.append(lambda value: f"longer than {length}" if isinstance(value, str) and len(value) > length else None)
+    return checks
+
+
+def _entry(decoder) -> tuple:
+    """How a container decodes a member or item: for a scalar, from the
+    converters by group, the checks and the decoder itself; otherwise
+    just by calling the decoder."""
+    scalar = getattr(decoder, "scalar", None)
+    if scalar is None:
+        return None, (), decoder
+    return scalar[0], scalar[1], decoder
+
+
+def _object(fields: dict, required: frozenset, build=None, other=None, closed: bool = False):
+    """A decoder for objects. `fields` maps property names to decoders,
+    `other` decodes the values of any other property, or with `closed`
+    they are an error; otherwise they are skipped. The result is the dict
+    of decoded members, or `build(**members)`."""
+    entries = {name: _entry(decoder) for name, decoder in fields.items()}
+    other_entry = _entry(other) if other is not None else None
+    match_next_member = _NEXT_MEMBER.match
+
+    def decode(text: str, position: int):
+        if not text.startswith("{", position):
+            raise _type_error("object", text, position)
+        values = {}
+        # A property name and the value after it, in one match
+        match = _FIRST_MEMBER.match(text, position + 1)
+        if match is None:
+            position = WHITESPACE.match(text, position + 1).end()
+            if not text.startswith("}", position):
+                raise explain_failure(text, position, _FIRST_MEMBER)
+            position += 1
+        while match is not None:
+            position = match.end()
+            kind = match.lastindex
+            if kind == 9:
+                break
+            key = match[1]
+            if "\\" in key:
+                key = unescape(key)
+            entry = entries.get(key, other_entry)
+            if entry is None:
+                if closed:
+                    raise SchemaError(f".{key}", "property not allowed", text, match.start(1) - 1)
+                if kind == 7:
+                    position = skip_value(text, match.start(7))
+            else:
+                kinds, checks, decode_value = entry
+                try:
+                    if kinds is not None:
+                        convert = kinds.get(kind)
+                        value = convert(match) if convert is not None else _REJECT
+                        if value is _REJECT or checks:
+                            value = _convert(decode_value.scalar, match, text)
+                        values[key] = value
+                    else:
+                        values[key], position = decode_value(text, _value_start(match, kind))
+                except SchemaError as err:
+                    raise err.inside(f".{key}", text) from None
+            match = match_next_member(text, position)
+            if match is None:
+                raise explain_failure(text, position, _NEXT_MEMBER)
+        if len(values) < len(required) or not required.issubset(values):
+            missing = sorted(required.difference(values))
+            raise SchemaError("", f"missing required {', '.join(missing)}", text, position - 1)
+        return (values if build is None else build(**values)), position
+
+    return decode
+
+
+def _array(items, checks=()):
+    kinds, item_checks, _ = _entry(items)
+    match_next_item = _NEXT_ITEM.match
+
+    def decode(text: str, position: int):
+        if not text.startswith("[", position):
+            raise _type_error("array", text, position)
+        values = []
+        match = _VALUE.match(text, position + 1)
+        if match is None:
+            position = WHITESPACE.match(text, position + 1).end()
+            if not text.startswith("]", position):
+                raise explain_failure(text, position, _VALUE)
+            position += 1
+        while match is not None:
+            position = match.end()
+            kind = match.lastindex
+            if kind == 9:
+                break
+            try:
+                if kinds is not None:
+                    convert = kinds.get(kind)
+                    value = convert(match) if convert is not None else _REJECT
+                    if value is _REJECT or item_checks:
+                        value = _convert(items.scalar, match, text)
+                    values.append(value)
+                else:
+                    value, position = items(text, _value_start(match, kind))
+                    values.append(value)
+            except SchemaError as err:
+                raise err.inside(f"[{len(values)}]", text) from None
+            match = match_next_item(text, position)
+            if match is None:
+                raise explain_failure(text, position, _NEXT_ITEM)
+        for check in checks:
+            message = check(values)
+            if message:
+                raise SchemaError("", message, text, position - 1)
+        return values, position
+
+    return decode
+
+
+def _any(text: str, position: int):
+    lexer = Lexer(text)
+    lexer.position = position
+    return Parser(lexer).parse_value(), lexer.position
+
+
+def _one_of(decoders: list, names: str):
+    """A decoder trying each of `decoders` in turn, for a union of types.
+    The value is only an error once none of them fits, and then the
+    error says why for each option that got past the value's type."""
+
+    def decode(text: str, position: int):
+        errors = []
+        for decode_value in decoders:
+            try:
+                return decode_value(text, position)
+            except SchemaError as err:
+                if err.path or not err.wrong_type:
+                    errors.append(err)
+        if not errors:
+            raise _type_error(names, text, position)
+        if len(errors) == 1:
+            raise errors[0]
+        reasons = "; ".join(f"${err.path}: {err.reason}" for err in errors)
+        raise SchemaError("", f"fits none of {names} ({reasons})", text, position)
+
+    return decode
+
+
+def _optional(decoder):
+    """`decoder`, also accepting null."""
+    scalar = getattr(decoder, "scalar", None)
+    if scalar is not None:
+        kinds, checks, expected = scalar
+        literal = kinds.get(8)
+        kinds = dict(kinds)
+        kinds[8] = lambda match: None if match[8] == "null" else literal(match) if literal else _REJECT
+        return _scalar(f"{expected} or null", kinds, checks)
+
+    def decode(text: str, position: int):
+        if text.startswith("null", position):
+            return None, position + 4
+        return decoder(text, position)
+
+    return decode
+
+
+def _compile_json_schema(schema: dict):
+    if not schema:
+        return _any
+    types_ = schema.get("type")
+    if types_ is None:
+        if "properties" in schema:
+            types_ = ["object"]
+        elif "items" in schema:
+            types_ = ["array"]
+        elif "enum" in schema:
+            types_ = ["string", "number", "boolean", "null"]
+        else:
+            return _any
+    if isinstance(types_, str):
+        types_ = [types_]
+    checks = _checks(schema)
+    scalar_kinds = {}
+    decoders = []
+    literals = tuple(name for name, kind in (("true", "boolean"), ("false", "boolean"), ("null", "null")) if kind in types_)
+    if "string" in types_:
+        scalar_kinds[2] = _string
+    if "number" in types_:
+        scalar_kinds[3] = _number
+    elif "integer" in types_:
+        scalar_kinds[3] = _integer
+    if literals:
+        scalar_kinds[8] = _literal(literals)
+    if literals == ("null",) and len(types_) == 2 and ("object" in types_ or "array" in types_):
+        # Left to _optional, which keeps the container's fast path
+        scalar_kinds.clear()
+    if scalar_kinds:
+        decoders.append(_scalar(" or ".join(types_), scalar_kinds, checks))
+    if "object" in types_:
+        extra = schema.get("additionalProperties", True)
+        fields = {name: _compile_json_schema(value) for name, value in schema.get("properties", {}).items()}
+        decoders.append(_object(
+            fields,
+            frozenset(schema.get("required", ())),
+            other=_compile_json_schema(extra) if isinstance(extra, dict) and extra else None,
+            closed=extra is False,
+        ))
+    if "array" in types_:
+        decoders.append(_array(_compile_json_schema(schema.get("items", {})), checks))
+    if len(decoders) > 1:
+        return _one_of(decoders, " or ".join(types_))
+    return decoders[0] if "null" not in types_ or scalar_kinds else _optional(decoders[0])
+
+
+def _compile_type(hint):
+    if hint is typing.Any or hint is object:
+        return _any
+    if hint is str:
+        return _scalar("string", {2: _string})
+    if hint is bool:
+        return _scalar("boolean", {8: _literal(("true", "false"))})
+    if hint is int:
+        return _scalar("integer", {3: _integer})
+    if hint is float:
+        return _scalar("number", {3: _float})
+    if hint is type(None):
+        return _scalar("null", {8: _literal(("null",))})
+    if dataclasses.is_dataclass(hint):
+        fields = [field for field in dataclasses.fields(hint) if field.init]
+        hints = typing.get_type_hints(hint)
+        required = frozenset(
+            field.name for field in fields
+            if field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+        )
+        return _object({field.name: _compile_type(hints[field.name]) for field in fields}, required, hint)
+    if typing.is_typeddict(hint):
+        hints = typing.get_type_hints(hint)
+        return _object({name: _compile_type(value) for name, value in hints.items()}, hint.__required_keys__)
+
+    origin = typing.get_origin(hint)
+    arguments = typing.get_args(hint)
+    if origin is list or origin is tuple and len(arguments) == 2 and arguments[1] is Ellipsis:
+        return _array(_compile_type(arguments[0]) if arguments else _any)
+    if origin is dict:
+        return _object({}, frozenset(), other=_compile_type(arguments[1]) if arguments else _any)
+    if origin is typing.Union or origin is types.UnionType:
+        options = [argument for argument in arguments if argument is not type(None)]
+        if len(options) == 1 and len(arguments) == 2:
+            return _optional(_compile_type(options[0]))
+        return _one_of([_compile_type(argument) for argument in arguments], " or ".join(map(str, arguments)))
+    if origin is typing.Literal:
+        return _scalar(" or ".join(map(repr, arguments)), {2: _string, 3: _number, 8: _literal(("true", "false", "null"))},
+                       _checks({"enum": list(arguments)}))
+    raise TypeError(f"Unsupported type in schema: {hint!r}")
+
+
+def compile_schema(schema):
+    """A function decoding a JSON document according to `schema` (see the
+    module docstring), raising SchemaError where it does not fit."""
+    decode_value = _compile_json_schema(schema) if isinstance(schema, dict) else _compile_type(schema)
+
+    def decode(text):
+        if isinstance(text, (bytes, bytearray)):
+            text = text.decode("utf-8")
+        try:
+            value, position = decode_value(text, WHITESPACE.match(text).end())
+        except SchemaError as err:
+            raise err.inside("$", text) from None
+        end = WHITESPACE.match(text, position).end()
+        if end != len(text):
+            raise JSONParseError("Extra data", text, end)
+        return value
+
+    return decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a JSON file against a JSON Schema")
+    parser.add_argument("schema_file")
+    parser.add_argument("input_file")
+    args = parser.parse_args()
+    with open(args.schema_file, encoding="utf-8") as f:
+        decode = compile_schema(json.load(f))
+    with open(args.input_file, encoding="utf-8") as f:
+        try:
+            decode(f.read())
+        except JSONParseError as err:
+            print(f"Invalid: {err}")
+            sys.exit(1)
+    print("Valid")
+
+
+if __name__ == "__main__":
+    main()
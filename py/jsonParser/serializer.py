@@ -0,0 +1,194 @@
+"""
+Writing JSON text from native values or from jsonParser's node classes.
+
+    with open("export.json", "w") as f:
+        dump(records, f, indent=2, sort_keys=True)
+
+`iterencode()` yields the text in pieces while it walks the value. Only the
+open containers are kept, on an explicit stack, so nesting depth is not
+limited by the recursion limit and a generator can stand in for an array
+too big to hold. `dump()` joins the pieces into chunks of about
+`chunk_size` characters and writes each to the file as it fills, so the
+whole text never exists at once; `dumps()` returns it as one string.
+
+Strings are escaped with the precompiled table in jsonParser, and only
+those that need it go through a substitution at all. Output is compact by
+default; `indent` puts every member and item on its own line.
+
+    python serializer.py input.json --indent 2 --sort-keys
+"""
+import argparse
+import sys
+from operator import itemgetter
+from types import GeneratorType
+
+from jsonParser import (
+    JSONArrayNode,
+    JSONBooleanNode,
+    JSONNullNode,
+    JSONNumberNode,
+    JSONObjectNode,
+    JSONParseError,
+    JSONStringNode,
+    load,
+    quote,
+)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# What each node class holds, as a native value
+_NODE_VALUES = {
+    JSONObjectNode: lambda node: node.pairs,
+    JSONArrayNode: lambda node: node.items,
+    JSONStringNode: lambda node: node.value,
+    JSONNumberNode: lambda node: node.value,
+    JSONBooleanNode: lambda node: node.value,
+    JSONNullNode: lambda node: None,
+}
+_ARRAYS = (list, tuple, GeneratorType)
+_END = object()
+
+
+def _number(value) -> str:
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError(f"{value!r} cannot be written as JSON")
+    return float.__repr__(value)
+
+
+def _key(key, ensure_ascii: bool) -> str:
+    if isinstance(key, str):
+        return quote(key, ensure_ascii)
+    if type(key) in _NODE_VALUES:
+        return _key(_NODE_VALUES[type(key)](key), ensure_ascii)
+    if isinstance(key, (int, float)) and not isinstance(key, bool):
+        return '"' + _number(key) + '"'
+    raise TypeError(f"Object keys must be str, int or float, not {type(key).__name__}")
+
+
+def iterencode(value, indent=None, sort_keys: bool = False, separators=None, ensure_ascii: bool = False):
+    """
+    Yield the JSON text for `value` in pieces.
+
+    Dicts are objects; lists, tuples and generators are arrays. `indent` is
+    a number of spaces or a string to indent with. `separators` is an
+    (item, key) pair as in the json module, by default (",", ":"), or
+    (",", ": ") when indenting.
+    """
+    if isinstance(indent, int):
+        indent = " " * indent
+    if separators is None:
+        separators = (",", ": ") if indent is not None else (",", ":")
+    item_separator, key_separator = separators
+    # Each open container: the iterator over its members or items, whether
+    # it is an object, and its id
+    stack = []
+    # ids of the open containers, to catch a value that contains itself
+    open_ids = set()
+    while True:
+        if type(value) in _NODE_VALUES:
+            value = _NODE_VALUES[type(value)](value)
+        if isinstance(value, str):
+            yield quote(value, ensure_ascii)
+        elif value is None:
+            yield "null"
+        elif value is True:
+            yield "true"
+        elif value is False:
+            yield "false"
+        elif isinstance(value, (int, float)):
+            yield _number(value)
+        elif isinstance(value, dict) or isinstance(value, _ARRAYS):
+            if id(value) in open_ids:
+                raise ValueError("Circular reference in value")
+            is_object = isinstance(value, dict)
+            if not is_object:
+                children = iter(value)
+            elif sort_keys:
+                children = iter(sorted(value.items(), key=itemgetter(0)))
+            else:
+                children = iter(value.items())
+            child = next(children, _END)
+            if child is not _END:
+                stack.append((children, is_object, id(value)))
+                open_ids.add(id(value))
+                opening = "{" if is_object else "["
+                if indent is not None:
+                    opening += "\n" + indent * len(stack)
+                if is_object:
+                    key, value = child
+                    yield opening + _key(key, ensure_ascii) + key_separator
+                else:
+                    value = child
+                    yield opening
+                continue
+            yield "{}" if is_object else "[]"
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        # Close the containers that are finished, then go on to the next
+        # member or item of the innermost one left
+        while stack:
+            children, is_object, container_id = stack[-1]
+            child = next(children, _END)
+            if child is not _END:
+                break
+            stack.pop()
+            open_ids.discard(container_id)
+            closing = "}" if is_object else "]"
+            yield closing if indent is None else "\n" + indent * len(stack) + closing
+        else:
+            return
+        separator = item_separator if indent is None else item_separator + "\n" + indent * len(stack)
+        if is_object:
+            key, value = child
+            yield separator + _key(key, ensure_ascii) + key_separator
+        else:
+            value = child
+            yield separator
+
+
+def dumps(value, indent=None, sort_keys: bool = False, separators=None, ensure_ascii: bool = False) -> str:
+    return "".join(iterencode(value, indent, sort_keys, separators, ensure_ascii))
+
+
+def dump(value, file, indent=None, sort_keys: bool = False, separators=None, ensure_ascii: bool = False,
+         chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str | None = None) -> None:
+    """Write `value` to `file` in chunks of about `chunk_size` characters.
+    Like json.dump, the chunks are str; with an `encoding`, such as
+    "utf-8" for a file opened in binary mode, they are bytes in it."""
+    write = file.write
+    pieces = []
+    size = 0
+    for piece in iterencode(value, indent, sort_keys, separators, ensure_ascii):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            chunk = "".join(pieces)
+            write(chunk if encoding is None else chunk.encode(encoding))
+            pieces.clear()
+            size = 0
+    chunk = "".join(pieces)
+    write(chunk if encoding is None else chunk.encode(encoding))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reformat a JSON file to standard output")
+    parser.add_argument("input_file")
+    parser.add_argument("--indent", type=int, help="spaces per level; compact if not given")
+    parser.add_argument("--sort-keys", action="store_true")
+    parser.add_argument("--ensure-ascii", action="store_true", help="escape all non-ASCII characters")
+    args = parser.parse_args()
+    with open(args.input_file, encoding="utf-8") as f:
+        try:
+            value = load(f)
+        except JSONParseError as err:
+            print(f"Invalid JSON: {err}", file=sys.stderr)
+            sys.exit(1)
+    dump(value, sys.stdout, args.indent, args.sort_keys, ensure_ascii=args.ensure_ascii)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Event based parsing of JSON read in chunks, for documents too big to load.
+
+    with open("export.json", "rb") as f:
+        for record in items(f, "records.item"):
+            ...
+
+`basic_parse()` yields (event, value) pairs, the events being start_map,
+map_key, end_map, start_array, end_array, string, number, boolean and null.
+`parse()` adds the prefix path of each event, like "records.item.name", and
+`items()` builds and yields the values found at one prefix, one at a time.
+
+Only the unparsed tail of the last chunk is kept, so memory use depends on
+the longest single token and, for `items()`, the largest value built, not
+on the size of the file. Any object with a read(size) method works, in text
+or binary mode; for a socket use `sock.makefile("rb")`.
+"""
+import codecs
+import re
+
+from jsonParser import LITERALS, NUMBER, STRING_BODY, WHITESPACE, JSONParseError, parse_error, unescape
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# Groups: 1 string, 2 number (3 its fraction and exponent), 4 punctuation, 5 literal
+TOKEN = re.compile(rf'[ \t\n\r]*(?:"({STRING_BODY})"|({NUMBER})|([{{}}\[\],:])|(true|false|null))')
+# A token cut short by the end of the buffer, which the next read may complete
+PARTIAL_TOKEN = re.compile(
+    rf'[ \t\n\r]*(?:"{STRING_BODY}(?:\\(?:u[0-9a-fA-F]{{0,3}})?)?'
+    r"|-?[0-9]*(?:\.[0-9]*)?(?:[eE][-+]?[0-9]*)?"
+    r"|t(?:r(?:u)?)?|f(?:a(?:l(?:s)?)?)?|n(?:u(?:l)?)?)\Z"
+)
+
+# Parser states
+VALUE, FIRST_ITEM, FIRST_KEY, KEY, COLON, AFTER_VALUE, DONE = range(7)
+
+
+def text_reader(file):
+    """A read(size) function returning str for a text or binary file. Bytes
+    are decoded as UTF-8 incrementally, so characters may span reads."""
+    read = getattr(file, "read1", file.read)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read_text(size: int) -> str:
+        while True:
+            chunk = read(size)
+            if isinstance(chunk, str):
+                return chunk
+            if not chunk:
+                return decoder.decode(b"", final=True)
+            text = decoder.decode(chunk)
+            if text:
+                return text
+
+    return read_text
+
+
+def _expected(state: int, stack: list) -> str:
+    if state == AFTER_VALUE:
+        return "',' or '}'" if stack[-1] else "',' or ']'"
+    return {
+        VALUE: "value",
+        FIRST_ITEM: "value or ']'",
+        FIRST_KEY: "property name or '}'",
+        KEY: "property name",
+        COLON: "':'",
+    }[state]
+
+
+def basic_parse(file, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """Yield (event, value) for each token of the document in `file`."""
+    read = text_reader(file)
+    match_token = TOKEN.match
+    buffer = ""
+    position = 0
+    eof = False
+    # Where the buffer starts in the input, for error positions
+    start = (0, 1, 0)
+    # True for each open object, False for each open array
+    stack = []
+    state = VALUE
+    while True:
+        match = match_token(buffer, position)
+        if match:
+            # A number may go on in the next read: "1" then "2", or "1" then ".5",
+            # in which case the "." or "e+" is still sitting at the buffer's end
+            incomplete = match.lastindex == 2 and len(buffer) - match.end() < 3
+        else:
+            incomplete = PARTIAL_TOKEN.match(buffer, position)
+        if incomplete and not eof:
+            offset, line, line_start = start
+            newline = buffer.rfind("\n", 0, position)
+            start = (
+                offset + position,
+                line + buffer.count("\n", 0, position),
+                offset + newline + 1 if newline != -1 else line_start,
+            )
+            buffer = buffer[position:]
+            position = 0
+            # Reads grow with the pending token, so a long one is not rescanned once per small chunk
+            chunk = read(max(buffer_size, len(buffer)))
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+            continue
+        if state == DONE:
+            end = WHITESPACE.match(buffer, position).end()
+            if end == len(buffer):
+                return
+            raise JSONParseError("Extra data", buffer, end, start)
+        if match is None:
+            raise parse_error(buffer, position, _expected(state, stack), start)
+
+        kind = match.lastindex
+        if kind == 4:
+            char = match[4]
+            if char == "{" and state <= FIRST_ITEM:
+                yield "start_map", None
+                stack.append(True)
+                state = FIRST_KEY
+            elif char == "[" and state <= FIRST_ITEM:
+                yield "start_array", None
+                stack.append(False)
+                state = FIRST_ITEM
+            elif char == "}" and (state == FIRST_KEY or state == AFTER_VALUE and stack[-1]):
+                stack.pop()
+                yield "end_map", None
+                state = AFTER_VALUE if stack else DONE
+            elif char == "]" and (state == FIRST_ITEM or state == AFTER_VALUE and not stack[-1]):
+                stack.pop()
+                yield "end_array", None
+                state = AFTER_VALUE if stack else DONE
+            elif char == "," and state == AFTER_VALUE:
+                state = KEY if stack[-1] else VALUE
+            elif char == ":" and state == COLON:
+                state = VALUE
+            else:
+                raise parse_error(buffer, position, _expected(state, stack), start)
+        elif kind == 1 and (state == FIRST_KEY or state == KEY):
+            key = match[1]
+            yield "map_key", unescape(key) if "\\" in key else key
+            state = COLON
+        elif state <= FIRST_ITEM:
+            if kind == 1:
+                value = match[1]
+                yield "string", unescape(value) if "\\" in value else value
+            elif kind == 2:
+                yield "number", float(match[2]) if match[3] else int(match[2])
+            else:
+                value = LITERALS[match[5]]
+                yield ("null" if value is None else "boolean"), value
+            state = AFTER_VALUE if stack else DONE
+        else:
+            raise parse_error(buffer, position, _expected(state, stack), start)
+        position = match.end()
+
+
+def parse(file, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """Yield (prefix, event, value), where prefix is the dotted path of the
+    event's position: map keys by name and array items as "item"."""
+    path = []
+    prefix = ""
+    for event, value in basic_parse(file, buffer_size):
+        if event == "map_key":
+            path[-1] = value
+            yield ".".join(path[:-1]), event, value
+            prefix = ".".join(path)
+        elif event == "start_map":
+            yield prefix, event, value
+            # Filled in by the first key
+            path.append("")
+        elif event == "start_array":
+            yield prefix, event, value
+            path.append("item")
+            prefix = ".".join(path)
+        elif event == "end_map" or event == "end_array":
+            path.pop()
+            prefix = ".".join(path)
+            yield prefix, event, value
+        else:
+            yield prefix, event, value
+
+
+def _build(event: str, events):
+    """The container opened by `event`, built from the events that follow."""
+    root = {} if event == "start_map" else []
+    stack = [root]
+    key = None
+    for _, event, value in events:
+        if event == "map_key":
+            key = value
+            continue
+        if event == "end_map" or event == "end_array":
+            stack.pop()
+            if not stack:
+                return root
+            continue
+        if event == "start_map" or event == "start_array":
+            value = {} if event == "start_map" else []
+        container = stack[-1]
+        if type(container) is dict:
+            container[key] = value
+        else:
+            container.append(value)
+        if event == "start_map" or event == "start_array":
+            stack.append(value)
+    raise ValueError("Events ended inside a container")
+
+
+def items(file, prefix: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """Yield each value found at `prefix`, e.g. every element of the
+    "records" array with prefix "records.item"."""
+    events = parse(file, buffer_size)
+    for current, event, value in events:
+        if current != prefix or event == "map_key" or event == "end_map" or event == "end_array":
+            continue
+        if event == "start_map" or event == "start_array":
+            yield _build(event, events)
+        else:
+            yield value
@@ -0,0 +1,360 @@
+"""
+A parsed JSON document held as a tape, after simdjson's.
+
+    tape = Tape(text)
+    tape.root()["records"][10]["name"]
+
+Instead of a Python object per value, the whole document is one array of
+64-bit words, one per value or bracket in document order. Each word is a
+tag in its top byte and a payload below it:
+
+    {  [      index of the closing word
+    }  ]      index of the opening word
+    "         offset of the string in the text
+    e         index in `strings` of a string that had escapes
+    l         an integer that fits in 56 bits, as two's complement
+    L         index in `strings` of a bigger integer's digits
+    d         index in `doubles`, an array of the floats
+    t  f  n   true, false, null
+
+Strings without escapes, which are most of them, stay in the input text
+and are only sliced out when read, up to the next quote; keys are compared
+in place with str.startswith. The text, the words and the two pools are
+all that is kept, about 8 bytes per value next to the hundred or so that a
+dict entry or list item with its own str or int object costs.
+
+`root()` and indexing return TapeObject and TapeArray views for containers,
+which hold just the tape and a word index, and native values otherwise.
+The first time an array is indexed or measured, the word index of each of
+its items is kept on the tape, so later lookups by position are O(1).
+"""
+from array import array
+
+from jsonParser import (
+    _FIRST_MEMBER,
+    _NEXT_ITEM,
+    _NEXT_MEMBER,
+    _VALUE,
+    WHITESPACE,
+    JSONDataTypes,
+    JSONParseError,
+    explain_failure,
+    unescape,
+)
+
+TAG_SHIFT = 56
+PAYLOAD = (1 << TAG_SHIFT) - 1
+SIGN = 1 << (TAG_SHIFT - 1)
+
+OPEN_OBJECT, CLOSE_OBJECT, OPEN_ARRAY, CLOSE_ARRAY = map(ord, "{}[]")
+STRING, ESCAPED_STRING, INT, BIG_INT, DOUBLE = map(ord, '"elLd')
+TRUE, FALSE, NULL = map(ord, "tfn")
+LITERAL_WORDS = {"t": TRUE << TAG_SHIFT, "f": FALSE << TAG_SHIFT, "n": NULL << TAG_SHIFT}
+LITERAL_VALUES = {TRUE: True, FALSE: False, NULL: None}
+
+
+class Tape:
+    """The tape of one document: `words`, the `doubles` and `strings`
+    pools, and the text the string words point into."""
+
+    def __init__(self, text: str):
+        if isinstance(text, (bytes, bytearray)):
+            text = text.decode("utf-8")
+        self.text = text
+        self.words = array("q")
+        self.doubles = array("d")
+        self.strings = []
+        # Word index of each item, by the opening word of the arrays indexed so far
+        self._item_indexes = {}
+        self._build()
+
+    def _build(self) -> None:
+        text = self.text
+        words = self.words
+        append = words.append
+        doubles = self.doubles
+        strings = self.strings
+        find = text.find
+        match_first_member = _FIRST_MEMBER.match
+        match_next_member = _NEXT_MEMBER.match
+        match_next_item = _NEXT_ITEM.match
+        # Word indexes of the open containers, each with whether its parent is an object
+        stack = []
+        is_object = False
+        match_next = _VALUE.match
+        position = 0
+        while True:
+            match = match_next(text, position)
+            if match is None:
+                raise explain_failure(text, position, match_next.__self__)
+            position = match.end()
+            kind = match.lastindex
+            if kind == 9:
+                # Link the closing word and the opening one to each other
+                opening, is_object = stack.pop()
+                close = len(words)
+                words[opening] |= close
+                append((words[opening] >> TAG_SHIFT) + 2 << TAG_SHIFT | opening)
+                if not stack:
+                    break
+                match_next = match_next_member if is_object else match_next_item
+                continue
+
+            if is_object:
+                start, end = match.span(1)
+                if find("\\", start, end) == -1:
+                    append(STRING << TAG_SHIFT | start)
+                else:
+                    append(ESCAPED_STRING << TAG_SHIFT | len(strings))
+                    strings.append(unescape(text[start:end]))
+            if kind == 2:
+                start, end = match.span(2)
+                if find("\\", start, end) == -1:
+                    append(STRING << TAG_SHIFT | start)
+                else:
+                    append(ESCAPED_STRING << TAG_SHIFT | len(strings))
+                    strings.append(unescape(text[start:end]))
+            elif kind == 3:
+                if match.start(4) != match.end(4):
+                    append(DOUBLE << TAG_SHIFT | len(doubles))
+                    doubles.append(float(match[3]))
+                else:
+                    number = int(match[3])
+                    if -SIGN <= number < SIGN:
+                        append(INT << TAG_SHIFT | number & PAYLOAD)
+                    else:
+                        append(BIG_INT << TAG_SHIFT | len(strings))
+                        strings.append(match[3])
+            elif kind == 8:
+                append(LITERAL_WORDS[text[match.start(8)]])
+            elif kind == 7:
+                stack.append((len(words), is_object))
+                if text[match.start(7)] == "{":
+                    append(OPEN_OBJECT << TAG_SHIFT)
+                    is_object = True
+                    match_next = match_first_member
+                else:
+                    append(OPEN_ARRAY << TAG_SHIFT)
+                    is_object = False
+                    match_next = _VALUE.match
+                continue
+            else:
+                opening = len(words)
+                tag = OPEN_OBJECT if kind == 5 else OPEN_ARRAY
+                append(tag << TAG_SHIFT | opening + 1)
+                append(tag + 2 << TAG_SHIFT | opening)
+
+            if not stack:
+                break
+            match_next = match_next_member if is_object else match_next_item
+
+        end = WHITESPACE.match(text, position).end()
+        if end != len(text):
+            raise JSONParseError("Extra data", text, end)
+
+    def root(self):
+        return self.value(0)
+
+    def skip(self, index: int) -> int:
+        """The index of the word after the value at `index`."""
+        word = self.words[index]
+        tag = word >> TAG_SHIFT
+        if tag == OPEN_OBJECT or tag == OPEN_ARRAY:
+            return (word & PAYLOAD) + 1
+        return index + 1
+
+    def value(self, index: int):
+        """The value at `index`: a view for a container, otherwise the
+        native value."""
+        word = self.words[index]
+        tag = word >> TAG_SHIFT
+        if tag == OPEN_OBJECT:
+            return TapeObject(self, index)
+        if tag == OPEN_ARRAY:
+            return TapeArray(self, index)
+        return self.scalar(index)
+
+    def scalar(self, index: int):
+        word = self.words[index]
+        tag = word >> TAG_SHIFT
+        payload = word & PAYLOAD
+        if tag == STRING:
+            return self.text[payload:self.text.find('"', payload)]
+        if tag == INT:
+            return payload - ((payload & SIGN) << 1)
+        if tag == DOUBLE:
+            return self.doubles[payload]
+        if tag == ESCAPED_STRING:
+            return self.strings[payload]
+        if tag == BIG_INT:
+            return int(self.strings[payload])
+        return LITERAL_VALUES[tag]
+
+    def item_indexes(self, index: int) -> array:
+        """The word index of each item of the array at `index`, found the
+        first time and kept."""
+        items = self._item_indexes.get(index)
+        if items is None:
+            items = array("q")
+            skip = self.skip
+            end = self.words[index] & PAYLOAD
+            item = index + 1
+            while item < end:
+                items.append(item)
+                item = skip(item)
+            self._item_indexes[index] = items
+        return items
+
+    def key_equals(self, index: int, key: str) -> bool:
+        """Whether the string at `index` is `key`, without slicing it out."""
+        word = self.words[index]
+        payload = word & PAYLOAD
+        if word >> TAG_SHIFT == STRING:
+            # A string left in the text has no quote or backslash in it, so
+            # a key with one could otherwise match across the closing quote
+            if '"' in key or "\\" in key:
+                return False
+            return self.text.startswith(key, payload) and self.text.startswith('"', payload + len(key))
+        return self.strings[payload] == key
+
+    def to_python(self, index: int = 0) -> JSONDataTypes:
+        """The value at `index` as native dicts, lists and scalars."""
+        words = self.words
+        scalar = self.scalar
+        word = words[index]
+        tag = word >> TAG_SHIFT
+        if tag != OPEN_OBJECT and tag != OPEN_ARRAY:
+            return scalar(index)
+        end = word & PAYLOAD
+        root = container = {} if tag == OPEN_OBJECT else []
+        stack = []
+        key = None
+        index += 1
+        while index < end:
+            word = words[index]
+            tag = word >> TAG_SHIFT
+            if tag == CLOSE_OBJECT or tag == CLOSE_ARRAY:
+                container = stack.pop()
+                index += 1
+                continue
+            if key is None and type(container) is dict:
+                key = scalar(index)
+                index += 1
+                continue
+            if tag == OPEN_OBJECT or tag == OPEN_ARRAY:
+                value = {} if tag == OPEN_OBJECT else []
+            else:
+                value = scalar(index)
+            if key is None:
+                container.append(value)
+            else:
+                container[key] = value
+                key = None
+            if tag == OPEN_OBJECT or tag == OPEN_ARRAY:
+                stack.append(container)
+                container = value
+            index += 1
+        return root
+
+
+class TapeObject:
+    __slots__ = ("tape", "index")
+
+    def __init__(self, tape: Tape, index: int):
+        self.tape = tape
+        self.index = index
+
+    def _members(self):
+        """(key word index, value word index) of each member."""
+        tape = self.tape
+        skip = tape.skip
+        end = tape.words[self.index] & PAYLOAD
+        index = self.index + 1
+        while index < end:
+            value = skip(index)
+            yield index, value
+            index = skip(value)
+
+    def _find(self, key: str) -> int:
+        """Word index of the value for `key`, or -1. With duplicate names
+        this is the first one, where a full parse keeps the last."""
+        key_equals = self.tape.key_equals
+        for name, value in self._members():
+            if key_equals(name, key):
+                return value
+        return -1
+
+    def __getitem__(self, key: str):
+        index = self._find(key)
+        if index == -1:
+            raise KeyError(key)
+        return self.tape.value(index)
+
+    def get(self, key: str, default=None):
+        index = self._find(key)
+        return default if index == -1 else self.tape.value(index)
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) != -1
+
+    def __iter__(self):
+        scalar = self.tape.scalar
+        return (scalar(name) for name, _ in self._members())
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        scalar, value = self.tape.scalar, self.tape.value
+        return ((scalar(name), value(index)) for name, index in self._members())
+
+    def __len__(self):
+        return sum(1 for _ in self._members())
+
+    def to_python(self) -> dict:
+        return self.tape.to_python(self.index)
+
+    def __repr__(self):
+        return f"TapeObject({len(self)} members)"
+
+
+class TapeArray:
+    __slots__ = ("tape", "index")
+
+    def __init__(self, tape: Tape, index: int):
+        self.tape = tape
+        self.index = index
+
+    def _items(self):
+        """Word index of each item."""
+        skip = self.tape.skip
+        end = self.tape.words[self.index] & PAYLOAD
+        index = self.index + 1
+        while index < end:
+            yield index
+            index = skip(index)
+
+    def __getitem__(self, position: int):
+        try:
+            index = self.tape.item_indexes(self.index)[position]
+        except IndexError:
+            raise IndexError("array index out of range") from None
+        return self.tape.value(index)
+
+    def __len__(self):
+        return len(self.tape.item_indexes(self.index))
+
+    def __iter__(self):
+        value = self.tape.value
+        return (value(index) for index in self._items())
+
+    def to_python(self) -> list:
+        return self.tape.to_python(self.index)
+
+    def __repr__(self):
+        return f"TapeArray({len(self)} items)"
+
+
+def loads_tape(text: str):
+    """The top level value of the document, as a view if it is a container."""
+    return Tape(text).root()
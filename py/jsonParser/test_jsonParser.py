@@ -0,0 +1,75 @@
+import glob
+import json
+import os
+import unittest
+
+from jsonParser import JSONParseError, Lexer, TokenType, loads, quote
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "go", "jsonParser", "resources")
+
+
+class TestParser(unittest.TestCase):
+    def test_resources(self):
+        paths = sorted(glob.glob(os.path.join(RESOURCES, "step*", "*.json")))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            with self.subTest(path=os.path.relpath(path, RESOURCES)):
+                if os.path.basename(path).startswith("valid"):
+                    self.assertEqual(loads(text), json.loads(text))
+                else:
+                    with self.assertRaises(JSONParseError):
+                        loads(text)
+
+    def test_values(self):
+        for text in ('"a\\"b\\\\c\\u00e9\\ud83d\\ude00\\n"', "-0.5e-3", "12345678901234567890", "[[], {}, [[]]]",
+                     '{"a": {"b": [1, 2, {"c": null}]}, "a2": true}', " [ 1 , 2 ] ", b'{"k": "v"}'):
+            with self.subTest(text=text):
+                self.assertEqual(loads(text), json.loads(text))
+
+    def test_deep_nesting(self):
+        depth = 100000
+        value = loads("[" * depth + "]" * depth)
+        for _ in range(depth - 1):
+            (value,) = value
+        self.assertEqual(value, [])
+
+    def test_errors(self):
+        for text, message in (
+            ("", "Unexpected end of input"),
+            ("[1, 2", "Unexpected end of input"),
+            ("[1 2]", "Expecting ',' or ']'"),
+            ('{"a" 1}', "Expecting ':'"),
+            ("[01]", "Expecting ',' or ']'"),
+            ('"\\x"', "Invalid string"),
+            ('"tab\there"', "Invalid string"),
+            ("[1] x", "Extra data"),
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(JSONParseError) as caught:
+                    loads(text)
+                self.assertIn(message, str(caught.exception))
+
+    def test_error_position(self):
+        with self.assertRaises(JSONParseError) as caught:
+            loads('{\n  "a": 1,\n  b: 2\n}')
+        self.assertEqual((caught.exception.line, caught.exception.column), (3, 3))
+
+    def test_lexer(self):
+        tokens = [(token.token_type, token.value) for token in Lexer('{"a": [1.5, true]}')]
+        self.assertEqual(tokens, [
+            (TokenType.OBJECT_START, None), (TokenType.STRING_LITERAL, "a"), (TokenType.COLON, None),
+            (TokenType.ARRAY_START, None), (TokenType.NUMBER, 1.5), (TokenType.COMMA, None),
+            (TokenType.TRUE, None), (TokenType.ARRAY_END, None), (TokenType.OBJECT_END, None),
+            (TokenType.EOF, None),
+        ])
+
+    def test_quote(self):
+        for value in ('plain', 'quote " and \\ and \n\x01', "é😀"):
+            self.assertEqual(quote(value), json.dumps(value, ensure_ascii=False))
+            self.assertEqual(quote(value, ensure_ascii=True), json.dumps(value))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import unittest
+
+from jsonParser import JSONParseError
+from lazy import LazyArray, LazyObject, bracket_positions, lazy_loads
+
+DOCUMENT = json.dumps({
+    "strings": ["{not a bracket}", "quote \" [", "slash \\", "\\\" ]"],
+    "nested": {"a": {"a": 1}, "b": [[1, 2], {"a": 3}]},
+    "key with \"escapes\"": True,
+    "records": [{"id": i, "name": f"n{i}"} for i in range(50)],
+})
+
+
+class TestLazy(unittest.TestCase):
+    def test_matches_full_parse(self):
+        expected = json.loads(DOCUMENT)
+        document = lazy_loads(DOCUMENT)
+        self.assertIsInstance(document, LazyObject)
+        self.assertEqual(document.to_python(), expected)
+        self.assertEqual(document["strings"].to_python(), expected["strings"])
+        self.assertEqual(document["key with \"escapes\""], True)
+        self.assertEqual(document.keys(), list(expected))
+        self.assertEqual(len(document), len(expected))
+
+    def test_lookup_at_own_level(self):
+        nested = lazy_loads(DOCUMENT)["nested"]
+        # "a" also appears deeper inside the first member
+        self.assertEqual(nested["a"].to_python(), {"a": 1})
+        self.assertEqual(nested["b"][1]["a"], 3)
+        self.assertNotIn("c", nested)
+        self.assertEqual(nested.get("c", 0), 0)
+        with self.assertRaises(KeyError):
+            nested["c"]
+
+    def test_arrays(self):
+        records = lazy_loads(DOCUMENT)["records"]
+        self.assertIsInstance(records, LazyArray)
+        self.assertEqual(records[49]["name"], "n49")
+        self.assertEqual(records[-1]["id"], 49)
+        self.assertEqual(records[3]["id"], 3)
+        self.assertEqual(len(records), 50)
+        self.assertEqual([record["id"] for record in records], list(range(50)))
+        with self.assertRaises(IndexError):
+            records[50]
+
+    def test_scalars_and_empty(self):
+        self.assertEqual(lazy_loads(" 12 "), 12)
+        self.assertEqual(lazy_loads('"s"'), "s")
+        self.assertEqual(lazy_loads("[]").to_python(), [])
+        self.assertEqual(lazy_loads(b'{"a": {}}')["a"].to_python(), {})
+
+    def test_bracket_positions(self):
+        text = '{"a": "[}", "b\\"{": [1, {"c": "\\\\"}]}'
+        expected = [i for i, char in enumerate(text) if char in "{}[]" and i not in (7, 8, 16)]
+        self.assertEqual(bracket_positions(text), expected)
+
+    def test_errors(self):
+        for text in ("[1, 2", "[1, 2]]", "[1, 2}", '{"a": 1} 2', "[1, 2] x"):
+            with self.subTest(text=text):
+                with self.assertRaises(JSONParseError):
+                    lazy_loads(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from ndjson import NDJSONError, iter_ndjson, split_ranges
+
+
+def even_ids(record):
+    return record["id"] if record["id"] % 2 == 0 else None
+
+
+class TestNDJSON(unittest.TestCase):
+    def write(self, text: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=".ndjson")
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_values_in_order(self):
+        path = self.write("".join(f'{{"id": {i}}}\n' for i in range(200)))
+        expected = [{"id": i} for i in range(200)]
+        self.assertEqual(list(iter_ndjson(path, workers=1)), expected)
+        self.assertEqual(list(iter_ndjson(path, workers=2, range_size=256)), expected)
+        unordered = iter_ndjson(path, workers=2, ordered=False, range_size=256)
+        self.assertEqual(sorted(unordered, key=lambda record: record["id"]), expected)
+
+    def test_null_lines_are_kept(self):
+        path = self.write('1\nnull\n\n"a"\nnull')
+        self.assertEqual(list(iter_ndjson(path, workers=1)), [1, None, "a", None])
+
+    def test_transform_drops_none(self):
+        path = self.write("".join(f'{{"id": {i}}}\n' for i in range(10)))
+        self.assertEqual(list(iter_ndjson(path, workers=2, transform=even_ids, range_size=16)), [0, 2, 4, 6, 8])
+
+    def test_ranges_end_after_newlines(self):
+        text = "".join(f"[{i}]\n" for i in range(100))
+        path = self.write(text)
+        ranges = split_ranges(path, 50)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(text))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(text[end - 1], "\n")
+
+    def test_errors(self):
+        path = self.write('1\n{"a": \n3\n')
+        with self.assertRaises(NDJSONError) as caught:
+            list(iter_ndjson(path, workers=1))
+        self.assertEqual(caught.exception.offset, 2)
+        errors = []
+        self.assertEqual(list(iter_ndjson(path, workers=1, on_error=errors.append)), [1, 3])
+        self.assertEqual([error.offset for error in errors], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from dataclasses import dataclass, field
+from typing import Any, Literal, Optional, TypedDict, Union
+
+from jsonParser import JSONParseError
+from schema import SchemaError, compile_schema
+
+
+@dataclass
+class Address:
+    city: str
+
+
+@dataclass
+class User:
+    id: int
+    name: str
+    address: Address
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Point:
+    x: int
+
+
+@dataclass
+class Label:
+    y: str
+
+
+class Anything(TypedDict):
+    a: Any
+
+
+class IdOrName(TypedDict):
+    b: int | str
+
+
+class TestSchema(unittest.TestCase):
+    def assertSchemaError(self, schema, text, message):
+        with self.assertRaises(SchemaError) as caught:
+            compile_schema(schema)(text)
+        self.assertIn(message, str(caught.exception))
+        return caught.exception
+
+    def test_dataclass(self):
+        user = compile_schema(User)('{"id": 1, "name": "Ann", "address": {"city": "Oslo"}, "extra": [1, {"x": 2}]}')
+        self.assertEqual(user, User(1, "Ann", Address("Oslo")))
+
+    def test_json_schema(self):
+        decode = compile_schema({
+            "type": "object",
+            "properties": {"n": {"type": "integer", "minimum": 0}, "s": {"type": "string", "maxLength": 3}},
+            "required": ["n"],
+            "additionalProperties": False,
+        })
+        self.assertEqual(decode('{"n": 3, "s": "abc"}'), {"n": 3, "s": "abc"})
+        with self.assertRaises(SchemaError):
+            decode('{"n": -1}')
+        with self.assertRaises(SchemaError):
+            decode('{"n": 3, "t": 1}')
+        with self.assertRaises(SchemaError):
+            decode('{"s": "a"}')
+
+    def test_error_path(self):
+        self.assertSchemaError(list[User], '[{"id": 1, "name": "a", "address": {"city": 5}}]',
+                               "$[0].address.city: expected string, found integer")
+
+    def test_string_under_any(self):
+        self.assertEqual(compile_schema(Anything)('{"a":"hello"}'), {"a": "hello"})
+        self.assertEqual(compile_schema(list[Any])('["x", 1]'), ["x", 1])
+        self.assertEqual(compile_schema({"properties": {"x": {}}})('{"x": "s"}'), {"x": "s"})
+
+    def test_string_under_union(self):
+        self.assertEqual(compile_schema(IdOrName)('{"b":"abc"}'), {"b": "abc"})
+        self.assertEqual(compile_schema(list[int | str])('["12", 3]'), ["12", 3])
+        self.assertEqual(compile_schema({"type": ["string", "array"]})('"x"'), "x")
+
+    def test_union_tries_every_option(self):
+        self.assertEqual(compile_schema(Union[Point, Label])('{"y":"s"}'), Label("s"))
+        self.assertEqual(compile_schema(Union[Point, Label])('{"x":1}'), Point(1))
+        self.assertSchemaError(Union[Point, Label], '{"x":"s"}',
+                               "($.x: expected integer, found string; $: missing required y)")
+        # Options of the wrong type altogether leave no reason of their own
+        self.assertSchemaError(Union[Point, list[int]], '{"x":"s"}', "$.x: expected integer, found string")
+        self.assertSchemaError(Union[Point, Label], '[]', "found array")
+
+    def test_enum_tells_booleans_from_numbers(self):
+        self.assertSchemaError(Literal[1, "a"], "true", "True is not one of")
+        self.assertSchemaError(Literal[False], "0", "0 is not one of")
+        self.assertEqual(compile_schema(Literal[1, True])("true"), True)
+        self.assertSchemaError({"enum": [0, 1]}, "false", "False is not one of")
+        self.assertSchemaError(list[Literal[1]], "[true]", "$[0]: True is not one of")
+
+    def test_string_under_optional(self):
+        self.assertEqual(compile_schema(Optional[str])('"q"'), "q")
+        self.assertSchemaError(Optional[int], '"q"', "expected integer or null, found string")
+        self.assertSchemaError(dict[str, Optional[Address]], '{"k": "q"}', "$.k: expected object, found string")
+
+    def test_wrong_type_string_reports_its_start(self):
+        err = self.assertSchemaError(int, '"1"', "expected integer, found string")
+        self.assertEqual(err.position, 0)
+        err = self.assertSchemaError(list[int], '[1, "1"]', "$[1]: expected integer, found string")
+        self.assertEqual(err.position, 4)
+        err = self.assertSchemaError({"properties": {"s": {"type": "string", "minLength": 2}}}, '{"s": "a"}',
+                                     "$.s: shorter than 2")
+        self.assertEqual(err.position, 6)
+
+    def test_malformed_json(self):
+        with self.assertRaises(JSONParseError):
+            compile_schema(User)('{"id": 1,')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import io
+import json
+import unittest
+
+from jsonParser import JSONArrayNode, JSONBooleanNode, JSONNullNode, JSONNumberNode, JSONObjectNode, JSONStringNode
+from serializer import dump, dumps
+
+VALUE = {"b": [1, 2.5, -3e-20, True, False, None, [], {}], "a": {"é": "quote \" \\ \n\x00😀"}, "c": [[{"d": []}]]}
+
+
+class TestSerializer(unittest.TestCase):
+    def test_matches_json_module(self):
+        # Our options, and the json module's for the same output
+        for options, json_options in (
+            ({}, {"separators": (",", ":")}),
+            ({"indent": 2}, {"indent": 2}),
+            ({"indent": "\t", "sort_keys": True}, {"indent": "\t", "sort_keys": True}),
+            ({"ensure_ascii": True}, {"separators": (",", ":"), "ensure_ascii": True}),
+            ({"separators": (", ", ": ")}, {}),
+        ):
+            with self.subTest(options=options):
+                expected = json.dumps(VALUE, **{"ensure_ascii": False, **json_options})
+                self.assertEqual(dumps(VALUE, **options), expected)
+
+    def test_nodes(self):
+        node = JSONObjectNode({
+            "s": JSONStringNode("x"),
+            "n": JSONNumberNode(1),
+            "l": JSONArrayNode([JSONBooleanNode(True), JSONNullNode()]),
+        })
+        self.assertEqual(dumps(node), '{"s":"x","n":1,"l":[true,null]}')
+
+    def test_generators_and_keys(self):
+        self.assertEqual(dumps((i for i in range(3))), "[0,1,2]")
+        self.assertEqual(dumps({1: "a", 2.5: "b"}), '{"1":"a","2.5":"b"}')
+        with self.assertRaises(TypeError):
+            dumps({(1, 2): "tuple key"})
+        with self.assertRaises(TypeError):
+            dumps({"set": {1}})
+
+    def test_invalid_values(self):
+        for value in (float("nan"), float("inf")):
+            with self.assertRaises(ValueError):
+                dumps([value])
+        circular = []
+        circular.append(circular)
+        with self.assertRaises(ValueError):
+            dumps(circular)
+        # The same list twice is not circular
+        shared = [1]
+        self.assertEqual(dumps([shared, shared]), "[[1],[1]]")
+
+    def test_deep_nesting(self):
+        value = []
+        for _ in range(100000):
+            value = [value]
+        self.assertEqual(dumps(value), "[" * 100001 + "]" * 100001)
+
+    def test_dump_in_chunks(self):
+        records = [{"id": i, "name": "é" * (i % 5)} for i in range(1000)]
+        text = io.StringIO()
+        dump(records, text, chunk_size=100)
+        self.assertEqual(json.loads(text.getvalue()), records)
+        binary = io.BytesIO()
+        dump(records, binary, indent=1, chunk_size=100, encoding="utf-8")
+        self.assertEqual(json.loads(binary.getvalue().decode("utf-8")), records)
+        # Any object with a write method gets text, as from json.dump
+        chunks = []
+        sink = type("Sink", (), {"write": lambda self, chunk: chunks.append(chunk)})()
+        dump(records, sink, chunk_size=100)
+        self.assertTrue(all(isinstance(chunk, str) for chunk in chunks))
+        self.assertEqual(json.loads("".join(chunks)), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import io
+import json
+import unittest
+
+from jsonParser import JSONParseError
+from streaming import basic_parse, items, parse
+
+DOCUMENT = '{"records": [{"name": "a\\u00e9", "n": 1.5}, {"name": "b", "n": -20, "tags": [true, null]}], "total": 2}'
+
+
+class TestStreaming(unittest.TestCase):
+    def test_events(self):
+        events = list(basic_parse(io.StringIO('{"a": [1, "x", false, null, {}]}')))
+        self.assertEqual(events, [
+            ("start_map", None), ("map_key", "a"), ("start_array", None), ("number", 1), ("string", "x"),
+            ("boolean", False), ("null", None), ("start_map", None), ("end_map", None), ("end_array", None),
+            ("end_map", None),
+        ])
+
+    def test_prefixes(self):
+        prefixes = {(prefix, event) for prefix, event, _ in parse(io.StringIO(DOCUMENT))}
+        self.assertIn(("records.item.name", "string"), prefixes)
+        self.assertIn(("records.item.tags.item", "boolean"), prefixes)
+        self.assertIn(("total", "number"), prefixes)
+
+    def test_items_across_small_reads(self):
+        expected = json.loads(DOCUMENT)["records"]
+        # Every token, and the é in UTF-8, gets cut by a read at some size
+        for buffer_size in (1, 2, 3, 5, 7, 64):
+            with self.subTest(buffer_size=buffer_size):
+                records = list(items(io.BytesIO(DOCUMENT.encode("utf-8")), "records.item", buffer_size))
+                self.assertEqual(records, expected)
+        self.assertEqual(list(items(io.StringIO(DOCUMENT), "total")), [2])
+
+    def test_top_level_array(self):
+        text = json.dumps([{"id": i} for i in range(1000)])
+        self.assertEqual([record["id"] for record in items(io.StringIO(text), "item", 100)], list(range(1000)))
+
+    def test_errors(self):
+        for text in ('{"a": 1,}', "[1 2]", '{"a" 1}', "[tru]", "[1", '"abc', "[1] [2]"):
+            with self.subTest(text=text):
+                with self.assertRaises(JSONParseError):
+                    list(basic_parse(io.StringIO(text), 2))
+
+    def test_error_position_counts_earlier_reads(self):
+        with self.assertRaises(JSONParseError) as caught:
+            list(basic_parse(io.StringIO('[1,\n 2,\n x]'), 2))
+        self.assertEqual((caught.exception.line, caught.exception.column), (3, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+
+from jsonParser import JSONParseError
+from tape import Tape, TapeArray, TapeObject, loads_tape
+
+DOCUMENT = """
+{"name": "tape", "escaped": "a\\"b\\u00e9", "count": -42, "big": 123456789012345678901234567890,
+ "ratio": 0.5, "flags": [true, false, null], "empty": {}, "none": [],
+ "records": [{"id": 1, "tags": ["x"]}, {"id": 2, "tags": []}]}
+"""
+
+
+class TestTape(unittest.TestCase):
+    def test_to_python(self):
+        self.assertEqual(Tape(DOCUMENT).to_python(), json.loads(DOCUMENT))
+        for scalar in ("1", '"s"', "null", "2.5e3"):
+            self.assertEqual(Tape(scalar).to_python(), json.loads(scalar))
+
+    def test_views(self):
+        root = loads_tape(DOCUMENT)
+        self.assertIsInstance(root, TapeObject)
+        self.assertEqual(root["escaped"], 'a"bé')
+        self.assertEqual(root["big"], 123456789012345678901234567890)
+        self.assertEqual(root["count"], -42)
+        self.assertEqual(root["records"][1]["id"], 2)
+        self.assertEqual(root.get("missing", 7), 7)
+        self.assertIn("ratio", root)
+        self.assertEqual(root.keys(), list(json.loads(DOCUMENT)))
+        self.assertEqual(len(root["empty"]), 0)
+        with self.assertRaises(KeyError):
+            root["missing"]
+
+    def test_keys_with_quotes(self):
+        root = Tape('{"a":1,"b":2,"q\\"x":3}').root()
+        self.assertNotIn('a":1,"b', root)
+        self.assertNotIn('a"', root)
+        self.assertEqual(root['q"x'], 3)
+
+    def test_array_indexing(self):
+        values = list(range(1000)) + [[1, 2], {"a": 3}, "last"]
+        array = loads_tape(json.dumps(values))
+        self.assertIsInstance(array, TapeArray)
+        self.assertEqual(len(array), len(values))
+        self.assertEqual([array[i] for i in range(1000)], values[:1000])
+        self.assertEqual(array[-1], "last")
+        self.assertEqual(array[-2]["a"], 3)
+        self.assertEqual(list(array[1000]), [1, 2])
+        self.assertEqual(array[-len(values)], 0)
+        for position in (len(values), -len(values) - 1):
+            with self.assertRaises(IndexError):
+                array[position]
+
+    def test_item_indexes_are_kept(self):
+        tape = Tape("[[1, 2, 3], [4]]")
+        inner = tape.root()[0]
+        self.assertIs(tape.item_indexes(inner.index), tape.item_indexes(tape.root()[0].index))
+        self.assertEqual(list(tape.root()[1]), [4])
+
+    def test_invalid(self):
+        for text in ("[1, 2", '{"a" 1}', "[1] 2", ""):
+            with self.assertRaises(JSONParseError):
+                Tape(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
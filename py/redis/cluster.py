@@ -0,0 +1,407 @@
+"""
+Multi-process deployment. The 16384 hash slots of Redis Cluster are split
+evenly over N worker processes. Every worker listens on the public port with
+SO_REUSEPORT, so the kernel spreads client connections over all of them, and
+on a private peer port (public port + PEER_PORT_OFFSET + worker index).
+
+A worker runs commands whose keys it owns itself and forwards the rest to
+the owning worker over a pipelined peer link, then writes the replies back
+in request order. Multi-key commands work as long as all keys live on the
+same worker. Pub/Sub is not routed: messages reach the subscribers connected
+to the worker that ran PUBLISH.
+
+    python -m redis.cluster serve --workers 16
+    python -m redis.cluster benchmark --max-workers 16 [--direct]
+
+The benchmark prints requests per second for 1, 2, 4 ... workers. By default
+clients go through the shared port and most requests are forwarded once;
+--direct measures the shards alone, as a cluster aware client would see them.
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import socket
+import time
+from collections import deque
+
+from .commands import CommandError, command, command_keys
+from .keyspace import Keyspace
+from .main import Parser, RespError, RespProtocolException, Serializer, serialize
+from .pubsub import MultiReply, PubSub
+from .server import BACKLOG, DEFAULT_HOST, DEFAULT_PORT, RedisProtocol, cron
+
+HASH_SLOTS = 16384
+PEER_PORT_OFFSET = 10000
+CROSS_SHARD = "CROSSSLOT Keys in request don't hash to the same slot"
+
+
+def _crc16_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data: bytes) -> int:
+    """CRC16-CCITT (XMODEM), the checksum used for Redis Cluster slots."""
+    crc = 0
+    table = _CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def key_hash_slot(key: bytes) -> int:
+    # Only the part inside the first non-empty {...} is hashed, so related
+    # keys such as user:{42}:name and user:{42}:email share a slot
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key) % HASH_SLOTS
+
+
+def slot_owners(workers: int) -> bytes:
+    """The worker index owning each slot, as contiguous equal ranges."""
+    return bytes(slot * workers // HASH_SLOTS for slot in range(HASH_SLOTS))
+
+
+@command("CLUSTER", -2)
+def cluster(keyspace, args):
+    if args[0].upper() == b"KEYSLOT" and len(args) == 2:
+        return key_hash_slot(args[1])
+    raise CommandError("ERR Unknown subcommand or wrong number of arguments")
+
+
+class PeerLink(asyncio.Protocol):
+    """A pipelined connection to another worker. Requests are batched into
+    one write per event loop iteration and replies are matched up in order."""
+
+    def __init__(self):
+        self.parser = Parser()
+        self.serializer = Serializer()
+        self.waiters = deque()
+        self.transport = None
+        self.closed = False
+        self._flush_scheduled = False
+
+    def send(self, request: list) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        if self.closed:
+            waiter.set_result(RespError("ERR shard unavailable"))
+            return waiter
+        self.waiters.append(waiter)
+        self.serializer.write(request)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self.flush)
+        return waiter
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        if self.transport is None:
+            return
+        chunks = self.serializer.take()
+        if chunks:
+            self.transport.writelines(chunks)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.flush()
+
+    def data_received(self, data):
+        for reply in self.parser.feed(data):
+            self.waiters.popleft().set_result(reply)
+
+    def connection_lost(self, exc):
+        self.fail()
+
+    def connect_done(self, connecting: asyncio.Task) -> None:
+        """Fail the queued requests if connecting was cancelled or failed."""
+        if connecting.cancelled() or connecting.exception() is not None:
+            self.fail()
+
+    def fail(self) -> None:
+        self.closed = True
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(RespError("ERR shard unavailable"))
+
+
+class Router:
+
+    def __init__(self, worker: int, workers: int, host: str, port: int):
+        self.worker = worker
+        self.owners = slot_owners(workers)
+        self.host = host
+        self.port = port
+        self.links: dict[int, PeerLink] = {}
+
+    def owner(self, request) -> int | None:
+        """The worker that must run a request, or None if any worker can."""
+        if not isinstance(request, list) or not request or not isinstance(request[0], bytes):
+            return None
+        owners = {self.owners[key_hash_slot(key)] for key in command_keys(request)}
+        if len(owners) > 1:
+            raise CommandError(CROSS_SHARD)
+        return owners.pop() if owners else None
+
+    def forward(self, worker: int, request: list) -> asyncio.Future:
+        link = self.links.get(worker)
+        if link is None or link.closed:
+            link = self.links[worker] = PeerLink()
+            loop = asyncio.get_running_loop()
+            connecting = loop.create_task(loop.create_connection(
+                lambda: link, self.host, self.port + PEER_PORT_OFFSET + worker
+            ))
+            connecting.add_done_callback(link.connect_done)
+        return link.send(request)
+
+
+class ShardProtocol(RedisProtocol):
+    """A client connection on the public port. Replies from other workers
+    arrive later than local ones, so a batch that forwards anything is
+    written out by a task, after any batch still waiting before it."""
+
+    def __init__(self, keyspace: Keyspace, router: Router):
+        super().__init__(keyspace)
+        self.router = router
+        self.pending = None
+
+    def data_received(self, data):
+        if self.quitting:
+            return
+        try:
+            requests = self.parser.feed(data)
+        except RespProtocolException as err:
+            self.transport.write(serialize(RespError(f"ERR Protocol error: {err}")))
+            self.transport.close()
+            return
+        keyspace = self.keyspace
+        router = self.router
+        replies = []
+        forwarded = False
+        for request in requests:
+            if not request:
+                continue
+            try:
+                worker = router.owner(request)
+            except CommandError as err:
+                replies.append(RespError(str(err)))
+                continue
+            if worker is None or worker == router.worker:
+                reply = self.execute(request)
+                if type(reply) is MultiReply:
+                    replies.extend(reply)
+                else:
+                    replies.append(reply)
+                if self.quitting:
+                    break
+            else:
+                replies.append(router.forward(worker, request))
+                forwarded = True
+        if keyspace.persistence is not None:
+            keyspace.persistence.flush_before_reply()
+
+        if not forwarded and self.pending is None:
+            for reply in replies:
+                self.serializer.write(reply)
+            self.flush()
+            if self.quitting:
+                self.transport.close()
+        else:
+            self.pending = asyncio.get_running_loop().create_task(self.write_in_order(self.pending, replies))
+
+    async def write_in_order(self, previous, replies):
+        if previous is not None:
+            await previous
+        for reply in replies:
+            if isinstance(reply, asyncio.Future):
+                reply = await reply
+            self.serializer.write(reply)
+        if not self.transport.is_closing():
+            self.flush()
+        if self.pending is asyncio.current_task():
+            self.pending = None
+            if self.quitting:
+                self.transport.close()
+
+
+async def serve_worker(worker: int, workers: int, host: str, port: int):
+    keyspace = Keyspace()
+    keyspace.pubsub = PubSub()
+    router = Router(worker, workers, host, port)
+    loop = asyncio.get_running_loop()
+    public = await loop.create_server(
+        lambda: ShardProtocol(keyspace, router),
+        host=host,
+        port=port,
+        backlog=BACKLOG,
+        reuse_port=True
+    )
+    peer = await loop.create_server(
+        lambda: RedisProtocol(keyspace),
+        host=host,
+        port=port + PEER_PORT_OFFSET + worker,
+        backlog=BACKLOG,
+        reuse_address=True
+    )
+    cron_task = asyncio.create_task(cron(keyspace))
+    try:
+        async with public, peer:
+            await asyncio.gather(public.serve_forever(), peer.serve_forever())
+    finally:
+        cron_task.cancel()
+
+
+def run_worker(worker: int, workers: int, host: str, port: int) -> None:
+    try:
+        asyncio.run(serve_worker(worker, workers, host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(workers: int, host: str, port: int) -> list[multiprocessing.Process]:
+    processes = []
+    for worker in range(workers):
+        process = multiprocessing.Process(target=run_worker, args=(worker, workers, host, port), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes: list[multiprocessing.Process]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def wait_until_ready(host: str, port: int, workers: int, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    ports = [port] + [port + PEER_PORT_OFFSET + worker for worker in range(workers)]
+    for target in ports:
+        while True:
+            try:
+                socket.create_connection((host, target), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Worker on port {target} did not start")
+                time.sleep(0.05)
+
+
+def _encode(*args: bytes) -> bytes:
+    return serialize(list(args))
+
+
+def benchmark_client(host: str, port: int, client: int, duration: float, pipeline: int,
+                     workers: int, direct: bool) -> int:
+    """
+    Send pipelined SETs over one connection for `duration` seconds and
+    return the number of completed requests. With `direct` the client acts
+    like a cluster aware client: it only uses keys owned by one worker and
+    talks to that worker's own port, so nothing is forwarded.
+    """
+    keys = (b"key:%d:%d" % (client, i) for i in itertools.count())
+    if direct:
+        worker = client % workers
+        owners = slot_owners(workers)
+        keys = (key for key in keys if owners[key_hash_slot(key)] == worker)
+        port += PEER_PORT_OFFSET + worker
+    batches = [b"".join(_encode(b"SET", next(keys), b"value") for _ in range(pipeline)) for _ in range(64)]
+    expected = len(b"+OK\r\n") * pipeline
+    completed = 0
+    with socket.create_connection((host, port)) as sock:
+        deadline = time.monotonic() + duration
+        batch = 0
+        while time.monotonic() < deadline:
+            sock.sendall(batches[batch % len(batches)])
+            received = 0
+            while received < expected:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return completed
+                received += len(chunk)
+            completed += pipeline
+            batch += 1
+    return completed
+
+
+def benchmark(max_workers: int, clients: int, duration: float, pipeline: int, host: str, port: int,
+              direct: bool) -> None:
+    counts = []
+    workers = 1
+    while workers <= max_workers:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    print(f"{'workers':>8} {'requests/s':>12} {'speedup':>8}")
+    baseline = None
+    for workers in counts:
+        processes = start_workers(workers, host, port)
+        try:
+            wait_until_ready(host, port, workers)
+            with multiprocessing.Pool(clients) as pool:
+                started = time.perf_counter()
+                completed = sum(pool.starmap(
+                    benchmark_client,
+                    [(host, port, client, duration, pipeline, workers, direct) for client in range(clients)]
+                ))
+                elapsed = time.perf_counter() - started
+        finally:
+            stop_workers(processes)
+        throughput = completed / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>12,.0f} {throughput / baseline:>7.2f}x")
+
+
+def parse_commandline_arguments():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    serve = subparsers.add_parser("serve", help="run a sharded server")
+    serve.add_argument("--workers", type=int, default=os.cpu_count())
+    serve.add_argument("--host", default=DEFAULT_HOST)
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    bench = subparsers.add_parser("benchmark", help="measure throughput for 1, 2, 4 ... workers")
+    bench.add_argument("--max-workers", type=int, default=os.cpu_count())
+    bench.add_argument("--clients", type=int, default=2 * os.cpu_count())
+    bench.add_argument("--duration", type=float, default=5)
+    bench.add_argument("--pipeline", type=int, default=32)
+    bench.add_argument("--host", default=DEFAULT_HOST)
+    bench.add_argument("--port", type=int, default=7379)
+    bench.add_argument("--direct", action="store_true", help="send each key straight to its owner's port")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_commandline_arguments()
+    if args.mode == "benchmark":
+        benchmark(args.max_workers, args.clients, args.duration, args.pipeline, args.host, args.port, args.direct)
+        return
+    processes = start_workers(args.workers, args.host, args.port)
+    print(f"Started {args.workers} workers on {args.host}:{args.port}")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
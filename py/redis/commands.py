@@ -0,0 +1,504 @@
+import fnmatch
+from itertools import islice
+from typing import Callable, NamedTuple
+
+from . import encodings
+from .encodings import ENCODING_LIMITS, HASH_TYPES, LIST_TYPES, MAX_LISTPACK_VALUE, SET_TYPES
+from .keyspace import Keyspace, now_ms, parse_memory, sizeof_entry
+from .main import RespError
+
+WRONG_TYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+NOT_AN_INTEGER = "ERR value is not an integer or out of range"
+SYNTAX_ERROR = "ERR syntax error"
+OUT_OF_MEMORY = "OOM command not allowed when used memory > 'maxmemory'."
+
+COMMANDS = {}
+
+
+class CommandError(Exception):
+    pass
+
+
+class Command(NamedTuple):
+    handler: Callable
+    arity: int
+    flags: frozenset
+    keys: tuple
+
+
+def command(name: str, arity: int, flags: tuple = (), keys: tuple = (0, 0, 0)):
+    """
+    Register a command handler. Like redis-server, a positive arity is the
+    exact number of arguments including the command name and a negative
+    arity is the minimum. Flags follow redis-server too: "write" commands
+    modify the keyspace and "denyoom" ones may grow it, so they first make
+    room under maxmemory. `keys` is the (first, last, step) position of the
+    key arguments, with a negative last counting from the end.
+    """
+    def register(handler):
+        COMMANDS[name.encode()] = Command(handler, arity, frozenset(flags), keys)
+        return handler
+    return register
+
+
+def command_keys(request: list) -> list:
+    entry = COMMANDS.get(request[0].upper())
+    if entry is None:
+        return []
+    first, last, step = entry.keys
+    if not first:
+        return []
+    if last < 0:
+        last += len(request)
+    return request[first:last + 1:step]
+
+
+def execute(keyspace: Keyspace, request):
+    if not isinstance(request, list) or not request or not isinstance(request[0], bytes):
+        return RespError("ERR Protocol error: expected an array of bulk strings")
+    name = request[0].upper()
+    entry = COMMANDS.get(name)
+    if entry is None:
+        return RespError(f"ERR unknown command '{request[0].decode(errors='replace')}'")
+    handler, arity, flags, _ = entry
+    if (arity > 0 and len(request) != arity) or len(request) < -arity:
+        return RespError(f"ERR wrong number of arguments for '{name.decode().lower()}' command")
+    if "denyoom" in flags and keyspace.maxmemory and not keyspace.free_memory():
+        return RespError(OUT_OF_MEMORY)
+    changed_keys = keyspace.changed_keys = []
+    try:
+        reply = handler(keyspace, request[1:])
+    except CommandError as err:
+        return RespError(str(err))
+    if "write" in flags and keyspace.propagate is not None and reply is not None:
+        propagated = propagated_form(keyspace, name, request, reply)
+        if propagated is not None:
+            keyspace.propagate(propagated)
+    if changed_keys and keyspace.pubsub is not None and keyspace.pubsub.notify_flags:
+        keyspace.pubsub.notify_command(name, changed_keys)
+    return reply
+
+
+def propagated_form(keyspace: Keyspace, name: bytes, request: list, reply) -> list | None:
+    """
+    The command to log for a successful write. Relative expiry times are
+    turned into absolute ones so that replaying the log later restores the
+    same deadlines.
+    """
+    if name in (b"EXPIRE", b"PEXPIRE", b"EXPIREAT", b"PEXPIREAT"):
+        if not reply:
+            return None
+        key = request[1]
+        when = keyspace.expires.get(key)
+        # Without a deadline the key was expired on the spot, which
+        # propagated its DEL already
+        return None if when is None else [b"PEXPIREAT", key, b"%d" % when]
+    if name == b"SET" and len(request) > 3:
+        key = request[1]
+        if key not in keyspace.data:
+            # Set with a deadline already past, and expired like the above
+            return None
+        when = keyspace.expires.get(key)
+        propagated = [b"SET", key, request[2]]
+        return propagated if when is None else propagated + [b"PXAT", b"%d" % when]
+    return request
+
+
+def to_int(value: bytes) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise CommandError(NOT_AN_INTEGER)
+
+
+def get_string(keyspace: Keyspace, key: bytes) -> bytes | None:
+    value = keyspace.get(key)
+    if value is not None and not isinstance(value, bytes):
+        raise CommandError(WRONG_TYPE)
+    return value
+
+
+def get_typed(keyspace: Keyspace, key: bytes, types: tuple):
+    value = keyspace.get(key)
+    if value is not None and not isinstance(value, types):
+        raise CommandError(WRONG_TYPE)
+    return value
+
+
+def get_list(keyspace: Keyspace, key: bytes):
+    return get_typed(keyspace, key, LIST_TYPES)
+
+
+def get_hash(keyspace: Keyspace, key: bytes):
+    return get_typed(keyspace, key, HASH_TYPES)
+
+
+def get_set(keyspace: Keyspace, key: bytes):
+    return get_typed(keyspace, key, SET_TYPES)
+
+
+def changed(keyspace: Keyspace, key: bytes) -> None:
+    """Record that the running command changed `key`, which gets it the
+    command's keyspace event. Write commands call this only for keys they
+    actually modified, so e.g. a DEL of a missing key sends no event."""
+    keyspace.changed_keys.append(key)
+
+
+def store(keyspace: Keyspace, key: bytes, old_value, value, delta: int) -> None:
+    """Record the result of one of the encodings helpers."""
+    if value is old_value:
+        keyspace.account(delta)
+    else:
+        keyspace.set(key, value, keep_ttl=True)
+
+
+@command("PING", -1)
+def ping(keyspace, args):
+    if len(args) > 1:
+        raise CommandError("ERR wrong number of arguments for 'ping' command")
+    return args[0] if args else "PONG"
+
+
+@command("ECHO", 2)
+def echo(keyspace, args):
+    return args[0]
+
+
+@command("GET", 2, keys=(1, 1, 1))
+def get(keyspace, args):
+    return get_string(keyspace, args[0])
+
+
+@command("MGET", -2, keys=(1, -1, 1))
+def mget(keyspace, args):
+    values = []
+    for key in args:
+        value = keyspace.get(key)
+        values.append(value if isinstance(value, bytes) else None)
+    return values
+
+
+@command("SET", -3, flags=("write", "denyoom"), keys=(1, 1, 1))
+def set_(keyspace, args):
+    key, value, *options = args
+    when = None
+    keep_ttl = only_if_missing = only_if_exists = False
+    options = iter(options)
+    for option in options:
+        option = option.upper()
+        if option in (b"EX", b"PX", b"EXAT", b"PXAT") and when is None and not keep_ttl:
+            amount = to_int(next(options, b""))
+            if amount <= 0:
+                raise CommandError("ERR invalid expire time in 'set' command")
+            when = {
+                b"EX": now_ms() + amount * 1000,
+                b"PX": now_ms() + amount,
+                b"EXAT": amount * 1000,
+                b"PXAT": amount,
+            }[option]
+        elif option == b"KEEPTTL" and when is None:
+            keep_ttl = True
+        elif option == b"NX" and not only_if_exists:
+            only_if_missing = True
+        elif option == b"XX" and not only_if_missing:
+            only_if_exists = True
+        else:
+            raise CommandError(SYNTAX_ERROR)
+
+    if only_if_missing or only_if_exists:
+        found = keyspace.get(key) is not None
+        if found == only_if_missing:
+            return None
+    keyspace.set(key, value, keep_ttl=keep_ttl)
+    changed(keyspace, key)
+    if when is not None:
+        keyspace.expire_at(key, when)
+    return "OK"
+
+
+@command("DEL", -2, flags=("write",), keys=(1, -1, 1))
+def delete(keyspace, args):
+    removed = 0
+    for key in args:
+        if keyspace.delete(key):
+            changed(keyspace, key)
+            removed += 1
+    return removed
+
+
+@command("EXISTS", -2, keys=(1, -1, 1))
+def exists(keyspace, args):
+    return sum(keyspace.get(key) is not None for key in args)
+
+
+def increment_by(keyspace, key: bytes, increment: int) -> int:
+    value = get_string(keyspace, key)
+    number = 0 if value is None else to_int(value)
+    number += increment
+    keyspace.set(key, b"%d" % number, keep_ttl=True)
+    changed(keyspace, key)
+    return number
+
+
+@command("INCR", 2, flags=("write", "denyoom"), keys=(1, 1, 1))
+def incr(keyspace, args):
+    return increment_by(keyspace, args[0], 1)
+
+
+@command("DECR", 2, flags=("write", "denyoom"), keys=(1, 1, 1))
+def decr(keyspace, args):
+    return increment_by(keyspace, args[0], -1)
+
+
+def push(keyspace, args, left: bool) -> int:
+    key, *values = args
+    items = get_list(keyspace, key)
+    new_items, length, delta = encodings.list_push(items, values, left)
+    store(keyspace, key, items, new_items, delta)
+    changed(keyspace, key)
+    return length
+
+
+@command("LPUSH", -3, flags=("write", "denyoom"), keys=(1, 1, 1))
+def lpush(keyspace, args):
+    return push(keyspace, args, left=True)
+
+
+@command("RPUSH", -3, flags=("write", "denyoom"), keys=(1, 1, 1))
+def rpush(keyspace, args):
+    return push(keyspace, args, left=False)
+
+
+@command("LRANGE", 4, keys=(1, 1, 1))
+def lrange(keyspace, args):
+    items = get_list(keyspace, args[0])
+    if items is None:
+        return []
+    start, stop = to_int(args[1]), to_int(args[2])
+    length = encodings.list_length(items)
+    if start < 0:
+        start = max(start + length, 0)
+    if stop < 0:
+        stop += length
+    stop = min(stop, length - 1)
+    if start > stop:
+        return []
+    return list(islice(encodings.list_iter(items), start, stop + 1))
+
+
+@command("LLEN", 2, keys=(1, 1, 1))
+def llen(keyspace, args):
+    items = get_list(keyspace, args[0])
+    return 0 if items is None else encodings.list_length(items)
+
+
+@command("HSET", -4, flags=("write", "denyoom"), keys=(1, 1, 1))
+def hset(keyspace, args):
+    key, *pairs = args
+    if len(pairs) % 2:
+        raise CommandError("ERR wrong number of arguments for 'hset' command")
+    fields = get_hash(keyspace, key)
+    new_fields, added, delta = encodings.hash_set(fields, pairs)
+    store(keyspace, key, fields, new_fields, delta)
+    # Overwritten fields are changes too, though not counted in the reply
+    changed(keyspace, key)
+    return added
+
+
+@command("HGET", 3, keys=(1, 1, 1))
+def hget(keyspace, args):
+    fields = get_hash(keyspace, args[0])
+    return None if fields is None else encodings.hash_get(fields, args[1])
+
+
+@command("HDEL", -3, flags=("write",), keys=(1, 1, 1))
+def hdel(keyspace, args):
+    key, *names = args
+    fields = get_hash(keyspace, key)
+    if fields is None:
+        return 0
+    removed, delta = encodings.hash_delete(fields, names)
+    keyspace.account(delta)
+    if removed:
+        changed(keyspace, key)
+    if not encodings.hash_length(fields):
+        keyspace.delete(key)
+    return removed
+
+
+@command("HGETALL", 2, keys=(1, 1, 1))
+def hgetall(keyspace, args):
+    fields = get_hash(keyspace, args[0])
+    return [] if fields is None else encodings.hash_items(fields)
+
+
+@command("HLEN", 2, keys=(1, 1, 1))
+def hlen(keyspace, args):
+    fields = get_hash(keyspace, args[0])
+    return 0 if fields is None else encodings.hash_length(fields)
+
+
+@command("SADD", -3, flags=("write", "denyoom"), keys=(1, 1, 1))
+def sadd(keyspace, args):
+    key, *members = args
+    current = get_set(keyspace, key)
+    new_members, added, delta = encodings.set_add(current, members)
+    store(keyspace, key, current, new_members, delta)
+    if added:
+        changed(keyspace, key)
+    return added
+
+
+@command("SREM", -3, flags=("write",), keys=(1, 1, 1))
+def srem(keyspace, args):
+    key, *members = args
+    current = get_set(keyspace, key)
+    if current is None:
+        return 0
+    removed, delta = encodings.set_remove(current, members)
+    keyspace.account(delta)
+    if removed:
+        changed(keyspace, key)
+    if not encodings.set_length(current):
+        keyspace.delete(key)
+    return removed
+
+
+@command("SISMEMBER", 3, keys=(1, 1, 1))
+def sismember(keyspace, args):
+    current = get_set(keyspace, args[0])
+    return int(current is not None and encodings.set_contains(current, args[1]))
+
+
+@command("SMEMBERS", 2, keys=(1, 1, 1))
+def smembers(keyspace, args):
+    current = get_set(keyspace, args[0])
+    return [] if current is None else encodings.set_members(current)
+
+
+@command("SCARD", 2, keys=(1, 1, 1))
+def scard(keyspace, args):
+    current = get_set(keyspace, args[0])
+    return 0 if current is None else encodings.set_length(current)
+
+
+@command("OBJECT", 3, keys=(2, 2, 1))
+def object_(keyspace, args):
+    if args[0].upper() != b"ENCODING":
+        raise CommandError("ERR Unknown subcommand or wrong number of arguments")
+    value = keyspace.get(args[1])
+    return None if value is None else encodings.encoding_of(value)
+
+
+@command("MEMORY", 3, keys=(2, 2, 1))
+def memory(keyspace, args):
+    if args[0].upper() != b"USAGE":
+        raise CommandError("ERR Unknown subcommand or wrong number of arguments")
+    value = keyspace.get(args[1])
+    return None if value is None else sizeof_entry(args[1], value)
+
+
+def expire_key_at(keyspace, key: bytes, when: int) -> int:
+    if not keyspace.expire_at(key, when):
+        return 0
+    changed(keyspace, key)
+    return 1
+
+
+@command("EXPIRE", 3, flags=("write",), keys=(1, 1, 1))
+def expire(keyspace, args):
+    key, seconds = args
+    return expire_key_at(keyspace, key, now_ms() + to_int(seconds) * 1000)
+
+
+@command("PEXPIRE", 3, flags=("write",), keys=(1, 1, 1))
+def pexpire(keyspace, args):
+    key, milliseconds = args
+    return expire_key_at(keyspace, key, now_ms() + to_int(milliseconds))
+
+
+@command("EXPIREAT", 3, flags=("write",), keys=(1, 1, 1))
+def expireat(keyspace, args):
+    key, timestamp = args
+    return expire_key_at(keyspace, key, to_int(timestamp) * 1000)
+
+
+@command("PEXPIREAT", 3, flags=("write",), keys=(1, 1, 1))
+def pexpireat(keyspace, args):
+    key, timestamp = args
+    return expire_key_at(keyspace, key, to_int(timestamp))
+
+
+@command("TTL", 2, keys=(1, 1, 1))
+def ttl(keyspace, args):
+    remaining = keyspace.ttl_ms(args[0])
+    if remaining is None:
+        return -2
+    if remaining == -1:
+        return -1
+    return (remaining + 500) // 1000
+
+
+@command("PTTL", 2, keys=(1, 1, 1))
+def pttl(keyspace, args):
+    remaining = keyspace.ttl_ms(args[0])
+    return -2 if remaining is None else remaining
+
+
+@command("PERSIST", 2, flags=("write",), keys=(1, 1, 1))
+def persist(keyspace, args):
+    if not keyspace.persist(args[0]):
+        return 0
+    changed(keyspace, args[0])
+    return 1
+
+
+def _set_encoding_limit(name: str):
+    def setter(keyspace, value: str) -> None:
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value}")
+        if limit < 0 or (name.endswith("-value") and limit > MAX_LISTPACK_VALUE):
+            raise ValueError(f"Invalid {name}: {value}")
+        ENCODING_LIMITS[name] = limit
+    return setter
+
+
+CONFIG_PARAMETERS = {
+    "maxmemory": (
+        lambda keyspace: str(keyspace.maxmemory),
+        lambda keyspace, value: setattr(keyspace, "maxmemory", parse_memory(value)),
+    ),
+    "maxmemory-policy": (
+        lambda keyspace: keyspace.maxmemory_policy,
+        lambda keyspace, value: keyspace.set_policy(value.lower()),
+    ),
+    **{
+        name: (lambda keyspace, name=name: str(ENCODING_LIMITS[name]), _set_encoding_limit(name))
+        for name in ENCODING_LIMITS
+    },
+}
+
+
+@command("CONFIG", -2)
+def config(keyspace, args):
+    subcommand = args[0].upper()
+    if subcommand == b"GET" and len(args) == 2:
+        pattern = args[1].decode().lower()
+        reply = []
+        for name, (getter, _) in CONFIG_PARAMETERS.items():
+            if fnmatch.fnmatchcase(name, pattern):
+                reply += [name.encode(), getter(keyspace).encode()]
+        return reply
+    if subcommand == b"SET" and len(args) == 3:
+        name = args[1].decode().lower()
+        if name not in CONFIG_PARAMETERS:
+            raise CommandError(f"ERR Unknown option or number of arguments for CONFIG SET - '{name}'")
+        _, setter = CONFIG_PARAMETERS[name]
+        try:
+            setter(keyspace, args[2].decode())
+        except ValueError as err:
+            raise CommandError(f"ERR CONFIG SET failed - {err}")
+        return "OK"
+    raise CommandError(SYNTAX_ERROR)
@@ -0,0 +1,360 @@
+"""
+Value encodings for collections, after redis-server's listpack and intset.
+
+Small lists, hashes and sets are kept packed in a single bytearray, each
+entry being a one byte length followed by its bytes (hash fields and values
+alternate). Sets of integers are kept in a sorted `array` of the narrowest
+type code that holds them. Once a collection grows past the limits in
+ENCODING_LIMITS it is converted for good to a deque, dict or set.
+
+The mutating helpers below take the current value (None for a new key) and
+return the value to store. That is the same object when it was changed in
+place, in which case the returned size delta is to be passed to
+`Keyspace.account()`, or a new object that has to be stored with
+`Keyspace.set()`.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+ENCODING_LIMITS = {
+    "list-max-listpack-entries": 128,
+    "list-max-listpack-value": 64,
+    "hash-max-listpack-entries": 128,
+    "hash-max-listpack-value": 64,
+    "set-max-intset-entries": 512,
+    "set-max-listpack-entries": 128,
+    "set-max-listpack-value": 64,
+}
+# Entry lengths are stored in a single byte
+MAX_LISTPACK_VALUE = 255
+
+POINTER_SIZE = 8
+LIST_OVERHEAD = sys.getsizeof(deque())
+HASH_OVERHEAD = sys.getsizeof({})
+SET_OVERHEAD = sys.getsizeof(set())
+# Rough cost of a hash table slot: the hash and the references it holds
+SLOT_SIZE = 24
+
+_INT_TYPECODES = (("h", 1 << 15), ("i", 1 << 31), ("q", 1 << 63))
+
+
+class ListPack(bytearray):
+    __slots__ = ()
+
+    def spans(self):
+        """(start, end) offsets of each entry's bytes."""
+        position, end = 0, len(self)
+        while position < end:
+            start = position + 1
+            position = start + self[position]
+            yield start, position
+
+    def entries(self):
+        for start, end in self.spans():
+            yield bytes(self[start:end])
+
+    def entry_count(self) -> int:
+        return sum(1 for _ in self.spans())
+
+    def append_entry(self, item: bytes) -> None:
+        self.append(len(item))
+        self.extend(item)
+
+    def prepend_entry(self, item: bytes) -> None:
+        self[0:0] = bytes([len(item)]) + item
+
+    def find(self, item: bytes, step: int = 1):
+        """Span of the first entry equal to `item`, looking at every
+        `step`th entry only."""
+        for index, (start, end) in enumerate(self.spans()):
+            if index % step == 0 and self[start:end] == item:
+                return start, end
+        return None
+
+
+class PackedList(ListPack):
+    __slots__ = ()
+
+
+class PackedHash(ListPack):
+    __slots__ = ()
+
+
+class PackedSet(ListPack):
+    __slots__ = ()
+
+
+class IntSet(array):
+    __slots__ = ()
+
+
+LIST_TYPES = (deque, PackedList)
+HASH_TYPES = (dict, PackedHash)
+SET_TYPES = (set, PackedSet, IntSet)
+
+
+def sizeof_element(element: bytes) -> int:
+    return sys.getsizeof(element) + POINTER_SIZE
+
+
+def sizeof_member(member: bytes) -> int:
+    return sys.getsizeof(member) + SLOT_SIZE
+
+
+def sizeof_pair(field: bytes, value: bytes) -> int:
+    return sys.getsizeof(field) + sys.getsizeof(value) + SLOT_SIZE
+
+
+def sizeof_value(value) -> int:
+    # Full collections are sized as a sum over their elements, so commands
+    # can adjust the total by what they add or remove without walking them
+    if isinstance(value, deque):
+        return LIST_OVERHEAD + sum(map(sizeof_element, value))
+    if isinstance(value, dict):
+        return HASH_OVERHEAD + sum(sizeof_pair(field, item) for field, item in value.items())
+    if isinstance(value, set):
+        return SET_OVERHEAD + sum(map(sizeof_member, value))
+    return sys.getsizeof(value)
+
+
+def _as_int(member: bytes) -> int | None:
+    """The member as an int if it is the canonical form of a 64 bit one."""
+    if len(member) > 20:
+        return None
+    try:
+        number = int(member)
+    except ValueError:
+        return None
+    if b"%d" % number != member or not -(1 << 63) <= number < (1 << 63):
+        return None
+    return number
+
+
+def _fits(items, count: int, entries_limit: str, value_limit: str) -> bool:
+    max_length = min(ENCODING_LIMITS[value_limit], MAX_LISTPACK_VALUE)
+    return count <= ENCODING_LIMITS[entries_limit] and all(len(item) <= max_length for item in items)
+
+
+def encoding_of(value) -> str:
+    if isinstance(value, bytes):
+        if _as_int(value) is not None:
+            return "int"
+        return "embstr" if len(value) <= 44 else "raw"
+    return {
+        PackedList: "listpack",
+        deque: "quicklist",
+        PackedHash: "listpack",
+        dict: "hashtable",
+        IntSet: "intset",
+        PackedSet: "listpack",
+        set: "hashtable",
+    }[type(value)]
+
+
+def list_length(value) -> int:
+    return value.entry_count() if isinstance(value, PackedList) else len(value)
+
+
+def list_iter(value):
+    return value.entries() if isinstance(value, PackedList) else iter(value)
+
+
+def list_push(value, items: list, left: bool):
+    """Returns (value, length, delta)."""
+    if value is None:
+        value = PackedList()
+    if isinstance(value, PackedList):
+        count = value.entry_count()
+        if _fits(items, count + len(items), "list-max-listpack-entries", "list-max-listpack-value"):
+            before = sys.getsizeof(value)
+            for item in items:
+                value.prepend_entry(item) if left else value.append_entry(item)
+            return value, count + len(items), sys.getsizeof(value) - before
+        value = deque(value.entries())
+    if left:
+        value.extendleft(items)
+    else:
+        value.extend(items)
+    return value, len(value), sum(map(sizeof_element, items))
+
+
+def hash_length(value) -> int:
+    return value.entry_count() // 2 if isinstance(value, PackedHash) else len(value)
+
+
+def hash_get(value, field: bytes) -> bytes | None:
+    if isinstance(value, PackedHash):
+        spans = value.spans()
+        for start, end in spans:
+            value_start, value_end = next(spans)
+            if value[start:end] == field:
+                return bytes(value[value_start:value_end])
+        return None
+    return value.get(field)
+
+
+def hash_items(value) -> list:
+    """Fields and values, flattened as HGETALL replies them."""
+    if isinstance(value, PackedHash):
+        return list(value.entries())
+    return [item for pair in value.items() for item in pair]
+
+
+def hash_set(value, pairs: list):
+    """Set field/value pairs. Returns (value, added, delta)."""
+    if value is None:
+        value = PackedHash()
+    if isinstance(value, PackedHash):
+        count = hash_length(value)
+        if _fits(pairs, count + len(pairs) // 2, "hash-max-listpack-entries", "hash-max-listpack-value"):
+            before = sys.getsizeof(value)
+            added = 0
+            for field, item in zip(pairs[::2], pairs[1::2]):
+                span = value.find(field, step=2)
+                if span is None:
+                    value.append_entry(field)
+                    value.append_entry(item)
+                    added += 1
+                else:
+                    # The value entry directly follows the field entry
+                    value_start = span[1] + 1
+                    value[span[1]:value_start + value[span[1]]] = bytes([len(item)]) + item
+            return value, added, sys.getsizeof(value) - before
+        entries = value.entries()
+        value = dict(zip(entries, entries))
+    added = delta = 0
+    for field, item in zip(pairs[::2], pairs[1::2]):
+        old = value.get(field)
+        if old is None:
+            added += 1
+            delta += sizeof_pair(field, item)
+        else:
+            delta += sys.getsizeof(item) - sys.getsizeof(old)
+        value[field] = item
+    return value, added, delta
+
+
+def hash_delete(value, fields: list):
+    """Returns (removed, delta); packed hashes are changed in place."""
+    if isinstance(value, PackedHash):
+        before = sys.getsizeof(value)
+        removed = 0
+        for field in fields:
+            span = value.find(field, step=2)
+            if span is not None:
+                value_end = span[1] + 1 + value[span[1]]
+                del value[span[0] - 1:value_end]
+                removed += 1
+        return removed, sys.getsizeof(value) - before
+    removed = delta = 0
+    for field in fields:
+        old = value.pop(field, None)
+        if old is not None:
+            removed += 1
+            delta -= sizeof_pair(field, old)
+    return removed, delta
+
+
+def set_length(value) -> int:
+    return value.entry_count() if isinstance(value, PackedSet) else len(value)
+
+
+def set_contains(value, member: bytes) -> bool:
+    if isinstance(value, IntSet):
+        number = _as_int(member)
+        if number is None:
+            return False
+        index = bisect_left(value, number)
+        return index < len(value) and value[index] == number
+    if isinstance(value, PackedSet):
+        return value.find(member) is not None
+    return member in value
+
+
+def set_members(value) -> list:
+    if isinstance(value, IntSet):
+        return [b"%d" % number for number in value]
+    if isinstance(value, PackedSet):
+        return list(value.entries())
+    return list(value)
+
+
+def _intset_typecode(numbers) -> str | None:
+    low, high = min(numbers), max(numbers)
+    for typecode, bound in _INT_TYPECODES:
+        if -bound <= low and high < bound:
+            return typecode
+    return None
+
+
+def set_add(value, members: list):
+    """Returns (value, added, delta)."""
+    members = list(dict.fromkeys(members))
+    if value is None:
+        numbers = [_as_int(member) for member in members]
+        if None not in numbers and len(numbers) <= ENCODING_LIMITS["set-max-intset-entries"]:
+            value = IntSet(_intset_typecode(numbers))
+        else:
+            value = PackedSet()
+    if isinstance(value, IntSet):
+        numbers = [_as_int(member) for member in members]
+        new_numbers = [number for number in numbers if number is not None and not set_contains(value, b"%d" % number)]
+        if None not in numbers and len(value) + len(new_numbers) <= ENCODING_LIMITS["set-max-intset-entries"]:
+            before = sys.getsizeof(value)
+            typecode = _intset_typecode(list(value) + new_numbers) if new_numbers else value.typecode
+            if typecode != value.typecode:
+                # Widen every element, as intsets upgrade their encoding
+                value = IntSet(typecode, value)
+                before = None
+            for number in new_numbers:
+                value.insert(bisect_left(value, number), number)
+            delta = 0 if before is None else sys.getsizeof(value) - before
+            return value, len(new_numbers), delta
+        current = set_members(value)
+        if _fits(current + members, len(value) + len(members), "set-max-listpack-entries", "set-max-listpack-value"):
+            value = PackedSet()
+            for member in current:
+                value.append_entry(member)
+        else:
+            value = set(current)
+    if isinstance(value, PackedSet):
+        new_members = [member for member in members if value.find(member) is None]
+        count = value.entry_count() + len(new_members)
+        if _fits(new_members, count, "set-max-listpack-entries", "set-max-listpack-value"):
+            before = sys.getsizeof(value)
+            for member in new_members:
+                value.append_entry(member)
+            return value, len(new_members), sys.getsizeof(value) - before
+        value = set(value.entries())
+    new_members = [member for member in members if member not in value]
+    value.update(new_members)
+    return value, len(new_members), sum(map(sizeof_member, new_members))
+
+
+def set_remove(value, members: list):
+    """Returns (removed, delta); the value is always changed in place."""
+    before = sys.getsizeof(value)
+    removed = 0
+    if isinstance(value, IntSet):
+        for member in set(members):
+            number = _as_int(member)
+            if number is not None and set_contains(value, member):
+                del value[bisect_left(value, number)]
+                removed += 1
+        return removed, sys.getsizeof(value) - before
+    if isinstance(value, PackedSet):
+        for member in set(members):
+            span = value.find(member)
+            if span is not None:
+                del value[span[0] - 1:span[1]]
+                removed += 1
+        return removed, sys.getsizeof(value) - before
+    delta = 0
+    for member in set(members):
+        if member in value:
+            value.remove(member)
+            removed += 1
+            delta -= sizeof_member(member)
+    return removed, delta
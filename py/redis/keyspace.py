@@ -0,0 +1,318 @@
+import random
+import sys
+import time
+from heapq import heappop, heappush
+
+from .encodings import sizeof_value
+
+EVICTION_POLICIES = ("noeviction", "allkeys-lru", "allkeys-lfu", "volatile-ttl")
+MAXMEMORY_SAMPLES = 5
+
+# Access stamps are 24 bits, as in redis-server: an LRU clock in seconds, or
+# for LFU the time of the last decrement in minutes (16 bits) followed by an
+# 8 bit logarithmic access counter.
+STAMP_BITS = 24
+STAMP_MASK = (1 << STAMP_BITS) - 1
+LFU_INIT_VAL = 5
+LFU_LOG_FACTOR = 10
+LFU_DECAY_TIME = 1
+
+# Rough cost of a dict slot plus the references to the key and the value
+ENTRY_OVERHEAD = 64
+
+_MEMORY_UNITS = {
+    "": 1,
+    "k": 1000, "kb": 1024,
+    "m": 1000 ** 2, "mb": 1024 ** 2,
+    "g": 1000 ** 3, "gb": 1024 ** 3,
+}
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def parse_memory(value: str) -> int:
+    """Parse redis.conf style sizes such as 100mb or 1g."""
+    value = value.strip().lower()
+    number = value.rstrip("kmgb")
+    try:
+        return int(number) * _MEMORY_UNITS[value[len(number):]]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid memory size: {value}")
+
+
+def sizeof_entry(key: bytes, value) -> int:
+    return ENTRY_OVERHEAD + sys.getsizeof(key) + sizeof_value(value)
+
+
+class Keyspace:
+    """
+    Keys with a TTL are expired lazily, when they are looked up, and actively
+    by `active_expire_cycle()`. For the active side every volatile key is also
+    filed in a bucket per expiry second, and a heap of bucket seconds gives the
+    oldest due bucket without scanning the keys that are not due yet. Every
+    way a key expires, including an EXPIRE to a time already past, goes
+    through `_expire()`, so each sends the same events and is counted in
+    `expired_keys`.
+
+    `used_memory` is an estimate of the memory held by keys and values, kept
+    up to date on every write. With `maxmemory` set, `free_memory()` evicts
+    keys according to `maxmemory_policy` until the estimate is under the
+    limit. The LRU and LFU policies sample MAXMEMORY_SAMPLES random keys and
+    evict the best candidate, using a single packed int per key in `_access`
+    that holds the key's slot in `_sample_keys` and its 24 bit access stamp.
+    """
+
+    def __init__(self, maxmemory: int = 0, maxmemory_policy: str = "noeviction"):
+        self.data: dict[bytes, object] = {}
+        self.expires: dict[bytes, int] = {}
+        self._buckets: dict[int, set[bytes]] = {}
+        self._bucket_heap: list[int] = []
+
+        self.used_memory = 0
+        self.maxmemory = maxmemory
+        self.maxmemory_policy = "noeviction"
+        self.evicted_keys = 0
+        self.expired_keys = 0
+        self._access: dict[bytes, int] = {}
+        self._sample_keys: list[bytes] = []
+        self._lru_clock = 0
+        self._lfu_minutes = 0
+        # Called with the command to replicate when a key expires or is
+        # evicted, and with every executed write command; see commands.py
+        self.propagate = None
+        self.persistence = None
+        self.pubsub = None
+        # Keys the running write command changed, for its keyspace events;
+        # see commands.execute()
+        self.changed_keys: list[bytes] = []
+        self.update_clock()
+        self.set_policy(maxmemory_policy)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.get(key) is not None
+
+    def update_clock(self) -> None:
+        seconds = int(time.time())
+        self._lru_clock = seconds & STAMP_MASK
+        self._lfu_minutes = (seconds // 60) & 0xFFFF
+
+    def set_policy(self, policy: str) -> None:
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Invalid maxmemory-policy: {policy}")
+        self.maxmemory_policy = policy
+        self._access = {}
+        self._sample_keys = []
+        if self._tracks_access():
+            for key in self.data:
+                self._track(key)
+
+    def _tracks_access(self) -> bool:
+        return self.maxmemory_policy in ("allkeys-lru", "allkeys-lfu")
+
+    def _new_stamp(self) -> int:
+        if self.maxmemory_policy == "allkeys-lfu":
+            return (self._lfu_minutes << 8) | LFU_INIT_VAL
+        return self._lru_clock
+
+    def _lfu_counter(self, stamp: int) -> int:
+        elapsed = (self._lfu_minutes - (stamp >> 8)) & 0xFFFF
+        return max((stamp & 0xFF) - elapsed // LFU_DECAY_TIME, 0)
+
+    def _track(self, key: bytes) -> None:
+        self._access[key] = (len(self._sample_keys) << STAMP_BITS) | self._new_stamp()
+        self._sample_keys.append(key)
+
+    def _untrack(self, key: bytes) -> None:
+        index = self._access.pop(key) >> STAMP_BITS
+        last = self._sample_keys.pop()
+        if last != key:
+            self._sample_keys[index] = last
+            self._access[last] = (index << STAMP_BITS) | (self._access[last] & STAMP_MASK)
+
+    def _touch(self, key: bytes) -> None:
+        packed = self._access[key]
+        if self.maxmemory_policy == "allkeys-lfu":
+            counter = self._lfu_counter(packed & STAMP_MASK)
+            if counter < 255 and random.random() < 1 / (max(counter - LFU_INIT_VAL, 0) * LFU_LOG_FACTOR + 1):
+                counter += 1
+            stamp = (self._lfu_minutes << 8) | counter
+        else:
+            stamp = self._lru_clock
+        self._access[key] = (packed & ~STAMP_MASK) | stamp
+
+    def _schedule(self, key: bytes, when: int) -> None:
+        self._unschedule(key)
+        self.expires[key] = when
+        second = when // 1000
+        bucket = self._buckets.get(second)
+        if bucket is None:
+            bucket = self._buckets[second] = set()
+            heappush(self._bucket_heap, second)
+        bucket.add(key)
+
+    def _unschedule(self, key: bytes) -> bool:
+        when = self.expires.pop(key, None)
+        if when is None:
+            return False
+        second = when // 1000
+        bucket = self._buckets[second]
+        bucket.discard(key)
+        if not bucket:
+            # The stale heap entry is dropped when the cycle reaches it
+            del self._buckets[second]
+        return True
+
+    def _remove(self, key: bytes) -> None:
+        value = self.data.pop(key)
+        self.used_memory -= sizeof_entry(key, value)
+        self._unschedule(key)
+        if key in self._access:
+            self._untrack(key)
+
+    def _drop(self, key: bytes, event: str) -> None:
+        """Remove a key on the server's own initiative, i.e. expiry or
+        eviction, propagate that as a DEL and send the keyspace event."""
+        self._remove(key)
+        if self.propagate is not None:
+            self.propagate([b"DEL", key])
+        if self.pubsub is not None and self.pubsub.notify_flags:
+            self.pubsub.notify(event, key, "x" if event == "expired" else "e")
+
+    def _expire(self, key: bytes) -> None:
+        self._drop(key, "expired")
+        self.expired_keys += 1
+
+    def _expire_if_needed(self, key: bytes) -> bool:
+        when = self.expires.get(key)
+        if when is not None and when <= now_ms():
+            self._expire(key)
+            return True
+        return False
+
+    def get(self, key: bytes):
+        if key in self.expires and self._expire_if_needed(key):
+            return None
+        value = self.data.get(key)
+        if value is not None and self._access:
+            self._touch(key)
+        return value
+
+    def set(self, key: bytes, value, keep_ttl: bool = False) -> None:
+        old_value = self.data.get(key)
+        self.data[key] = value
+        if old_value is None:
+            self.used_memory += sizeof_entry(key, value)
+            if self._tracks_access():
+                self._track(key)
+        else:
+            self.used_memory += sizeof_value(value) - sizeof_value(old_value)
+            if self._access:
+                self._touch(key)
+        if not keep_ttl and key in self.expires:
+            self._unschedule(key)
+
+    def account(self, delta: int) -> None:
+        """Record a change in size of a value that was modified in place."""
+        self.used_memory += delta
+
+    def delete(self, key: bytes) -> bool:
+        if key in self.expires and self._expire_if_needed(key):
+            return False
+        if key in self.data:
+            self._remove(key)
+            return True
+        return False
+
+    def expire_at(self, key: bytes, when: int) -> bool:
+        if self.get(key) is None:
+            return False
+        if when <= now_ms():
+            self._expire(key)
+        else:
+            self._schedule(key, when)
+        return True
+
+    def persist(self, key: bytes) -> bool:
+        if self.get(key) is None:
+            return False
+        return self._unschedule(key)
+
+    def ttl_ms(self, key: bytes) -> int | None:
+        """Milliseconds left, -1 for a key without a TTL and None for a
+        missing key."""
+        if self.get(key) is None:
+            return None
+        when = self.expires.get(key)
+        if when is None:
+            return -1
+        return max(when - now_ms(), 0)
+
+    def active_expire_cycle(self, budget: float) -> bool:
+        """
+        Remove keys whose whole expiry second has passed until none are left
+        or `budget` seconds have been spent. Returns True if it ran out of
+        time with due keys remaining.
+        """
+        deadline = time.perf_counter() + budget
+        now_second = now_ms() // 1000
+        heap = self._bucket_heap
+        buckets = self._buckets
+        removed = 0
+        while heap and heap[0] < now_second:
+            bucket = buckets.get(heap[0])
+            if not bucket:
+                heappop(heap)
+                continue
+            self._expire(bucket.pop())
+            removed += 1
+            if removed % 64 == 0 and time.perf_counter() >= deadline:
+                return True
+        return False
+
+    def _eviction_candidate(self) -> bytes | None:
+        policy = self.maxmemory_policy
+        if policy == "volatile-ttl":
+            # The buckets already order volatile keys by expiry time
+            heap = self._bucket_heap
+            while heap:
+                bucket = self._buckets.get(heap[0])
+                if bucket:
+                    # Popped rather than peeked, as repeated next(iter(set))
+                    # rescans the slots freed by earlier evictions
+                    return bucket.pop()
+                heappop(heap)
+            return None
+        if policy == "noeviction" or not self._sample_keys:
+            return None
+
+        sample_keys = self._sample_keys
+        access = self._access
+        best_key, best_score = None, -1
+        for _ in range(MAXMEMORY_SAMPLES):
+            key = sample_keys[random.randrange(len(sample_keys))]
+            stamp = access[key] & STAMP_MASK
+            if policy == "allkeys-lru":
+                score = (self._lru_clock - stamp) & STAMP_MASK  # idle time
+            else:
+                score = 255 - self._lfu_counter(stamp)
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def free_memory(self) -> bool:
+        """Evict keys until used_memory is under maxmemory. Returns False if
+        the limit is exceeded and the policy has nothing left to evict."""
+        if not self.maxmemory:
+            return True
+        while self.used_memory > self.maxmemory:
+            key = self._eviction_candidate()
+            if key is None:
+                return False
+            self._drop(key, "evicted")
+            self.evicted_keys += 1
+        return True
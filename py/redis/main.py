@@ -2,109 +2,488 @@
 RESP specification: https://redis.io/docs/latest/develop/reference/protocol-spec/
 
 _CHARACTER_DATATYPE_MAPPING = {
-    "+": "SIMPLE_STRING",
-    "-": "ERROR",
-    ":": "INTEGER",
-    "$": "BULK_STRING",
-    "*": "ARRAY",
-    "_": "NULL",
-    "#": "BOOLEAN",
-    ",": "DOUBLE",
-    "(": "BIG_NUMBER",
-    "!": "BULK_ERROR",
-    "=": "VERBATIM_STRING",
-    "%": "MAP",
-    "~": "SET",
-    ">": "PUSH"
+    "+": "SIMPLE_STRING",    -> str
+    "-": "ERROR",            -> RespError
+    ":": "INTEGER",          -> int
+    "$": "BULK_STRING",      -> bytes (None for $-1)
+    "*": "ARRAY",            -> list (None for *-1)
+    "_": "NULL",             -> None
+    "#": "BOOLEAN",          -> bool
+    ",": "DOUBLE",           -> float
+    "(": "BIG_NUMBER",       -> int
+    "!": "BULK_ERROR",       -> RespError
+    "=": "VERBATIM_STRING",  -> VerbatimString
+    "%": "MAP",              -> dict
+    "~": "SET",              -> set
+    ">": "PUSH"              -> Push
 }
+
+Anything else at the start of a frame is read as an inline command, i.e. a
+single line of space separated arguments, the way redis-server accepts them
+from telnet.
 """
 
+CRLF = b"\r\n"
+
 
 class RespProtocolException(Exception):
     pass
 
 
+class RespError(str):
+    """An error reply ("-" or "!"), kept apart from plain strings."""
+
+
+class VerbatimString(bytes):
+
+    def __new__(cls, value: bytes, format_: str = "txt"):
+        verbatim = super().__new__(cls, value)
+        verbatim.format = format_
+        return verbatim
+
+
+class Push(list):
+    """Out-of-band RESP3 push data, e.g. pub/sub messages."""
+
+
+class _Incomplete(Exception):
+    """The buffer ends in the middle of a frame; `needed` is the buffer
+    length at which it is worth trying again. On the way out it collects
+    the aggregates left unfinished, innermost first, as (elements decoded
+    so far, number of elements still to come, build), and `resume_at` is
+    where the element that could not be finished starts."""
+
+    def __init__(self, needed: int):
+        super().__init__(needed)
+        self.needed = needed
+        self.partial = []
+        self.resume_at = 0
+
+
 class Parser:
+    """
+    Incremental RESP parser.
 
-    def parse(self, message: str):
-        data_type = message[0]
-        match data_type:
-            case "+":  # Simple String
-                data = self._parse_simple_string(message[1:])
-                print(f"Simple String: {data}")
-            case "-":  # Simple Error
-                data = self._parse_simple_string(message[1:])
-                print(f"Simple Error: {data}")
-            case ":":  # Number
-                data = self._parse_integer(message)
-                print(f"Integer: {data}")
-            case "$":  # Bulk String
-                data = self._parse_bulk_string(message)
-                print(f"Bulk String: {data}")
-            case "*":  # Array
-                data = self._parse_integer(message)
-            case _:  # Nil
-                data = None
-        return data
-
-    @staticmethod
-    def _parse_simple_string(message: str) -> str:
-        string, terminator = message[:-2], message[-2:]
-        if string.find("\r") != -1 or string.find("\n") != -1 or terminator != "\r\n":
-            raise RespProtocolException("Invalid String")
-        return string
+    Bytes are appended to one reusable buffer with `feed()`, which returns
+    every frame that is complete so far. A partial frame stays in the buffer
+    and parsing resumes once enough bytes have arrived to finish it, so
+    frames can be split across reads and any number of pipelined frames can
+    arrive in a single read. The elements of a partial aggregate that are
+    already decoded are kept, with their bytes dropped from the buffer, so a
+    large command arriving over many reads is still only parsed once.
+    """
 
-    @staticmethod
-    def _parse_simple_error(message: str) -> str:
-        error_message, terminator = message[:-2], message[-2:]
-        if error_message.find("\r") != -1 or error_message.find("\n") != -1 or terminator != "\r\n":
-            raise RespProtocolException("Invalid String")
-        return error_message
+    def __init__(self):
+        self.buffer = bytearray()
+        self._needed = 0
+        # The unfinished aggregates of a partial frame, see _Incomplete
+        self._partial = []
+        # Bytes of a partial line, from its start, known to hold no CRLF
+        self._scanned = 0
+        self._handlers = {
+            ord("+"): self._parse_simple_string,
+            ord("-"): self._parse_simple_error,
+            ord(":"): self._parse_integer,
+            ord("$"): self._parse_bulk_string,
+            ord("*"): self._parse_array,
+            ord("_"): self._parse_null,
+            ord("#"): self._parse_boolean,
+            ord(","): self._parse_double,
+            ord("("): self._parse_integer,
+            ord("!"): self._parse_bulk_error,
+            ord("="): self._parse_verbatim_string,
+            ord("%"): self._parse_map,
+            ord("~"): self._parse_set,
+            ord(">"): self._parse_push,
+        }
 
-    @staticmethod
-    def _parse_integer(message: str) -> int:
-        signed_number, terminator = message[:-2], message[-2:]
+    def feed(self, data: bytes) -> list:
+        buffer = self.buffer
+        buffer += data
+        end = len(buffer)
+        if end < self._needed:
+            return []
+
+        frames = []
+        position = 0
         try:
-            if message[0] == "+":
-                number = int(signed_number[1:])
-            elif message[0] == "-":
-                number = -int(signed_number[1:])
-            else:
-                number = int(signed_number)
-        except IndexError:
-            raise RespProtocolException("Invalid String")
+            if self._partial:
+                frame, position = self._resume(buffer)
+                frames.append(frame)
+            while position < end:
+                frame, position = self._parse_frame(buffer, position)
+                frames.append(frame)
+            self._needed = 0
+        except _Incomplete as incomplete:
+            if incomplete.partial:
+                self._partial = incomplete.partial
+                position = incomplete.resume_at
+            self._needed = incomplete.needed - position
+        # Deleting from the front of a bytearray only moves its start offset
+        del buffer[:position]
+        return frames
+
+    def _resume(self, buffer: bytearray):
+        """Finish the partial frame, whose next element starts the buffer."""
+        partial, self._partial = self._partial, []
+        position = 0
+        finished = False
+        value = None
+        for level, (elements, remaining, build) in enumerate(partial):
+            if finished:
+                # The aggregate just finished is an element of this one
+                elements.append(value)
+                remaining -= 1
+            try:
+                value, position = self._parse_elements(buffer, position, remaining, build, elements)
+            except _Incomplete as incomplete:
+                incomplete.partial += partial[level + 1:]
+                raise
+            finished = True
+        return value, position
+
+    def parse(self, message: bytes | str):
+        """Parse a single, complete message."""
+        if isinstance(message, str):
+            message = message.encode()
+        buffer = bytearray(message)
+        try:
+            frame, position = self._parse_frame(buffer, 0)
+        except _Incomplete:
+            self._scanned = 0
+            raise RespProtocolException("Incomplete message")
+        if position != len(buffer):
+            raise RespProtocolException("Trailing data after message")
+        return frame
+
+    def _parse_frame(self, buffer: bytearray, position: int):
+        handler = self._handlers.get(buffer[position])
+        if handler is None:
+            return self._parse_inline_command(buffer, position)
+        return handler(buffer, position + 1)
+
+    def _parse(self, buffer: bytearray, position: int):
+        if position >= len(buffer):
+            raise _Incomplete(position + 1)
+        handler = self._handlers.get(buffer[position])
+        if handler is None:
+            raise RespProtocolException(f"Invalid type byte: {chr(buffer[position])!r}")
+        return handler(buffer, position + 1)
+
+    def _find_line_end(self, buffer: bytearray, position: int) -> int:
+        end = buffer.find(CRLF, position + self._scanned)
+        self._scanned = 0
+        if end == -1:
+            # Only the last byte could still turn out to be the line's end
+            self._scanned = max(len(buffer) - 1 - position, 0)
+            raise _Incomplete(len(buffer) + 1)
+        return end
+
+    def _parse_length(self, buffer: bytearray, position: int) -> tuple[int, int]:
+        end = self._find_line_end(buffer, position)
+        try:
+            length = int(buffer[position:end])
         except ValueError:
+            raise RespProtocolException("Invalid length")
+        if length < -1:
+            raise RespProtocolException("Invalid length")
+        return length, end + 2
+
+    def _parse_simple_string(self, buffer: bytearray, position: int) -> tuple[str, int]:
+        end = self._find_line_end(buffer, position)
+        line = buffer[position:end]
+        if b"\r" in line or b"\n" in line:
             raise RespProtocolException("Invalid String")
-        except TypeError:
-            raise RespProtocolException("Invalid String")
-        return number
-
-    @staticmethod
-    def _parse_bulk_string(message: str) -> str | None:
-        parts = message.split("\r\n")
-        if len(parts) == 2:
-            length, _ = parts
-            if length == "-1":
-                return None
-        elif len(parts) == 3:
-            length, data, _ = parts
-            length = int(length)
-            if len(data) == length:
-                return data
-        raise RespProtocolException("Invalid String")
-
-    def _parse_array(self, message: str) -> list | None:
-        array = []
-        if message.endswith("\r\n"):
-            size, *elements = message.split("\r\n")
-            if size == "-1":
-                return None
-            if len(elements) == int(size):
-                for element in elements:
-                    array.append(self.parse(element))
-        return array
-
-
-def deserialize(message: str):
+        return line.decode(), end + 2
+
+    def _parse_simple_error(self, buffer: bytearray, position: int) -> tuple[RespError, int]:
+        error_message, position = self._parse_simple_string(buffer, position)
+        return RespError(error_message), position
+
+    def _parse_integer(self, buffer: bytearray, position: int) -> tuple[int, int]:
+        end = self._find_line_end(buffer, position)
+        try:
+            number = int(buffer[position:end])
+        except ValueError:
+            raise RespProtocolException("Invalid Integer")
+        return number, end + 2
+
+    def _read_blob(self, buffer: bytearray, position: int) -> tuple[bytes | None, int]:
+        length, start = self._parse_length(buffer, position)
+        if length == -1:
+            return None, start
+        stop = start + length
+        if stop + 2 > len(buffer):
+            raise _Incomplete(stop + 2)
+        if buffer[stop] != 13 or buffer[stop + 1] != 10:
+            raise RespProtocolException("Bulk String length mismatch")
+        return bytes(buffer[start:stop]), stop + 2
+
+    def _parse_bulk_string(self, buffer: bytearray, position: int) -> tuple[bytes | None, int]:
+        return self._read_blob(buffer, position)
+
+    def _parse_bulk_error(self, buffer: bytearray, position: int) -> tuple[RespError, int]:
+        data, position = self._read_blob(buffer, position)
+        if data is None:
+            raise RespProtocolException("Invalid Bulk Error")
+        return RespError(data.decode()), position
+
+    def _parse_verbatim_string(self, buffer: bytearray, position: int) -> tuple[VerbatimString, int]:
+        data, position = self._read_blob(buffer, position)
+        if data is None or len(data) < 4 or data[3:4] != b":":
+            raise RespProtocolException("Invalid Verbatim String")
+        return VerbatimString(data[4:], data[:3].decode()), position
+
+    def _parse_null(self, buffer: bytearray, position: int) -> tuple[None, int]:
+        end = self._find_line_end(buffer, position)
+        if end != position:
+            raise RespProtocolException("Invalid Null")
+        return None, end + 2
+
+    def _parse_boolean(self, buffer: bytearray, position: int) -> tuple[bool, int]:
+        end = self._find_line_end(buffer, position)
+        value = buffer[position:end]
+        if value == b"t":
+            return True, end + 2
+        if value == b"f":
+            return False, end + 2
+        raise RespProtocolException("Invalid Boolean")
+
+    def _parse_double(self, buffer: bytearray, position: int) -> tuple[float, int]:
+        end = self._find_line_end(buffer, position)
+        try:
+            number = float(buffer[position:end])
+        except ValueError:
+            raise RespProtocolException("Invalid Double")
+        return number, end + 2
+
+    def _parse_elements(self, buffer: bytearray, position: int, count: int, build=None, elements=None):
+        """Parse `count` more elements onto `elements`, then make the
+        aggregate of them with `build`, or keep them as a list."""
+        if elements is None:
+            elements = []
+        done = len(elements)
+        append = elements.append
+        parse = self._parse
+        parse_bulk_string = self._read_blob
+        end = len(buffer)
+        try:
+            for _ in range(count):
+                # Commands are arrays of bulk strings, so skip the dispatch for those
+                if position < end and buffer[position] == 36:  # "$"
+                    element, position = parse_bulk_string(buffer, position + 1)
+                else:
+                    element, position = parse(buffer, position)
+                append(element)
+        except _Incomplete as incomplete:
+            if not incomplete.partial:
+                # `position` is still where the unfinished element starts
+                incomplete.resume_at = position
+            incomplete.partial.append((elements, count - (len(elements) - done), build))
+            raise
+        return (elements if build is None else build(elements)), position
+
+    def _parse_array(self, buffer: bytearray, position: int) -> tuple[list | None, int]:
+        count, position = self._parse_length(buffer, position)
+        if count == -1:
+            return None, position
+        return self._parse_elements(buffer, position, count)
+
+    def _parse_map(self, buffer: bytearray, position: int) -> tuple[dict, int]:
+        count, position = self._parse_length(buffer, position)
+        return self._parse_elements(buffer, position, 2 * count, _build_map)
+
+    def _parse_set(self, buffer: bytearray, position: int) -> tuple[set, int]:
+        count, position = self._parse_length(buffer, position)
+        return self._parse_elements(buffer, position, count, set)
+
+    def _parse_push(self, buffer: bytearray, position: int) -> tuple[Push, int]:
+        count, position = self._parse_length(buffer, position)
+        return self._parse_elements(buffer, position, count, Push)
+
+    def _parse_inline_command(self, buffer: bytearray, position: int) -> tuple[list, int]:
+        end = buffer.find(b"\n", position + self._scanned)
+        self._scanned = 0
+        if end == -1:
+            self._scanned = len(buffer) - position
+            raise _Incomplete(len(buffer) + 1)
+        return bytes(buffer[position:end]).split(), end + 1
+
+
+def _build_map(elements: list) -> dict:
+    return dict(zip(elements[::2], elements[1::2]))
+
+
+SHARED_INTEGERS = 10000
+SHARED_HEADERS = 1024
+
+_INTEGER_REPLIES = [b":%d\r\n" % number for number in range(SHARED_INTEGERS)]
+_BULK_HEADERS = [b"$%d\r\n" % length for length in range(SHARED_HEADERS)]
+_ARRAY_HEADERS = [b"*%d\r\n" % length for length in range(SHARED_HEADERS)]
+_SIMPLE_STRINGS = {
+    "OK": b"+OK\r\n",
+    "PONG": b"+PONG\r\n",
+    "QUEUED": b"+QUEUED\r\n",
+}
+
+NULL_BULK_STRING = b"$-1\r\n"
+
+
+class Serializer:
+    """
+    Writes replies into an output buffer instead of building a `bytes` per
+    reply. Integers, short headers and the usual status replies are
+    pre-encoded. Bulk values of LARGE_VALUE bytes or more are not copied into
+    the buffer; they are queued as separate chunks, so `take()` returns a list
+    meant for `transport.writelines()`.
+    """
+
+    LARGE_VALUE = 64 * 1024
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.chunks = []
+        self._writers = {
+            bytes: self.write_bulk_string,
+            bytearray: self.write_bulk_string,
+            memoryview: self.write_bulk_string,
+            str: self.write_simple_string,
+            RespError: self.write_error,
+            int: self.write_integer,
+            bool: self.write_boolean,
+            float: self.write_double,
+            type(None): self.write_null,
+            list: self.write_array,
+            tuple: self.write_array,
+            dict: self.write_map,
+            set: self.write_set,
+            frozenset: self.write_set,
+            Push: self.write_push,
+            VerbatimString: self.write_verbatim_string,
+        }
+
+    def take(self) -> list:
+        """Return everything written so far and start a new buffer. The
+        transport may keep a reference to the old one until it is sent."""
+        chunks = self.chunks
+        if self.buffer:
+            chunks.append(self.buffer)
+        self.buffer = bytearray()
+        self.chunks = []
+        return chunks
+
+    def write(self, value) -> None:
+        writer = self._writers.get(type(value))
+        if writer is None:
+            writer = self._find_writer(value)
+        writer(value)
+
+    def _find_writer(self, value):
+        for base, writer in self._writers.items():
+            if isinstance(value, base):
+                return writer
+        raise RespProtocolException(f"Cannot serialize {type(value).__name__}")
+
+    def write_raw(self, data: bytes) -> None:
+        self.buffer += data
+
+    def _write_header(self, prefix: bytes, length: int) -> None:
+        self.buffer += b"%s%d\r\n" % (prefix, length)
+
+    def write_simple_string(self, value: str) -> None:
+        shared = _SIMPLE_STRINGS.get(value)
+        if shared is not None:
+            self.buffer += shared
+            return
+        buffer = self.buffer
+        buffer += b"+"
+        buffer += value.encode()
+        buffer += CRLF
+
+    def write_error(self, value: RespError) -> None:
+        buffer = self.buffer
+        buffer += b"-"
+        buffer += value.encode()
+        buffer += CRLF
+
+    def write_integer(self, value: int) -> None:
+        if 0 <= value < SHARED_INTEGERS:
+            self.buffer += _INTEGER_REPLIES[value]
+        else:
+            self._write_header(b":", value)
+
+    def write_boolean(self, value: bool) -> None:
+        self.buffer += b"#t\r\n" if value else b"#f\r\n"
+
+    def write_double(self, value: float) -> None:
+        self.buffer += b",%r\r\n" % value
+
+    def write_null(self, value: None = None) -> None:
+        self.buffer += NULL_BULK_STRING
+
+    def write_bulk_string(self, value: bytes) -> None:
+        length = len(value)
+        if length >= self.LARGE_VALUE:
+            self._write_header(b"$", length)
+            self.chunks.append(self.buffer)
+            self.chunks.append(value)
+            self.buffer = bytearray(CRLF)
+            return
+        buffer = self.buffer
+        buffer += _BULK_HEADERS[length] if length < SHARED_HEADERS else b"$%d\r\n" % length
+        buffer += value
+        buffer += CRLF
+
+    def write_verbatim_string(self, value: VerbatimString) -> None:
+        self._write_header(b"=", len(value) + 4)
+        buffer = self.buffer
+        buffer += value.format.encode()
+        buffer += b":"
+        buffer += value
+        buffer += CRLF
+
+    def _write_elements(self, values) -> None:
+        write = self.write
+        large_value = self.LARGE_VALUE
+        for value in values:
+            # The common case, e.g. LRANGE or MGET, is short bulk strings
+            if type(value) is bytes and len(value) < SHARED_HEADERS:
+                buffer = self.buffer
+                buffer += _BULK_HEADERS[len(value)]
+                buffer += value
+                buffer += CRLF
+            elif type(value) is bytes and len(value) < large_value:
+                self.write_bulk_string(value)
+            else:
+                write(value)
+
+    def write_array(self, values) -> None:
+        length = len(values)
+        self.buffer += _ARRAY_HEADERS[length] if length < SHARED_HEADERS else b"*%d\r\n" % length
+        self._write_elements(values)
+
+    def write_map(self, values: dict) -> None:
+        self._write_header(b"%", len(values))
+        for key, value in values.items():
+            self.write(key)
+            self.write(value)
+
+    def write_set(self, values) -> None:
+        self._write_header(b"~", len(values))
+        self._write_elements(values)
+
+    def write_push(self, values: Push) -> None:
+        self._write_header(b">", len(values))
+        self._write_elements(values)
+
+
+def serialize(value) -> bytes:
+    serializer = Serializer()
+    serializer.write(value)
+    return b"".join(serializer.take())
+
+
+def deserialize(message: bytes | str):
     parser = Parser()
-    parser.parse(message)
+    return parser.parse(message)
+
@@ -0,0 +1,481 @@
+"""
+Snapshots and the append only file.
+
+Snapshot layout, all integers little endian:
+
+    b"PYRDB" | version: u16
+    record*  | type: u8 | expire_ms: i64 (-1 for none) | key_len: u32 | key | payload
+    b"\\xff"  | crc32 of everything before it: u32
+
+    TYPE_STRING payload:        value_len: u32 | value
+    TYPE_LIST/TYPE_SET payload: count: u32 | (item_len: u32 | item)*
+    TYPE_HASH payload:          count: u32 | (field_len: u32 | field | value_len: u32 | value)*
+    TYPE_PACKED_* payload:      blob_len: u32 | the listpack bytes as they are in memory
+    TYPE_INTSET payload:        type code: u8 | blob_len: u32 | the array's machine values
+
+Packed encodings are written out verbatim, so they load with a single copy.
+Version 1 files, which predate the hash, set and packed types, still load.
+
+The append only file logs write commands in RESP. A rewrite replaces it with
+a snapshot of the dataset at the time of the rewrite, followed by the
+commands executed since, so loading it is mostly a bulk snapshot load.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import deque
+
+from .commands import CommandError, command, execute
+from .encodings import IntSet, PackedHash, PackedList, PackedSet
+from .keyspace import Keyspace, now_ms
+from .main import Parser, RespError, Serializer, serialize
+
+MAGIC = b"PYRDB"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+TYPE_STRING = 0
+TYPE_LIST = 1
+TYPE_HASH = 2
+TYPE_SET = 3
+TYPE_PACKED_LIST = 4
+TYPE_PACKED_HASH = 5
+TYPE_PACKED_SET = 6
+TYPE_INTSET = 7
+TYPE_EOF = 0xFF
+
+_PACKED_TYPES = {PackedList: TYPE_PACKED_LIST, PackedHash: TYPE_PACKED_HASH, PackedSet: TYPE_PACKED_SET}
+_PACKED_CLASSES = {type_code: cls for cls, type_code in _PACKED_TYPES.items()}
+
+_HEADER = struct.Struct("<5sH")
+_RECORD = struct.Struct("<BqI")
+_LENGTH = struct.Struct("<I")
+_CHECKSUM = struct.Struct("<I")
+
+FSYNC_POLICIES = ("always", "everysec", "no")
+WRITE_CHUNK_SIZE = 1 << 20
+AOF_LOAD_CHUNK_SIZE = 1 << 20
+AUTO_REWRITE_MIN_SIZE = 64 * 1024 * 1024
+AUTO_REWRITE_GROWTH = 2
+
+
+class PersistenceError(Exception):
+    pass
+
+
+class _ChecksummedWriter:
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buffer = bytearray()
+        self.crc = 0
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) >= WRITE_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.crc = zlib.crc32(self.buffer, self.crc)
+        self.fp.write(self.buffer)
+        self.buffer.clear()
+
+
+def write_snapshot(keyspace: Keyspace, fp) -> None:
+    writer = _ChecksummedWriter(fp)
+    write = writer.write
+    pack_record = _RECORD.pack
+    pack_length = _LENGTH.pack
+    expires = keyspace.expires
+    write(_HEADER.pack(MAGIC, VERSION))
+    for key, value in keyspace.data.items():
+        expire = expires.get(key, -1)
+        value_type = type(value)
+        if value_type is bytes:
+            write(pack_record(TYPE_STRING, expire, len(key)))
+            write(key)
+            write(pack_length(len(value)))
+            write(value)
+        elif value_type in _PACKED_TYPES:
+            write(pack_record(_PACKED_TYPES[value_type], expire, len(key)))
+            write(key)
+            write(pack_length(len(value)))
+            write(value)
+        elif value_type is IntSet:
+            write(pack_record(TYPE_INTSET, expire, len(key)))
+            write(key)
+            data = value.tobytes()
+            write(value.typecode.encode())
+            write(pack_length(len(data)))
+            write(data)
+        else:
+            if value_type is dict:
+                type_code, items = TYPE_HASH, [item for pair in value.items() for item in pair]
+            else:
+                type_code, items = (TYPE_LIST if value_type is deque else TYPE_SET), value
+            write(pack_record(type_code, expire, len(key)))
+            write(key)
+            write(pack_length(len(value)))
+            for item in items:
+                write(pack_length(len(item)))
+                write(item)
+    write(bytes([TYPE_EOF]))
+    writer.flush()
+    fp.write(_CHECKSUM.pack(writer.crc))
+
+
+def save_snapshot(keyspace: Keyspace, path: str) -> None:
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, "wb") as fp:
+        write_snapshot(keyspace, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temp_path, path)
+
+
+def load_snapshot(keyspace: Keyspace, data) -> int:
+    """Load a snapshot from the start of a buffer and return its length."""
+    if len(data) < _HEADER.size or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise PersistenceError("Not a snapshot")
+    _, version = _HEADER.unpack_from(data, 0)
+    if version not in SUPPORTED_VERSIONS:
+        raise PersistenceError(f"Unsupported snapshot version {version}")
+
+    unpack_record = _RECORD.unpack_from
+    unpack_length = _LENGTH.unpack_from
+    now = now_ms()
+    position = _HEADER.size
+    try:
+        while data[position] != TYPE_EOF:
+            value_type, expire, key_length = unpack_record(data, position)
+            position += _RECORD.size
+            key = bytes(data[position:position + key_length])
+            position += key_length
+            if value_type == TYPE_STRING:
+                value_length, = unpack_length(data, position)
+                position += 4
+                value = bytes(data[position:position + value_length])
+                position += value_length
+            elif value_type in _PACKED_CLASSES:
+                blob_length, = unpack_length(data, position)
+                position += 4
+                value = _PACKED_CLASSES[value_type](data[position:position + blob_length])
+                position += blob_length
+            elif value_type == TYPE_INTSET:
+                typecode = chr(data[position])
+                blob_length, = unpack_length(data, position + 1)
+                position += 5
+                value = IntSet(typecode)
+                value.frombytes(data[position:position + blob_length])
+                position += blob_length
+            elif value_type in (TYPE_LIST, TYPE_HASH, TYPE_SET):
+                count, = unpack_length(data, position)
+                position += 4
+                if value_type == TYPE_HASH:
+                    count *= 2
+                items = []
+                append = items.append
+                for _ in range(count):
+                    item_length, = unpack_length(data, position)
+                    position += 4
+                    append(bytes(data[position:position + item_length]))
+                    position += item_length
+                if value_type == TYPE_LIST:
+                    value = deque(items)
+                elif value_type == TYPE_SET:
+                    value = set(items)
+                else:
+                    value = dict(zip(items[::2], items[1::2]))
+            else:
+                raise PersistenceError(f"Unknown value type {value_type}")
+            if expire != -1 and expire <= now:
+                continue
+            keyspace.set(key, value)
+            if expire != -1:
+                keyspace.expire_at(key, expire)
+        checksum, = _CHECKSUM.unpack_from(data, position + 1)
+    except (IndexError, struct.error):
+        raise PersistenceError("Truncated snapshot")
+    with memoryview(data) as view, view[:position + 1] as body:
+        crc = zlib.crc32(body)
+    if crc != checksum:
+        raise PersistenceError("Snapshot checksum mismatch")
+    return position + 1 + _CHECKSUM.size
+
+
+def _write_all(fd: int, data) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _map_file(path: str):
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class AppendOnlyFile:
+    """
+    Write commands are serialized into a buffer which is written out once per
+    event loop iteration. With "always" the server also calls `flush()`
+    before sending replies, and every flush is fsynced. With "everysec" the
+    fsync runs in a worker thread once a second, so disk latency never
+    blocks the event loop.
+    """
+
+    def __init__(self, path: str, fsync_policy: str = "everysec"):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid appendfsync: {fsync_policy}")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.serializer = Serializer()
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.size = os.fstat(self.fd).st_size
+        self.base_size = self.size
+        self.rewrite_buffer = None
+        self._flush_scheduled = False
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._fsync_future = None
+
+    def feed(self, request: list) -> None:
+        self.serializer.write(request)
+        if self.rewrite_buffer is not None:
+            self.rewrite_buffer += serialize(request)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        chunks = self.serializer.take()
+        if not chunks:
+            return
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        _write_all(self.fd, data)
+        self.size += len(data)
+        if self.fsync_policy == "always":
+            os.fsync(self.fd)
+        else:
+            self._dirty = True
+
+    def cron(self) -> None:
+        if self.fsync_policy != "everysec" or not self._dirty or self._fsync_future is not None:
+            return
+        if time.monotonic() - self._last_fsync < 1:
+            return
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._fsync_future = asyncio.get_running_loop().run_in_executor(None, os.fsync, self.fd)
+        self._fsync_future.add_done_callback(self._fsync_done)
+
+    def _fsync_done(self, future) -> None:
+        self._fsync_future = None
+
+    def needs_rewrite(self) -> bool:
+        return self.size >= AUTO_REWRITE_MIN_SIZE and self.size >= AUTO_REWRITE_GROWTH * self.base_size
+
+    def start_rewrite(self) -> None:
+        self.flush()
+        self.rewrite_buffer = bytearray()
+
+    def finish_rewrite(self, temp_path: str) -> None:
+        self.flush()
+        with open(temp_path, "ab") as fp:
+            fp.write(self.rewrite_buffer)
+            fp.flush()
+            os.fsync(fp.fileno())
+        self.rewrite_buffer = None
+        os.replace(temp_path, self.path)
+        old_fd = self.fd
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.size = self.base_size = os.fstat(self.fd).st_size
+        if self._fsync_future is not None:
+            self._fsync_future.add_done_callback(lambda _: os.close(old_fd))
+        else:
+            os.close(old_fd)
+
+    def abort_rewrite(self) -> None:
+        self.rewrite_buffer = None
+
+    def close(self) -> None:
+        self.flush()
+        os.fsync(self.fd)
+        os.close(self.fd)
+
+
+class Persistence:
+    """
+    Owns the snapshot file and the optional append only file. Background
+    saves and rewrites fork a child, which writes a point in time copy of the
+    dataset while the parent keeps serving; `cron()` reaps it.
+    """
+
+    def __init__(self, keyspace: Keyspace, dbfilename: str = "dump.rdb", appendonly: bool = False,
+                 appendfilename: str = "appendonly.aof", appendfsync: str = "everysec"):
+        self.keyspace = keyspace
+        self.dbfilename = dbfilename
+        self.appendfilename = appendfilename
+        self.appendfsync = appendfsync
+        self.aof = None
+        self.appendonly = appendonly
+        self.last_save = int(time.time())
+        self.child_pid = None
+        self.child_kind = None
+        self.child_path = None
+        keyspace.persistence = self
+
+    def load(self) -> None:
+        if self.appendonly and os.path.exists(self.appendfilename):
+            self.load_append_only_file(self.appendfilename)
+        elif os.path.exists(self.dbfilename):
+            data = _map_file(self.dbfilename)
+            try:
+                load_snapshot(self.keyspace, data)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        if self.appendonly:
+            if not os.path.exists(self.appendfilename) and len(self.keyspace):
+                # Turning on appendonly over an existing snapshot; start the
+                # log from that data or the next restart would lose it
+                save_snapshot(self.keyspace, self.appendfilename)
+            self.aof = AppendOnlyFile(self.appendfilename, self.appendfsync)
+            self.keyspace.propagate = self.aof.feed
+
+    def flush_before_reply(self) -> None:
+        if self.aof is not None and self.aof.fsync_policy == "always":
+            self.aof.flush()
+
+    def load_append_only_file(self, path: str) -> None:
+        """Replay the log into the keyspace. Every command in it was accepted
+        once, so the replay runs without the memory limit, which could
+        otherwise refuse writes or evict keys part way through; a command
+        that fails all the same means the log is damaged."""
+        data = _map_file(path)
+        keyspace = self.keyspace
+        maxmemory = keyspace.maxmemory
+        keyspace.maxmemory = 0
+        try:
+            position = 0
+            if bytes(data[:len(MAGIC)]) == MAGIC:
+                position = load_snapshot(keyspace, data)
+            parser = Parser()
+            for start in range(position, len(data), AOF_LOAD_CHUNK_SIZE):
+                for request in parser.feed(data[start:start + AOF_LOAD_CHUNK_SIZE]):
+                    reply = execute(keyspace, request)
+                    if isinstance(reply, RespError):
+                        raise PersistenceError(f"Bad command in the append only file {path}: {reply}")
+            if parser.buffer:
+                # A write cut short by a crash; redis-server drops it as well
+                print(f"Ignoring {len(parser.buffer)} bytes of truncated AOF tail")
+        finally:
+            keyspace.maxmemory = maxmemory
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def _fork(self, kind: str, path: str) -> bool:
+        if self.child_pid is not None:
+            return False
+        if not hasattr(os, "fork"):
+            save_snapshot(self.keyspace, path)
+            self._child_done(kind, path, succeeded=True)
+            return True
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                if kind == "aof":
+                    with open(path, "wb") as fp:
+                        write_snapshot(self.keyspace, fp)
+                        fp.flush()
+                        os.fsync(fp.fileno())
+                else:
+                    save_snapshot(self.keyspace, path)
+                exit_code = 0
+            except Exception as err:
+                print(f"Background {kind} save failed: {type(err).__name__}: {err}")
+            finally:
+                os._exit(exit_code)
+        self.child_pid, self.child_kind, self.child_path = pid, kind, path
+        return True
+
+    def _child_done(self, kind: str, path: str, succeeded: bool) -> None:
+        if kind == "aof":
+            if succeeded:
+                self.aof.finish_rewrite(path)
+            else:
+                self.aof.abort_rewrite()
+        elif succeeded:
+            self.last_save = int(time.time())
+
+    def save(self) -> None:
+        save_snapshot(self.keyspace, self.dbfilename)
+        self.last_save = int(time.time())
+
+    def background_save(self) -> bool:
+        return self._fork("rdb", self.dbfilename)
+
+    def background_rewrite(self) -> bool:
+        if self.aof is None or self.child_pid is not None:
+            return False
+        self.aof.start_rewrite()
+        return self._fork("aof", f"{self.appendfilename}.rewrite-{os.getpid()}")
+
+    def cron(self) -> None:
+        if self.child_pid is not None:
+            pid, status = os.waitpid(self.child_pid, os.WNOHANG)
+            if pid:
+                kind, path = self.child_kind, self.child_path
+                self.child_pid = self.child_kind = self.child_path = None
+                self._child_done(kind, path, os.waitstatus_to_exitcode(status) == 0)
+        if self.aof is not None:
+            self.aof.cron()
+            if self.child_pid is None and self.aof.needs_rewrite():
+                self.background_rewrite()
+
+    def close(self) -> None:
+        if self.aof is not None:
+            self.aof.close()
+
+
+def _persistence(keyspace: Keyspace) -> Persistence:
+    persistence = keyspace.persistence
+    if persistence is None:
+        raise CommandError("ERR persistence is not configured")
+    return persistence
+
+
+@command("SAVE", 1)
+def save(keyspace, args):
+    persistence = _persistence(keyspace)
+    if persistence.child_pid is not None:
+        raise CommandError("ERR Background save already in progress")
+    persistence.save()
+    return "OK"
+
+
+@command("BGSAVE", 1)
+def bgsave(keyspace, args):
+    if not _persistence(keyspace).background_save():
+        raise CommandError("ERR Background save already in progress")
+    return "Background saving started"
+
+
+@command("BGREWRITEAOF", 1)
+def bgrewriteaof(keyspace, args):
+    persistence = _persistence(keyspace)
+    if persistence.aof is None:
+        raise CommandError("ERR appendonly is disabled")
+    if not persistence.background_rewrite():
+        raise CommandError("ERR Background save or rewrite already in progress")
+    return "Background append only file rewriting started"
+
+
+@command("LASTSAVE", 1)
+def lastsave(keyspace, args):
+    return _persistence(keyspace).last_save
@@ -0,0 +1,250 @@
+"""
+Pub/Sub and keyspace notifications.
+
+Subscribers are indexed by channel, and every pattern subscription keeps its
+glob compiled to a regex. A published message is serialized once and the
+same bytes are queued on each receiving client; queues are written out once
+per event loop iteration, so a burst of messages costs each subscriber a
+single write. A subscriber whose pending output passes OUTPUT_HARD_LIMIT, or
+stays above OUTPUT_SOFT_LIMIT for OUTPUT_SOFT_SECONDS, is disconnected, like
+redis-server's client-output-buffer-limit for pubsub clients.
+"""
+import asyncio
+import re
+import time
+
+from .commands import CONFIG_PARAMETERS, CommandError, command
+from .main import RespError, serialize
+
+OUTPUT_HARD_LIMIT = 32 * 1024 * 1024
+OUTPUT_SOFT_LIMIT = 8 * 1024 * 1024
+OUTPUT_SOFT_SECONDS = 60
+
+SUBSCRIBE_COMMANDS = (b"SUBSCRIBE", b"UNSUBSCRIBE", b"PSUBSCRIBE", b"PUNSUBSCRIBE")
+SUBSCRIBED_CONTEXT_COMMANDS = SUBSCRIBE_COMMANDS + (b"PING", b"QUIT", b"RESET")
+
+# Keyspace event names and classes for the write commands, as in redis-server
+KEYSPACE_EVENTS = {
+    b"SET": ("set", "$"),
+    b"INCR": ("incrby", "$"),
+    b"DECR": ("incrby", "$"),
+    b"DEL": ("del", "g"),
+    b"EXPIRE": ("expire", "g"),
+    b"PEXPIRE": ("expire", "g"),
+    b"EXPIREAT": ("expire", "g"),
+    b"PEXPIREAT": ("expire", "g"),
+    b"PERSIST": ("persist", "g"),
+    b"LPUSH": ("lpush", "l"),
+    b"RPUSH": ("rpush", "l"),
+    b"HSET": ("hset", "h"),
+    b"HDEL": ("hdel", "h"),
+    b"SADD": ("sadd", "s"),
+    b"SREM": ("srem", "s"),
+}
+EVENT_CLASSES = "g$lshxe"
+
+
+class MultiReply(list):
+    """Several replies to one command, e.g. one per channel subscribed."""
+
+
+def compile_pattern(pattern: bytes) -> re.Pattern:
+    """Translate a redis glob (*, ?, [...], [^...] and \\ escapes) to a regex."""
+    parts = []
+    position, end = 0, len(pattern)
+    while position < end:
+        char = pattern[position:position + 1]
+        if char == b"*":
+            parts.append(b".*")
+        elif char == b"?":
+            parts.append(b".")
+        elif char == b"\\" and position + 1 < end:
+            position += 1
+            parts.append(re.escape(pattern[position:position + 1]))
+        elif char == b"[" and pattern.find(b"]", position + 2) != -1:
+            close = pattern.find(b"]", position + 2)
+            body = pattern[position + 1:close]
+            negate = body.startswith(b"^")
+            if negate:
+                body = body[1:]
+            escaped = b"".join(b"-" if byte == 45 else re.escape(bytes([byte])) for byte in body)
+            parts.append(b"[" + (b"^" if negate else b"") + escaped + b"]")
+            position = close
+        else:
+            parts.append(re.escape(char))
+        position += 1
+    return re.compile(b"".join(parts), re.DOTALL)
+
+
+def parse_notify_flags(value: str) -> str:
+    flags = ""
+    for flag in value:
+        if flag == "A":
+            flags += EVENT_CLASSES
+        elif flag in "KE" + EVENT_CLASSES:
+            flags += flag
+        else:
+            raise ValueError(f"Invalid notify-keyspace-events: {value}")
+    if flags and "K" not in flags and "E" not in flags:
+        # Event classes without a K or E target deliver nothing
+        return ""
+    return "".join(sorted(set(flags)))
+
+
+class PubSub:
+
+    def __init__(self):
+        self.channels: dict[bytes, set] = {}
+        self.patterns: dict[bytes, tuple[re.Pattern, set]] = {}
+        self.notify_flags = ""
+        self._pending = set()
+        self._flush_scheduled = False
+
+    def execute(self, client, request: list):
+        """Run one of SUBSCRIBE_COMMANDS for a client connection."""
+        name = request[0].upper()
+        targets = request[1:]
+        if name in (b"SUBSCRIBE", b"PSUBSCRIBE") and not targets:
+            return RespError(f"ERR wrong number of arguments for '{name.decode().lower()}' command")
+        if name == b"SUBSCRIBE":
+            return MultiReply(self.subscribe(client, channel) for channel in targets)
+        if name == b"PSUBSCRIBE":
+            return MultiReply(self.psubscribe(client, pattern) for pattern in targets)
+        if name == b"UNSUBSCRIBE":
+            targets = targets or list(client.channels)
+            if not targets:
+                return [b"unsubscribe", None, 0]
+            return MultiReply(self.unsubscribe(client, channel) for channel in targets)
+        targets = targets or list(client.patterns)
+        if not targets:
+            return [b"punsubscribe", None, 0]
+        return MultiReply(self.punsubscribe(client, pattern) for pattern in targets)
+
+    @staticmethod
+    def subscription_count(client) -> int:
+        return len(client.channels) + len(client.patterns)
+
+    def subscribe(self, client, channel: bytes) -> list:
+        if channel not in client.channels:
+            client.channels.add(channel)
+            self.channels.setdefault(channel, set()).add(client)
+        return [b"subscribe", channel, self.subscription_count(client)]
+
+    def unsubscribe(self, client, channel: bytes) -> list:
+        if channel in client.channels:
+            client.channels.discard(channel)
+            subscribers = self.channels[channel]
+            subscribers.discard(client)
+            if not subscribers:
+                del self.channels[channel]
+        return [b"unsubscribe", channel, self.subscription_count(client)]
+
+    def psubscribe(self, client, pattern: bytes) -> list:
+        if pattern not in client.patterns:
+            client.patterns.add(pattern)
+            if pattern not in self.patterns:
+                self.patterns[pattern] = (compile_pattern(pattern), set())
+            self.patterns[pattern][1].add(client)
+        return [b"psubscribe", pattern, self.subscription_count(client)]
+
+    def punsubscribe(self, client, pattern: bytes) -> list:
+        if pattern in client.patterns:
+            client.patterns.discard(pattern)
+            subscribers = self.patterns[pattern][1]
+            subscribers.discard(client)
+            if not subscribers:
+                del self.patterns[pattern]
+        return [b"punsubscribe", pattern, self.subscription_count(client)]
+
+    def disconnect(self, client) -> None:
+        for channel in list(client.channels):
+            self.unsubscribe(client, channel)
+        for pattern in list(client.patterns):
+            self.punsubscribe(client, pattern)
+        self._pending.discard(client)
+
+    def publish(self, channel: bytes, message: bytes) -> int:
+        receivers = 0
+        subscribers = self.channels.get(channel)
+        if subscribers:
+            data = serialize([b"message", channel, message])
+            for client in list(subscribers):
+                if self._deliver(client, data):
+                    receivers += 1
+        for pattern, (matcher, subscribers) in list(self.patterns.items()):
+            if matcher.fullmatch(channel):
+                data = serialize([b"pmessage", pattern, channel, message])
+                for client in list(subscribers):
+                    if self._deliver(client, data):
+                        receivers += 1
+        return receivers
+
+    def _deliver(self, client, data: bytes) -> bool:
+        """Queue `data` for `client`; False if it was not, as the client
+        is gone or was just dropped for being too slow."""
+        if client.transport is None or client.transport.is_closing():
+            return False
+        client.outbox.append(data)
+        client.outbox_size += len(data)
+        pending = client.outbox_size + client.transport.get_write_buffer_size()
+        if pending > OUTPUT_HARD_LIMIT or self._over_soft_limit(client, pending):
+            print(f"Closing slow subscriber with {pending} bytes of pending output")
+            self.disconnect(client)
+            client.outbox.clear()
+            client.transport.abort()
+            return False
+        self._pending.add(client)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return True
+
+    @staticmethod
+    def _over_soft_limit(client, pending: int) -> bool:
+        if pending <= OUTPUT_SOFT_LIMIT:
+            client.soft_limit_since = None
+            return False
+        if client.soft_limit_since is None:
+            client.soft_limit_since = time.monotonic()
+            return False
+        return time.monotonic() - client.soft_limit_since > OUTPUT_SOFT_SECONDS
+
+    def flush(self) -> None:
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, set()
+        for client in pending:
+            client.flush_outbox()
+
+    def notify(self, event: str, key: bytes, event_class: str) -> None:
+        flags = self.notify_flags
+        if event_class not in flags:
+            return
+        if "K" in flags:
+            self.publish(b"__keyspace@0__:" + key, event.encode())
+        if "E" in flags:
+            self.publish(b"__keyevent@0__:" + event.encode(), key)
+
+    def notify_command(self, name: bytes, keys: list) -> None:
+        event = KEYSPACE_EVENTS.get(name)
+        if event is not None:
+            for key in keys:
+                self.notify(event[0], key, event[1])
+
+
+@command("PUBLISH", 3)
+def publish(keyspace, args):
+    if keyspace.pubsub is None:
+        raise CommandError("ERR pub/sub is not available")
+    return keyspace.pubsub.publish(args[0], args[1])
+
+
+def _set_notify_flags(keyspace, value: str) -> None:
+    if keyspace.pubsub is None:
+        raise ValueError("pub/sub is not available")
+    keyspace.pubsub.notify_flags = parse_notify_flags(value)
+
+
+CONFIG_PARAMETERS["notify-keyspace-events"] = (
+    lambda keyspace: keyspace.pubsub.notify_flags if keyspace.pubsub is not None else "",
+    _set_notify_flags,
+)
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import time
+
+from .commands import execute
+from .keyspace import EVICTION_POLICIES, Keyspace, parse_memory
+from .main import Parser, RespError, RespProtocolException, Serializer, serialize
+from .persistence import FSYNC_POLICIES, Persistence
+from .pubsub import SUBSCRIBE_COMMANDS, SUBSCRIBED_CONTEXT_COMMANDS, MultiReply, PubSub
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 6379
+BACKLOG = 4096
+
+# Like redis-server's hz: run the active expire cycle ten times a second with
+# a small time budget, and come back sooner while there is a backlog.
+ACTIVE_EXPIRE_INTERVAL = 0.1
+ACTIVE_EXPIRE_BUSY_INTERVAL = 0.01
+ACTIVE_EXPIRE_BUDGET = 0.002
+
+
+class RedisProtocol(asyncio.Protocol):
+    """
+    One instance per client connection. Every frame in a read is executed
+    before anything is written back, so a pipelined batch costs one write.
+    Pub/Sub messages for the client are queued in `outbox` by `PubSub`.
+    """
+
+    def __init__(self, keyspace: Keyspace):
+        self.keyspace = keyspace
+        self.parser = Parser()
+        self.serializer = Serializer()
+        self.transport = None
+        self.channels = set()
+        self.patterns = set()
+        self.outbox = []
+        self.outbox_size = 0
+        self.soft_limit_since = None
+        # Set by QUIT: nothing more is run, and the connection is closed
+        # once the replies so far are written
+        self.quitting = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        if self.keyspace.pubsub is not None:
+            self.keyspace.pubsub.disconnect(self)
+
+    def execute(self, request: list):
+        name = request[0].upper() if isinstance(request, list) and isinstance(request[0], bytes) else None
+        if name in SUBSCRIBE_COMMANDS and self.keyspace.pubsub is not None:
+            return self.keyspace.pubsub.execute(self, request)
+        if name == b"QUIT":
+            self.quitting = True
+            return "OK"
+        if name == b"RESET":
+            if self.keyspace.pubsub is not None:
+                self.keyspace.pubsub.disconnect(self)
+            return "RESET"
+        subscribed = self.channels or self.patterns
+        if subscribed and name == b"PING":
+            if len(request) > 2:
+                return RespError("ERR wrong number of arguments for 'ping' command")
+            # A subscribed client can only be sent arrays, as messages are
+            return [b"pong", request[1] if len(request) > 1 else b""]
+        if subscribed and name not in SUBSCRIBED_CONTEXT_COMMANDS:
+            if name is not None:
+                shown = name.decode(errors="replace")
+            else:
+                # Not an array of bulk strings, so there is no name to go by
+                shown = str(request[0] if isinstance(request, list) else request)
+            return RespError(
+                f"ERR Can't execute '{shown.lower()}': only (P)SUBSCRIBE / "
+                "(P)UNSUBSCRIBE / PING / QUIT / RESET are allowed in this context"
+            )
+        return execute(self.keyspace, request)
+
+    def data_received(self, data):
+        if self.quitting:
+            return
+        try:
+            requests = self.parser.feed(data)
+        except RespProtocolException as err:
+            self.transport.write(serialize(RespError(f"ERR Protocol error: {err}")))
+            self.transport.close()
+            return
+        keyspace = self.keyspace
+        write = self.serializer.write
+        for request in requests:
+            if not request:
+                continue
+            reply = self.execute(request)
+            if type(reply) is MultiReply:
+                for item in reply:
+                    write(item)
+            else:
+                write(reply)
+            if self.quitting:
+                break
+        if keyspace.persistence is not None:
+            keyspace.persistence.flush_before_reply()
+        self.flush()
+        if self.quitting:
+            self.transport.close()
+
+    def flush_outbox(self):
+        if self.outbox and not self.transport.is_closing():
+            self.transport.writelines(self.outbox)
+        self.outbox = []
+        self.outbox_size = 0
+
+    def flush(self):
+        # Messages published before this reply was made go out first
+        if self.outbox:
+            self.flush_outbox()
+        chunks = self.serializer.take()
+        if len(chunks) == 1:
+            self.transport.write(chunks[0])
+        elif chunks:
+            self.transport.writelines(chunks)
+
+    def pause_writing(self):
+        # The client is not reading its replies; stop reading its requests
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+
+async def cron(keyspace: Keyspace):
+    while True:
+        keyspace.update_clock()
+        busy = keyspace.active_expire_cycle(ACTIVE_EXPIRE_BUDGET)
+        if keyspace.persistence is not None:
+            keyspace.persistence.cron()
+        await asyncio.sleep(ACTIVE_EXPIRE_BUSY_INTERVAL if busy else ACTIVE_EXPIRE_INTERVAL)
+
+
+async def serve(host: str, port: int, keyspace: Keyspace = None):
+    keyspace = Keyspace() if keyspace is None else keyspace
+    if keyspace.pubsub is None:
+        keyspace.pubsub = PubSub()
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(
+        lambda: RedisProtocol(keyspace),
+        host=host,
+        port=port,
+        backlog=BACKLOG,
+        reuse_address=True
+    )
+    print(f"Ready to accept connections on {host}:{port}")
+    cron_task = asyncio.create_task(cron(keyspace))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        cron_task.cancel()
+
+
+def parse_commandline_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--maxmemory", type=parse_memory, default=0, help="e.g. 512mb, 0 for no limit")
+    parser.add_argument("--maxmemory-policy", choices=EVICTION_POLICIES, default="noeviction")
+    parser.add_argument("--dbfilename", default="dump.rdb")
+    parser.add_argument("--appendonly", action="store_true", help="log every write to the append only file")
+    parser.add_argument("--appendfilename", default="appendonly.aof")
+    parser.add_argument("--appendfsync", choices=FSYNC_POLICIES, default="everysec")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_commandline_arguments()
+    if uvloop is not None:
+        uvloop.install()
+    keyspace = Keyspace(args.maxmemory, args.maxmemory_policy)
+    persistence = Persistence(
+        keyspace,
+        dbfilename=args.dbfilename,
+        appendonly=args.appendonly,
+        appendfilename=args.appendfilename,
+        appendfsync=args.appendfsync
+    )
+    started = time.perf_counter()
+    persistence.load()
+    print(f"Loaded {len(keyspace)} keys in {time.perf_counter() - started:.3f} seconds")
+    try:
+        asyncio.run(serve(args.host, args.port, keyspace))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        persistence.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+from .cluster import (CROSS_SHARD, HASH_SLOTS, PEER_PORT_OFFSET, Router, crc16, key_hash_slot, serve_worker,
+                      slot_owners)
+from .commands import CommandError
+from .main import Parser, RespError, serialize
+
+HOST = "127.0.0.1"
+
+
+def free_port(workers: int) -> int:
+    """A port that is free along with the peer ports of its workers."""
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        if port + PEER_PORT_OFFSET + workers > 65535:
+            continue
+        try:
+            for target in [port] + [port + PEER_PORT_OFFSET + worker for worker in range(workers)]:
+                with socket.socket() as probe:
+                    probe.bind((HOST, target))
+        except OSError:
+            continue
+        return port
+
+
+class TestSlots(unittest.TestCase):
+    def test_key_hash_slot(self):
+        self.assertEqual(crc16(b"123456789"), 0x31C3)
+        self.assertEqual(key_hash_slot(b"foo"), 12182)
+        self.assertEqual(key_hash_slot(b"{user1000}.following"), key_hash_slot(b"{user1000}.followers"))
+        self.assertEqual(key_hash_slot(b"{user1000}.following"), key_hash_slot(b"user1000"))
+        # An empty tag hashes the whole key, and only the first tag counts
+        self.assertEqual(key_hash_slot(b"foo{}{bar}"), crc16(b"foo{}{bar}") % HASH_SLOTS)
+        self.assertEqual(key_hash_slot(b"foo{{bar}}zap"), key_hash_slot(b"{bar"))
+
+    def test_slot_owners(self):
+        owners = slot_owners(3)
+        self.assertEqual(len(owners), HASH_SLOTS)
+        self.assertEqual(list(owners), sorted(owners))
+        self.assertEqual([owners.count(worker) for worker in range(3)], [5462, 5461, 5461])
+
+    def test_router_owner(self):
+        router = Router(0, 4, HOST, 0)
+        self.assertIsNone(router.owner([b"PING"]))
+        self.assertEqual(router.owner([b"GET", b"foo"]), router.owners[12182])
+        self.assertEqual(router.owner([b"MGET", b"{a}1", b"{a}2"]), router.owners[key_hash_slot(b"a")])
+        keys = [b"key%d" % number for number in range(20)]
+        with self.assertRaisesRegex(CommandError, "CROSSSLOT"):
+            router.owner([b"MGET", *keys])
+
+
+class TestPeerLink(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_connect(self):
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def never_connect(*args, **kwargs):
+            await asyncio.Event().wait()
+
+        router = Router(0, 2, HOST, free_port(2))
+        running = asyncio.all_tasks()
+        with mock.patch.object(loop, "create_connection", never_connect):
+            reply = router.forward(1, [b"GET", b"foo"])
+        await asyncio.sleep(0)
+        for task in asyncio.all_tasks() - running:
+            task.cancel()
+        self.assertEqual(await asyncio.wait_for(reply, 5), RespError("ERR shard unavailable"))
+        self.assertTrue(router.links[1].closed)
+        self.assertEqual(errors, [])
+
+
+class TestShardedServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.workers = 2
+        self.port = free_port(self.workers)
+        self.tasks = [asyncio.create_task(serve_worker(worker, self.workers, HOST, self.port))
+                      for worker in range(self.workers)]
+        await asyncio.sleep(0.1)
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def request(self, requests: list, port: int = None) -> list:
+        reader, writer = await asyncio.open_connection(HOST, port or self.port)
+        writer.write(b"".join(map(serialize, requests)))
+        parser = Parser()
+        replies = []
+        while len(replies) < len(requests):
+            replies += parser.feed(await reader.read(65536))
+        writer.close()
+        await writer.wait_closed()
+        return replies
+
+    async def test_forwarding_keeps_order(self):
+        keys = [b"key%d" % number for number in range(200)]
+        requests = [[b"SET", key, key[::-1]] for key in keys] + [[b"GET", key] for key in keys] + [[b"PING"]]
+        for _ in range(4):
+            # Connections land on either worker
+            replies = await self.request(requests)
+            self.assertEqual(replies, ["OK"] * 200 + [key[::-1] for key in keys] + ["PONG"])
+        # Each key is stored on its owner alone
+        owners = slot_owners(self.workers)
+        for worker in range(self.workers):
+            port = self.port + PEER_PORT_OFFSET + worker
+            replies = await self.request([[b"EXISTS", key] for key in keys], port)
+            self.assertEqual(replies, [int(owners[key_hash_slot(key)] == worker) for key in keys])
+
+    async def test_multi_key_commands(self):
+        await self.request([[b"SET", b"{user}:a", b"1"], [b"SET", b"{user}:b", b"2"]])
+        replies = await self.request([[b"MGET", b"{user}:a", b"{user}:b"],
+                                      [b"MGET", *[b"key%d" % number for number in range(20)]],
+                                      [b"CLUSTER", b"KEYSLOT", b"foo"]])
+        self.assertEqual(replies, [[b"1", b"2"], RespError(CROSS_SHARD), 12182])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from .commands import WRONG_TYPE, command_keys, execute
+from .keyspace import Keyspace
+from .main import Parser, RespError
+from .server import RedisProtocol
+
+
+class TestCommands(unittest.TestCase):
+    def setUp(self):
+        self.keyspace = Keyspace()
+
+    def run_command(self, *args):
+        return execute(self.keyspace, [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
+
+    def test_strings(self):
+        self.assertEqual(self.run_command("PING"), "PONG")
+        self.assertEqual(self.run_command("ping", "hi"), b"hi")
+        self.assertEqual(self.run_command("SET", "a", "1"), "OK")
+        self.assertEqual(self.run_command("GET", "a"), b"1")
+        self.assertEqual(self.run_command("INCR", "a"), 2)
+        self.assertEqual(self.run_command("DECR", "new"), -1)
+        self.assertEqual(self.run_command("MGET", "a", "missing", "new"), [b"2", None, b"-1"])
+        self.assertIsNone(self.run_command("SET", "a", "x", "NX"))
+        self.assertIsNone(self.run_command("SET", "b", "x", "XX"))
+        self.assertEqual(self.run_command("EXISTS", "a", "b", "a"), 2)
+        self.assertEqual(self.run_command("DEL", "a", "b"), 1)
+        self.assertIsNone(self.run_command("GET", "a"))
+
+    def test_collections(self):
+        self.assertEqual(self.run_command("RPUSH", "l", "b", "c"), 2)
+        self.assertEqual(self.run_command("LPUSH", "l", "a"), 3)
+        self.assertEqual(self.run_command("LRANGE", "l", "0", "-1"), [b"a", b"b", b"c"])
+        self.assertEqual(self.run_command("LRANGE", "l", "-2", "10"), [b"b", b"c"])
+        self.assertEqual(self.run_command("LRANGE", "l", "2", "1"), [])
+        self.assertEqual(self.run_command("HSET", "h", "f", "1", "g", "2"), 2)
+        self.assertEqual(self.run_command("HGET", "h", "g"), b"2")
+        self.assertEqual(self.run_command("HDEL", "h", "f", "g"), 2)
+        self.assertEqual(self.run_command("EXISTS", "h"), 0)
+        self.assertEqual(self.run_command("SADD", "s", "x", "y", "x"), 2)
+        self.assertEqual(self.run_command("SISMEMBER", "s", "y"), 1)
+        self.assertEqual(self.run_command("SCARD", "s"), 2)
+
+    def test_errors(self):
+        self.run_command("SET", "a", "x")
+        self.assertEqual(self.run_command("LPUSH", "a", "1"), RespError(WRONG_TYPE))
+        self.assertEqual(self.run_command("INCR", "a"), RespError("ERR value is not an integer or out of range"))
+        self.assertEqual(self.run_command("GET"), RespError("ERR wrong number of arguments for 'get' command"))
+        self.assertEqual(self.run_command("NOPE", "x"), RespError("ERR unknown command 'NOPE'"))
+        self.assertEqual(self.run_command("SET", "a", "x", "EX", "0"),
+                         RespError("ERR invalid expire time in 'set' command"))
+        self.assertEqual(self.run_command("SET", "a", "x", "NX", "XX"), RespError("ERR syntax error"))
+        self.assertIsInstance(execute(self.keyspace, [1]), RespError)
+
+    def test_command_keys(self):
+        self.assertEqual(command_keys([b"MGET", b"a", b"b"]), [b"a", b"b"])
+        self.assertEqual(command_keys([b"object", b"ENCODING", b"k"]), [b"k"])
+        self.assertEqual(command_keys([b"PING"]), [])
+        self.assertEqual(command_keys([b"NOPE", b"k"]), [])
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def test_pipelined_requests(self):
+        keyspace = Keyspace()
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: RedisProtocol(keyspace), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n" * 100 + b"GET k\r\n")
+        parser = Parser()
+        replies = []
+        while len(replies) < 101:
+            replies += parser.feed(await reader.read(65536))
+        self.assertEqual(replies, ["OK"] * 100 + [b"v"])
+        # A malformed frame gets an error and the connection is closed
+        writer.write(b"*1\r\n$x\r\n")
+        self.assertTrue((await reader.read()).startswith(b"-ERR Protocol error"))
+        writer.close()
+        await writer.wait_closed()
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    unittest.main()
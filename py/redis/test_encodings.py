@@ -0,0 +1,113 @@
+import random
+import unittest
+
+from .commands import execute
+from .encodings import ENCODING_LIMITS
+from .keyspace import Keyspace, sizeof_entry
+
+
+class TestEncodings(unittest.TestCase):
+    def setUp(self):
+        self.keyspace = Keyspace()
+        self.limits = dict(ENCODING_LIMITS)
+
+    def tearDown(self):
+        ENCODING_LIMITS.update(self.limits)
+
+    def run_command(self, *args):
+        return execute(self.keyspace, [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
+
+    def encoding(self, key):
+        return self.run_command("OBJECT", "ENCODING", key)
+
+    def assert_memory_accounted(self):
+        expected = sum(sizeof_entry(key, value) for key, value in self.keyspace.data.items())
+        self.assertEqual(self.keyspace.used_memory, expected)
+
+    def test_strings(self):
+        self.run_command("SET", "int", "-12")
+        self.run_command("SET", "not int", "012")
+        self.run_command("SET", "long", "x" * 45)
+        self.assertEqual([self.encoding(key) for key in ("int", "not int", "long")], ["int", "embstr", "raw"])
+
+    def test_list_conversion(self):
+        self.run_command("RPUSH", "l", *range(128))
+        self.assertEqual(self.encoding("l"), "listpack")
+        self.run_command("LPUSH", "l", "first")
+        self.assertEqual(self.encoding("l"), "quicklist")
+        self.assertEqual(self.run_command("LRANGE", "l", 0, 2), [b"first", b"0", b"1"])
+        self.run_command("RPUSH", "long value", "x" * 65)
+        self.assertEqual(self.encoding("long value"), "quicklist")
+        self.assert_memory_accounted()
+
+    def test_hash_conversion(self):
+        self.run_command("HSET", "h", "f", "1", "g", "2", "f", "3")
+        self.assertEqual(self.encoding("h"), "listpack")
+        self.assertEqual(self.run_command("HGETALL", "h"), [b"f", b"3", b"g", b"2"])
+        self.run_command("HSET", "h", "g", "longer value")
+        self.assertEqual(self.run_command("HGET", "h", "g"), b"longer value")
+        self.assertEqual(self.run_command("HDEL", "h", "f", "missing"), 1)
+        self.run_command("HSET", "h", "big", "x" * 65)
+        self.assertEqual(self.encoding("h"), "hashtable")
+        self.assertEqual(self.run_command("HLEN", "h"), 2)
+        self.assertEqual(self.run_command("HGET", "h", "g"), b"longer value")
+        self.assert_memory_accounted()
+
+    def test_set_conversion(self):
+        self.run_command("SADD", "s", 1, 2, 3)
+        self.assertEqual(self.encoding("s"), "intset")
+        self.run_command("SADD", "s", 1 << 40, -5)
+        self.assertEqual(self.run_command("SMEMBERS", "s"), [b"-5", b"1", b"2", b"3", b"%d" % (1 << 40)])
+        self.assertEqual(self.run_command("SISMEMBER", "s", "01"), 0)
+        self.run_command("SADD", "s", "word")
+        self.assertEqual(self.encoding("s"), "listpack")
+        self.run_command("SADD", "s", *range(200))
+        self.assertEqual(self.encoding("s"), "hashtable")
+        self.assertEqual(self.run_command("SCARD", "s"), 203)
+        self.run_command("SADD", "many", *range(513))
+        self.assertEqual(self.encoding("many"), "hashtable")
+        self.assert_memory_accounted()
+
+    def test_config_limits(self):
+        self.assertEqual(self.run_command("CONFIG", "SET", "list-max-listpack-entries", "2"), "OK")
+        self.assertEqual(self.run_command("CONFIG", "GET", "list-max-listpack-entries"),
+                         [b"list-max-listpack-entries", b"2"])
+        self.run_command("RPUSH", "l", "a", "b", "c")
+        self.assertEqual(self.encoding("l"), "quicklist")
+        self.assertTrue(self.run_command("CONFIG", "SET", "hash-max-listpack-value", "256").startswith("ERR"))
+        self.assertTrue(self.run_command("CONFIG", "SET", "set-max-intset-entries", "-1").startswith("ERR"))
+
+    def test_matches_plain_collections(self):
+        rng = random.Random(8)
+        lists, hashes, sets = {}, {}, {}
+        for _ in range(3000):
+            key = b"%d" % rng.randrange(5)
+            member = rng.choice([b"%d" % rng.randrange(-40, 40), b"m%d" % rng.randrange(40), b"x" * rng.randrange(100)])
+            operation = rng.randrange(5)
+            if operation == 0:
+                left = rng.random() < 0.5
+                self.run_command("LPUSH" if left else "RPUSH", b"l" + key, member)
+                items = lists.setdefault(key, [])
+                items.insert(0, member) if left else items.append(member)
+            elif operation == 1:
+                self.run_command("HSET", b"h" + key, member, member[::-1])
+                hashes.setdefault(key, {})[member] = member[::-1]
+            elif operation == 2:
+                self.run_command("HDEL", b"h" + key, member)
+                hashes.get(key, {}).pop(member, None)
+            elif operation == 3:
+                self.run_command("SADD", b"s" + key, member)
+                sets.setdefault(key, set()).add(member)
+            else:
+                self.run_command("SREM", b"s" + key, member)
+                sets.get(key, set()).discard(member)
+        for key in (b"%d" % number for number in range(5)):
+            self.assertEqual(self.run_command("LRANGE", b"l" + key, 0, -1), lists.get(key, []))
+            flat = self.run_command("HGETALL", b"h" + key)
+            self.assertEqual(dict(zip(flat[::2], flat[1::2])), hashes.get(key, {}))
+            self.assertEqual(set(self.run_command("SMEMBERS", b"s" + key)), sets.get(key, set()))
+        self.assert_memory_accounted()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import unittest
+from unittest import mock
+
+from . import keyspace as keyspace_module
+from .commands import execute
+from .keyspace import Keyspace, now_ms, parse_memory
+
+
+class Recorder:
+    """Stands in for PubSub, recording the keyspace events."""
+
+    notify_flags = "KEA"
+
+    def __init__(self):
+        self.events = []
+
+    def notify(self, event, key, event_class):
+        self.events.append((event, key))
+
+    def notify_command(self, name, keys):
+        pass
+
+
+class TestKeyspace(unittest.TestCase):
+    def setUp(self):
+        self.keyspace = Keyspace()
+        self.propagated = []
+        self.keyspace.propagate = self.propagated.append
+        self.keyspace.pubsub = Recorder()
+
+    def run_command(self, *args):
+        return execute(self.keyspace, [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
+
+    def test_lazy_expiry(self):
+        self.keyspace.set(b"k", b"v")
+        self.keyspace.expire_at(b"k", now_ms() + 1000)
+        self.assertEqual(self.keyspace.get(b"k"), b"v")
+        with mock.patch.object(keyspace_module, "now_ms", return_value=now_ms() + 2000):
+            self.assertIsNone(self.keyspace.get(b"k"))
+        self.assertEqual(self.keyspace.expired_keys, 1)
+        self.assertEqual(self.keyspace.expires, {})
+        self.assertEqual(self.keyspace.pubsub.events, [("expired", b"k")])
+        self.assertEqual(self.propagated, [[b"DEL", b"k"]])
+        self.assertEqual(self.keyspace.used_memory, 0)
+
+    def test_active_expiry(self):
+        for number in range(100):
+            self.keyspace.set(b"k%d" % number, b"v")
+            self.keyspace.expire_at(b"k%d" % number, now_ms() - 2000 if number % 2 else now_ms() + 60000)
+        # The odd ones went straight away, being past their deadline
+        self.assertEqual(len(self.keyspace), 50)
+        self.keyspace._schedule(b"k0", now_ms() - 2000)
+        self.assertFalse(self.keyspace.active_expire_cycle(1))
+        self.assertEqual(len(self.keyspace), 49)
+        self.assertEqual(self.keyspace.expired_keys, 51)
+
+    def test_past_deadline_expires_the_key(self):
+        self.keyspace.set(b"k", b"v")
+        self.assertTrue(self.keyspace.expire_at(b"k", now_ms() - 1))
+        self.assertNotIn(b"k", self.keyspace.data)
+        self.assertEqual(self.keyspace.expired_keys, 1)
+        self.assertEqual(self.keyspace.pubsub.events, [("expired", b"k")])
+        self.assertEqual(self.propagated, [[b"DEL", b"k"]])
+        self.assertFalse(self.keyspace.expire_at(b"k", now_ms() - 1))
+
+    def test_past_deadline_commands_propagate_one_del(self):
+        self.run_command("SET", "a", "1")
+        self.propagated.clear()
+        self.assertEqual(self.run_command("EXPIRE", "a", -5), 1)
+        self.assertEqual(self.propagated, [[b"DEL", b"a"]])
+        self.propagated.clear()
+        self.run_command("SET", "b", "1", "PXAT", now_ms() - 10)
+        self.assertEqual(self.propagated, [[b"DEL", b"b"]])
+        self.assertEqual(self.run_command("GET", "b"), None)
+        self.propagated.clear()
+        self.run_command("EXPIRE", "missing", 10)
+        self.assertEqual(self.propagated, [])
+
+    def test_future_deadline_propagates_absolute_time(self):
+        self.run_command("SET", "a", "1")
+        self.run_command("EXPIRE", "a", 100)
+        name, key, when = self.propagated[-1]
+        self.assertEqual((name, key), (b"PEXPIREAT", b"a"))
+        self.assertAlmostEqual(int(when), now_ms() + 100000, delta=1000)
+        self.assertEqual(self.run_command("PERSIST", "a"), 1)
+        self.assertEqual(self.keyspace.ttl_ms(b"a"), -1)
+
+    def test_ttl_commands(self):
+        self.run_command("SET", "a", "1", "EX", 100)
+        self.assertEqual(self.run_command("TTL", "a"), 100)
+        self.assertAlmostEqual(self.run_command("PTTL", "a"), 100000, delta=1000)
+        self.run_command("SET", "a", "2", "KEEPTTL")
+        self.assertEqual(self.run_command("TTL", "a"), 100)
+        self.assertEqual(self.run_command("PERSIST", "a"), 1)
+        self.assertEqual(self.run_command("TTL", "a"), -1)
+        self.assertEqual(self.run_command("TTL", "missing"), -2)
+        self.assertEqual(self.run_command("PEXPIREAT", "a", now_ms() - 10), 1)
+        self.assertIsNone(self.run_command("GET", "a"))
+        self.assertEqual(self.run_command("EXPIRE", "missing", 10), 0)
+        self.run_command("SET", "b", "1", "PXAT", now_ms() - 10)
+        self.assertEqual(self.run_command("EXISTS", "b"), 0)
+
+    def test_eviction(self):
+        keyspace = Keyspace(maxmemory=5000, maxmemory_policy="allkeys-lru")
+        for number in range(200):
+            keyspace.set(b"key%d" % number, b"x" * 20)
+            self.assertTrue(keyspace.free_memory())
+        self.assertLessEqual(keyspace.used_memory, 5000)
+        self.assertEqual(keyspace.evicted_keys, 200 - len(keyspace))
+
+    def test_volatile_ttl_evicts_soonest_first(self):
+        keyspace = Keyspace(maxmemory=1, maxmemory_policy="volatile-ttl")
+        keyspace.set(b"late", b"v")
+        keyspace.expire_at(b"late", now_ms() + 100000)
+        keyspace.set(b"soon", b"v")
+        keyspace.expire_at(b"soon", now_ms() + 5000)
+        keyspace.set(b"forever", b"v")
+        self.assertFalse(keyspace.free_memory())
+        self.assertEqual(list(keyspace.data), [b"forever"])
+
+    def test_memory_accounting(self):
+        keyspace = self.keyspace
+        self.run_command("SET", "s", "x" * 100)
+        self.run_command("RPUSH", "l", *range(300))
+        self.run_command("HSET", "h", "f", "v")
+        self.run_command("SADD", "set", "a", "b")
+        self.run_command("SET", "s", "shorter")
+        self.assertGreater(keyspace.used_memory, 0)
+        for key in ("s", "l", "h", "set"):
+            self.run_command("DEL", key)
+        self.assertEqual(keyspace.used_memory, 0)
+
+    def test_noeviction_refuses_writes(self):
+        self.keyspace.maxmemory = 1
+        self.assertEqual(self.run_command("SET", "a", "1"), "OK")
+        self.assertTrue(self.run_command("SET", "b", "1").startswith("OOM"))
+        # Commands that free memory still run
+        self.assertEqual(self.run_command("DEL", "a"), 1)
+        self.assertEqual(self.run_command("GET", "b"), None)
+
+    def test_lru_evicts_idle_keys(self):
+        keyspace = Keyspace(maxmemory_policy="allkeys-lru")
+        for number in range(100):
+            keyspace.set(b"old%d" % number, b"v")
+        keyspace._lru_clock += 1000
+        for number in range(100):
+            keyspace.set(b"new%d" % number, b"v")
+        keyspace.maxmemory = keyspace.used_memory // 2
+        self.assertTrue(keyspace.free_memory())
+        survivors = sum(key.startswith(b"new") for key in keyspace.data)
+        self.assertGreater(survivors, 2 * (len(keyspace) - survivors))
+
+    def test_lfu_keeps_frequently_used_keys(self):
+        keyspace = Keyspace(maxmemory_policy="allkeys-lfu")
+        for number in range(100):
+            keyspace.set(b"k%d" % number, b"v")
+        for _ in range(200):
+            for number in range(10):
+                keyspace.get(b"k%d" % number)
+        keyspace.maxmemory = keyspace.used_memory // 4
+        self.assertTrue(keyspace.free_memory())
+        self.assertGreaterEqual(sum(b"k%d" % number in keyspace.data for number in range(10)), 9)
+
+    def test_sample_keys_follow_removals(self):
+        keyspace = Keyspace(maxmemory_policy="allkeys-lru")
+        for number in range(50):
+            keyspace.set(b"k%d" % number, b"v")
+        for number in range(0, 50, 3):
+            keyspace.delete(b"k%d" % number)
+        self.assertEqual(sorted(keyspace._sample_keys), sorted(keyspace.data))
+        for key, packed in keyspace._access.items():
+            self.assertEqual(keyspace._sample_keys[packed >> 24], key)
+
+    def test_config_policy(self):
+        self.run_command("SET", "a", "1")
+        self.assertEqual(self.run_command("CONFIG", "SET", "maxmemory-policy", "ALLKEYS-LFU"), "OK")
+        self.assertEqual(self.keyspace._sample_keys, [b"a"])
+        self.assertEqual(self.run_command("CONFIG", "SET", "maxmemory", "1mb"), "OK")
+        self.assertEqual(self.run_command("CONFIG", "GET", "maxmemory*"),
+                         [b"maxmemory", b"1048576", b"maxmemory-policy", b"allkeys-lfu"])
+        self.assertTrue(self.run_command("CONFIG", "SET", "maxmemory-policy", "random").startswith("ERR"))
+
+    def test_parse_memory(self):
+        self.assertEqual(parse_memory("100mb"), 100 * 1024 * 1024)
+        self.assertEqual(parse_memory("1g"), 1000 ** 3)
+        with self.assertRaises(ValueError):
+            parse_memory("lots")
+
+
+if __name__ == "__main__":
+    unittest.main()
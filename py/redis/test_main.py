@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+
+from .main import Parser, Push, RespError, RespProtocolException, Serializer, VerbatimString, deserialize, serialize
+
+COMMAND = b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$5\r\nvalue\r\n"
+
+
+class TestParser(unittest.TestCase):
+    def test_types(self):
+        for message, expected in (
+            (b"+OK\r\n", "OK"),
+            (b"-ERR bad\r\n", RespError("ERR bad")),
+            (b":-12\r\n", -12),
+            (b"$5\r\nhe\r\no\r\n", b"he\r\no"),
+            (b"$0\r\n\r\n", b""),
+            (b"$-1\r\n", None),
+            (b"*-1\r\n", None),
+            (b"*0\r\n", []),
+            (b"_\r\n", None),
+            (b"#t\r\n", True),
+            (b",1.5\r\n", 1.5),
+            (b"(3492890328409238509324850943850943825024385\r\n", 3492890328409238509324850943850943825024385),
+            (b"!5\r\nERR x\r\n", RespError("ERR x")),
+            (b"%1\r\n+a\r\n:1\r\n", {"a": 1}),
+            (b"~2\r\n:1\r\n:2\r\n", {1, 2}),
+            (b"*2\r\n*1\r\n:1\r\n$1\r\nx\r\n", [[1], b"x"]),
+        ):
+            with self.subTest(message=message):
+                value = deserialize(message)
+                self.assertEqual(value, expected)
+                self.assertIs(type(value), type(expected))
+        verbatim = deserialize(b"=7\r\nmkd:abc\r\n")
+        self.assertEqual((verbatim, verbatim.format), (VerbatimString(b"abc"), "mkd"))
+        self.assertIsInstance(deserialize(b">1\r\n+message\r\n"), Push)
+
+    def test_split_at_every_byte(self):
+        parser = Parser()
+        frames = []
+        for i in range(len(COMMAND)):
+            frames += parser.feed(COMMAND[i:i + 1])
+        self.assertEqual(frames, [[b"SET", b"key", b"value"]])
+        self.assertEqual(parser.buffer, b"")
+
+    def test_pipelined(self):
+        parser = Parser()
+        stream = COMMAND * 3 + b"+partial"
+        self.assertEqual(parser.feed(stream), [[b"SET", b"key", b"value"]] * 3)
+        self.assertEqual(parser.feed(b"\r\n:1\r"), ["partial"])
+        self.assertEqual(parser.feed(b"\n"), [1])
+
+    def test_large_bulk_string_in_pieces(self):
+        parser = Parser()
+        value = b"x" * 100000
+        message = b"*2\r\n$3\r\nGET\r\n$%d\r\n%s\r\n" % (len(value), value)
+        frames = []
+        for start in range(0, len(message), 4096):
+            frames += parser.feed(message[start:start + 4096])
+        self.assertEqual(frames, [[b"GET", value]])
+
+    def test_partial_aggregates_at_every_byte(self):
+        message = (b"*2\r\n%2\r\n+a\r\n*2\r\n:1\r\n~1\r\n#t\r\n+b\r\n$-1\r\n>2\r\n$1\r\nx\r\n*0\r\n"
+                   + COMMAND + b"LONG inline " * 20 + b"\r\n")
+        expected = [[{"a": [1, {True}], "b": None}, Push([b"x", []])], [b"SET", b"key", b"value"],
+                    [b"LONG", b"inline"] * 20]
+        parser = Parser()
+        frames = []
+        for i in range(len(message)):
+            frames += parser.feed(message[i:i + 1])
+        self.assertEqual(frames, expected)
+        self.assertIs(type(frames[0][1]), Push)
+        self.assertEqual(parser.buffer, b"")
+
+    def test_partial_command_is_parsed_once(self):
+        args = [b"%d" % number for number in range(2000)]
+        message = serialize([b"RPUSH", b"list", *args])
+        parser = Parser()
+        frames = []
+        pieces = range(0, len(message), 10)
+        with mock.patch.object(parser, "_read_blob", wraps=parser._read_blob) as read_blob:
+            for start in pieces:
+                frames += parser.feed(message[start:start + 10])
+                # Only the unfinished element is left in the buffer
+                self.assertLess(len(parser.buffer), 20)
+        self.assertEqual(frames, [[b"RPUSH", b"list", *args]])
+        # Each element is parsed once, plus one try per piece that ends in one
+        self.assertLessEqual(read_blob.call_count, len(args) + 2 + len(pieces))
+
+    def test_long_line_is_scanned_once(self):
+        parser = Parser()
+        line = b"+" + b"x" * 10000
+        for start in range(0, len(line), 100):
+            self.assertEqual(parser.feed(line[start:start + 100]), [])
+            # The next search starts from the last byte, not the line's start
+            self.assertEqual(parser._scanned, len(parser.buffer) - 2)
+        self.assertEqual(parser.feed(b"\r"), [])
+        self.assertEqual(parser.feed(b"\n"), ["x" * 10000])
+        self.assertEqual(parser._scanned, 0)
+
+    def test_inline_commands(self):
+        parser = Parser()
+        self.assertEqual(parser.feed(b"PING\r\nSET  a   b\n"), [[b"PING"], [b"SET", b"a", b"b"]])
+        self.assertEqual(parser.feed(b"GET a"), [])
+        self.assertEqual(parser.feed(b"\r\n"), [[b"GET", b"a"]])
+
+    def test_errors(self):
+        for message in (b"$3\r\nabcd\r\n", b":x\r\n", b"*1\r\n?\r\n", b"#x\r\n", b"$-2\r\n", b"+OK\r\n+OK\r\n",
+                        b"$5\r\nab"):
+            with self.subTest(message=message):
+                with self.assertRaises(RespProtocolException):
+                    deserialize(message)
+
+
+class TestSerializer(unittest.TestCase):
+    def test_round_trip(self):
+        for value in ("OK", "custom status", RespError("ERR x"), 0, 9999, 10000, -5, True, 2.5, None, b"",
+                      b"x" * 2000, [b"a", 1, [b"b"]], [b"y" * n for n in (10, 1500, 70000)], {b"k": 1}, {b"m"},
+                      Push([b"message", b"c", b"d"])):
+            with self.subTest(value=repr(value)[:40]):
+                self.assertEqual(deserialize(serialize(value)), value)
+        verbatim = deserialize(serialize(VerbatimString(b"text", "mkd")))
+        self.assertEqual((verbatim, verbatim.format), (b"text", "mkd"))
+
+    def test_encoding(self):
+        self.assertEqual(serialize([b"GET", 12, None]), b"*3\r\n$3\r\nGET\r\n:12\r\n$-1\r\n")
+        self.assertEqual(serialize(b"x" * 1500), b"$1500\r\n" + b"x" * 1500 + b"\r\n")
+        self.assertEqual(serialize(123456), b":123456\r\n")
+
+    def test_large_values_are_not_copied(self):
+        serializer = Serializer()
+        value = b"v" * Serializer.LARGE_VALUE
+        serializer.write(b"small")
+        serializer.write([value])
+        serializer.write("OK")
+        chunks = serializer.take()
+        self.assertTrue(any(chunk is value for chunk in chunks))
+        self.assertEqual(b"".join(chunks), b"$5\r\nsmall\r\n*1\r\n$%d\r\n%s\r\n+OK\r\n" % (len(value), value))
+        self.assertEqual(serializer.take(), [])
+
+    def test_unknown_type(self):
+        with self.assertRaises(RespProtocolException):
+            serialize(object())
+
+
+if __name__ == "__main__":
+    unittest.main()
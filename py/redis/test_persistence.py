@@ -0,0 +1,163 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from . import persistence
+from .commands import execute
+from .encodings import HASH_TYPES, LIST_TYPES, SET_TYPES
+from .keyspace import Keyspace, now_ms
+from .persistence import Persistence, PersistenceError, load_snapshot, write_snapshot
+
+
+def run_command(keyspace, *args):
+    return execute(keyspace, [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
+
+
+def fill(keyspace):
+    run_command(keyspace, "SET", "string", b"\x00binary\r\n")
+    run_command(keyspace, "SET", "volatile", "v", "EX", 100)
+    run_command(keyspace, "RPUSH", "list", *range(5))
+    run_command(keyspace, "RPUSH", "long list", *range(1000))
+    run_command(keyspace, "HSET", "hash", "f", "1", "g", "2")
+    run_command(keyspace, "SADD", "numbers", 1, 2, 3)
+    run_command(keyspace, "SADD", "words", "a", "b")
+
+
+def dump(keyspace) -> dict:
+    """Everything a client can see in the keyspace, with the deadlines."""
+    view = {}
+    for key, value in keyspace.data.items():
+        if isinstance(value, LIST_TYPES):
+            shown = run_command(keyspace, "LRANGE", key, 0, -1)
+        elif isinstance(value, HASH_TYPES):
+            shown = sorted(run_command(keyspace, "HGETALL", key))
+        elif isinstance(value, SET_TYPES):
+            shown = sorted(run_command(keyspace, "SMEMBERS", key))
+        else:
+            shown = run_command(keyspace, "GET", key)
+        view[key] = (shown, keyspace.expires.get(key))
+    return view
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        keyspace = Keyspace()
+        fill(keyspace)
+        fp = io.BytesIO()
+        write_snapshot(keyspace, fp)
+        loaded = Keyspace()
+        self.assertEqual(load_snapshot(loaded, fp.getvalue() + b"trailing"), len(fp.getvalue()))
+        self.assertEqual(dump(loaded), dump(keyspace))
+        self.assertEqual(loaded.used_memory, keyspace.used_memory)
+
+    def test_expired_keys_are_skipped(self):
+        keyspace = Keyspace()
+        run_command(keyspace, "SET", "gone", "v", "PX", 1000)
+        run_command(keyspace, "SET", "kept", "v")
+        fp = io.BytesIO()
+        write_snapshot(keyspace, fp)
+        loaded = Keyspace()
+        with mock.patch.object(persistence, "now_ms", return_value=now_ms() + 2000):
+            load_snapshot(loaded, fp.getvalue())
+        self.assertEqual(list(loaded.data), [b"kept"])
+
+    def test_damaged_snapshots(self):
+        keyspace = Keyspace()
+        fill(keyspace)
+        fp = io.BytesIO()
+        write_snapshot(keyspace, fp)
+        data = fp.getvalue()
+        flipped = bytearray(data)
+        flipped[len(data) // 2] ^= 0xFF
+        for damaged in (b"", b"nonsense", data[:len(data) // 2], bytes(flipped)):
+            with self.subTest(size=len(damaged)):
+                with self.assertRaises(PersistenceError):
+                    load_snapshot(Keyspace(), damaged)
+
+
+class TestPersistence(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.rdb = os.path.join(self.directory.name, "dump.rdb")
+        self.aof = os.path.join(self.directory.name, "appendonly.aof")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, appendonly: bool = False) -> Keyspace:
+        keyspace = Keyspace()
+        Persistence(keyspace, dbfilename=self.rdb, appendonly=appendonly, appendfilename=self.aof,
+                    appendfsync="always").load()
+        return keyspace
+
+    async def test_save_and_load(self):
+        keyspace = self.open()
+        fill(keyspace)
+        self.assertEqual(run_command(keyspace, "SAVE"), "OK")
+        self.assertEqual(dump(self.open()), dump(keyspace))
+
+    async def test_append_only_file(self):
+        keyspace = self.open(appendonly=True)
+        fill(keyspace)
+        run_command(keyspace, "INCR", "counter")
+        run_command(keyspace, "DEL", "string")
+        run_command(keyspace, "EXPIRE", "list", 100)
+        keyspace.persistence.close()
+        reloaded = self.open(appendonly=True)
+        self.assertEqual(dump(reloaded), dump(keyspace))
+        # The relative TTL was logged as an absolute deadline
+        self.assertEqual(reloaded.expires[b"list"], keyspace.expires[b"list"])
+        reloaded.persistence.close()
+
+    async def test_truncated_append_only_file(self):
+        keyspace = self.open(appendonly=True)
+        run_command(keyspace, "SET", "a", "1")
+        keyspace.persistence.close()
+        with open(self.aof, "ab") as fp:
+            fp.write(b"*3\r\n$3\r\nSET\r\n$1\r\nb")
+        reloaded = self.open(appendonly=True)
+        self.assertEqual(list(reloaded.data), [b"a"])
+        reloaded.persistence.close()
+
+    async def test_append_only_file_ignores_maxmemory(self):
+        keyspace = self.open(appendonly=True)
+        for number in range(50):
+            run_command(keyspace, "SET", f"key{number}", "x" * 100)
+        keyspace.persistence.close()
+        reloaded = Keyspace(maxmemory=2000, maxmemory_policy="allkeys-lru")
+        Persistence(reloaded, dbfilename=self.rdb, appendonly=True, appendfilename=self.aof).load()
+        self.assertEqual(len(reloaded), 50)
+        self.assertEqual(reloaded.evicted_keys, 0)
+        self.assertEqual(reloaded.maxmemory, 2000)
+        reloaded.persistence.close()
+
+    async def test_damaged_append_only_file(self):
+        with open(self.aof, "wb") as fp:
+            fp.write(b"*2\r\n$3\r\nSET\r\n$1\r\na\r\n")
+        with self.assertRaises(PersistenceError):
+            self.open(appendonly=True)
+
+    async def test_rewrite(self):
+        keyspace = self.open(appendonly=True)
+        for number in range(100):
+            run_command(keyspace, "INCR", "counter")
+        persistence = keyspace.persistence
+        self.assertTrue(persistence.background_rewrite())
+        # Written while the child is busy, so it goes in the rewrite buffer
+        run_command(keyspace, "SET", "after", "1")
+        while persistence.child_pid is not None:
+            await asyncio.sleep(0.01)
+            persistence.cron()
+        size = os.path.getsize(self.aof)
+        self.assertLess(size, 200)
+        persistence.close()
+        reloaded = self.open(appendonly=True)
+        self.assertEqual(dump(reloaded), dump(keyspace))
+        reloaded.persistence.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+
+from . import pubsub
+from .commands import execute
+from .keyspace import Keyspace
+from .main import Parser
+from .pubsub import PubSub, compile_pattern, parse_notify_flags
+from .server import RedisProtocol
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = bytearray()
+        self.closing = False
+
+    def write(self, data):
+        self.written += data
+
+    def writelines(self, chunks):
+        for chunk in chunks:
+            self.written += chunk
+
+    def is_closing(self):
+        return self.closing
+
+    def close(self):
+        self.closing = True
+
+    abort = close
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+
+class TestPubSub(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.keyspace = Keyspace()
+        self.keyspace.pubsub = PubSub()
+
+    def connect(self):
+        client = RedisProtocol(self.keyspace)
+        client.connection_made(FakeTransport())
+        return client
+
+    def send(self, client, data: bytes) -> list:
+        """The replies and messages the client has been sent since last time."""
+        client.data_received(data)
+        self.keyspace.pubsub.flush()
+        replies = Parser().feed(bytes(client.transport.written))
+        client.transport.written.clear()
+        return replies
+
+    async def test_publish_and_receive(self):
+        subscriber = self.connect()
+        publisher = self.connect()
+        self.assertEqual(self.send(subscriber, b"SUBSCRIBE news\r\nPSUBSCRIBE n*\r\n"),
+                         [[b"subscribe", b"news", 1], [b"psubscribe", b"n*", 2]])
+        self.assertEqual(self.send(publisher, b"PUBLISH news hi\r\n"), [2])
+        self.assertEqual(self.send(subscriber, b""),
+                         [[b"message", b"news", b"hi"], [b"pmessage", b"n*", b"news", b"hi"]])
+        self.assertEqual(self.send(publisher, b"PUBLISH other hi\r\n"), [0])
+
+    async def test_subscribed_context(self):
+        client = self.connect()
+        self.send(client, b"SUBSCRIBE news\r\n")
+        (reply,) = self.send(client, b"GET key\r\n")
+        self.assertIn("Can't execute 'get'", str(reply))
+        # Requests that are not arrays of bulk strings get the same reply
+        (reply,) = self.send(client, b"*1\r\n:5\r\n")
+        self.assertIn("Can't execute '5'", str(reply))
+        (reply,) = self.send(client, b":7\r\n")
+        self.assertIn("Can't execute '7'", str(reply))
+        self.assertEqual(self.send(client, b"UNSUBSCRIBE\r\n"), [[b"unsubscribe", b"news", 0]])
+        self.assertEqual(self.send(client, b"GET key\r\n"), [None])
+
+    async def test_ping_reset_and_quit(self):
+        client = self.connect()
+        self.assertEqual(self.send(client, b"PING\r\n"), ["PONG"])
+        self.send(client, b"SUBSCRIBE news\r\nPSUBSCRIBE n*\r\n")
+        self.assertEqual(self.send(client, b"PING\r\nPING hi\r\n"), [[b"pong", b""], [b"pong", b"hi"]])
+        self.assertEqual(self.send(client, b"RESET\r\n"), ["RESET"])
+        self.assertEqual(self.keyspace.pubsub.channels, {})
+        self.assertEqual(self.keyspace.pubsub.patterns, {})
+        self.assertEqual(self.send(client, b"GET key\r\n"), [None])
+        self.assertEqual(self.send(client, b"SUBSCRIBE news\r\nQUIT\r\nGET key\r\n"),
+                         [[b"subscribe", b"news", 1], "OK"])
+        self.assertTrue(client.transport.closing)
+
+    async def test_dropped_subscribers_are_not_counted(self):
+        slow = self.connect()
+        fast = self.connect()
+        self.send(slow, b"SUBSCRIBE news\r\n")
+        self.send(fast, b"SUBSCRIBE news\r\n")
+        slow.transport.get_write_buffer_size = lambda: 1024
+        with mock.patch.object(pubsub, "OUTPUT_HARD_LIMIT", 512):
+            self.assertEqual(self.keyspace.pubsub.publish(b"news", b"hi"), 1)
+        self.assertTrue(slow.transport.closing)
+        self.assertEqual(self.keyspace.pubsub.channels[b"news"], {fast})
+        # Closed but not yet told so by connection_lost
+        fast.transport.close()
+        self.assertEqual(self.keyspace.pubsub.publish(b"news", b"hi"), 0)
+
+    async def test_keyspace_notifications(self):
+        client = self.connect()
+        self.send(client, b"CONFIG SET notify-keyspace-events KEA\r\nSUBSCRIBE __keyevent@0__:set\r\n")
+        self.send(client, b"")
+        other = self.connect()
+        self.send(other, b"SET key value\r\n")
+        self.assertEqual(self.send(client, b""), [[b"message", b"__keyevent@0__:set", b"key"]])
+
+    def test_events_only_for_changed_keys(self):
+        events = []
+        self.keyspace.pubsub.notify_flags = parse_notify_flags("KEA")
+        record = lambda event, key, event_class: events.append((event, key))
+        with mock.patch.object(self.keyspace.pubsub, "notify", record):
+            for request in (b"SET n 1", b"DECR n", b"HSET h f 1", b"HSET h f 2", b"DEL n nokey", b"DEL nokey",
+                            b"SADD s a", b"SADD s a", b"SREM s b", b"HDEL h nope", b"EXPIRE nokey 10",
+                            b"PERSIST h", b"EXPIRE h 10", b"PERSIST h"):
+                execute(self.keyspace, request.split())
+        self.assertEqual(events, [
+            ("set", b"n"), ("incrby", b"n"), ("hset", b"h"), ("hset", b"h"), ("del", b"n"), ("sadd", b"s"),
+            ("expire", b"h"), ("persist", b"h"),
+        ])
+
+    def test_patterns_and_flags(self):
+        self.assertTrue(compile_pattern(b"h?llo[^x]*").fullmatch(b"hello!world"))
+        self.assertFalse(compile_pattern(b"h\\*").fullmatch(b"hx"))
+        self.assertEqual(parse_notify_flags("Kg"), "Kg")
+        self.assertEqual(parse_notify_flags("g"), "")
+        with self.assertRaises(ValueError):
+            parse_notify_flags("Z")
+
+
+if __name__ == "__main__":
+    unittest.main()